@@ -0,0 +1,135 @@
+"""
+Профиль gunicorn для продакшена.
+
+    gunicorn SiteC.wsgi:application -c python:SiteC.gunicorn_config
+
+Приложение загружается в мастере (preload) и прогревается там же один раз
+(recipes.warmup): воркеры получают готовые модули, индекс подсказок и кэш
+через fork, а не собирают их на первых запросах. Соединения с базой перед
+fork закрываются, каждый воркер открывает свои до того, как начнет
+принимать соединения.
+
+Число воркеров и потоков считается от доступных процессору ядер (с учетом
+квоты cgroup в контейнере); WEB_CONCURRENCY и GUNICORN_THREADS их
+переопределяют. Миграции здесь не выполняются — это отдельный шаг релиза
+(см. Procfile).
+
+Несколько воркеров требуют общего кэша (REDIS_URL или CACHE_BACKEND, см.
+CACHES в SiteC/settings.py): с кэшем в памяти процесса версии ответов,
+сброс пользователей JWT и закрепление за основной базой не видны другим
+воркерам, поэтому такой запуск останавливается с ошибкой. Для одного
+воркера задайте WEB_CONCURRENCY=1.
+"""
+import gc
+import math
+import os
+import threading
+
+
+def cpu_count():
+    """Ядра, доступные процессу: квота cgroup v2, затем affinity, затем os.cpu_count()."""
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as quota_file:
+            quota, period = quota_file.read().split()
+        if quota != 'max':
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def env_flag(name, default):
+    return os.getenv(name, '1' if default else '0') == '1'
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Запросы в основном ждут базу, поэтому воркеров больше, чем ядер, и по
+# несколько потоков (gthread); верхняя граница бережет память контейнера
+workers = int(os.getenv('WEB_CONCURRENCY', min(2 * cpu_count() + 1, int(os.getenv('GUNICORN_MAX_WORKERS', 8)))))
+threads = int(os.getenv('GUNICORN_THREADS', 2))
+
+preload_app = env_flag('GUNICORN_PRELOAD', True)
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+# Соединения от прокси платформы переиспользуются между запросами
+keepalive = 5
+# Heartbeat воркеров в tmpfs: запись на overlay-диск контейнера может
+# подвешивать воркер
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+WARMUP = env_flag('GUNICORN_WARMUP', True)
+
+
+def on_starting(server):
+    if server.cfg.workers <= 1:
+        return
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SiteC.settings')
+    from django.core.cache import caches
+    from django.core.cache.backends.locmem import LocMemCache
+
+    # RuntimeError gunicorn печатает как "Error: ..." и завершается с кодом 1
+    if isinstance(caches['default'], LocMemCache):
+        raise RuntimeError(
+            f'{server.cfg.workers} воркеров с LocMemCache: у каждого свой кэш. '
+            'Задайте REDIS_URL (или CACHE_BACKEND и CACHE_LOCATION) либо WEB_CONCURRENCY=1'
+        )
+
+
+def when_ready(server):
+    if not (WARMUP and preload_app):
+        return
+    from django.db import connections
+
+    from recipes.warmup import warm_up
+
+    try:
+        warm_up()
+    except Exception:
+        server.log.exception('Прогрев в мастере не удался')
+    finally:
+        # Сокеты базы не должны достаться нескольким воркерам через fork
+        connections.close_all()
+        for connection in connections.all():
+            # Пул psycopg держит соединения и свои потоки — воркер создаст свой
+            if getattr(connection, 'pool', None) is not None:
+                connection.close_pool()
+        # Объекты мастера уходят из-под сборщика мусора: его обходы в воркерах
+        # не копируют общие после fork страницы памяти
+        gc.freeze()
+
+
+def open_worker_connections(worker):
+    from recipes.warmup import open_connections
+
+    pool = getattr(worker, 'tpool', None)
+    if pool is None:
+        open_connections()
+        return
+    # Соединения Django привязаны к потоку, а запросы gthread обслуживает пул:
+    # барьер заставляет пул завести все потоки, и каждый открывает свои
+    barrier = threading.Barrier(worker.cfg.threads)
+
+    def open_in_thread():
+        barrier.wait(timeout=10)
+        open_connections()
+
+    for future in [pool.submit(open_in_thread) for _ in range(worker.cfg.threads)]:
+        future.result()
+
+
+def post_worker_init(worker):
+    # Вызывается до того, как воркер начнет принимать соединения
+    if not WARMUP:
+        return
+    from recipes.warmup import warm_up
+
+    try:
+        if not preload_app:
+            warm_up()
+        open_worker_connections(worker)
+    except Exception:
+        worker.log.exception('Прогрев воркера не удался')
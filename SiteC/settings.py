@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework_simplejwt',
+    'django_filters',
     'recipes',
     'corsheaders',
 ]
@@ -61,6 +62,10 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы общее время включало все остальные middleware
+    'recipes.timing.ServerTimingMiddleware',
+    # До остальных: сессии и аутентификация тоже читают с выбранной базы
+    'recipes.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -92,7 +97,7 @@ TEMPLATES = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'recipes.auth.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # По умолчанию доступ для всех
@@ -105,11 +110,186 @@ WSGI_APPLICATION = 'SiteC.wsgi.application'
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///' + str(BASE_DIR / "db.sqlite3"))
-print(f"DEBUG: DATABASE_URL = {DATABASE_URL}")
+# Постоянные соединения открываются при прогреве воркера; проверка перед
+# запросом отбрасывает те, что база закрыла за время простоя
 DATABASES = {
-    'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600)
+    'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600, conn_health_checks=True)
 }
-print(f"Using database: {DATABASES['default']['ENGINE']} at {DATABASES['default']['NAME']}")
+
+# Реплики для чтения (recipes.replicas): DATABASE_REPLICA_URLS через запятую,
+# алиасы replica_1, replica_2, ... Чтение безопасных запросов к API идет на
+# случайную реплику, запись — в default; записавший пользователь
+# REPLICA_PIN_SECONDS секунд читает из default. В тестах реплики — зеркала default.
+REPLICA_DATABASES = []
+for number, replica_url in enumerate(filter(None, os.getenv('DATABASE_REPLICA_URLS', '').split(',')), start=1):
+    alias = f'replica_{number}'
+    DATABASES[alias] = dj_database_url.parse(replica_url.strip(), conn_max_age=600, conn_health_checks=True)
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    REPLICA_DATABASES.append(alias)
+DATABASE_ROUTERS = ['recipes.replicas.ReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 10))
+REPLICA_PATH_PREFIXES = ('/api/',)
+
+# Профиль бэкенда. SQLite: WAL, чтобы читатели не ждали писателя,
+# synchronous=NORMAL (в WAL без риска повредить базу), mmap для чтения и
+# ожидание блокировки вместо "database is locked"; запись начинается с
+# BEGIN IMMEDIATE, чтобы транзакция не упиралась в блокировку на полпути.
+# Режим WAL записывается в сам файл базы, поэтому db.sqlite3 из репозитория
+# остается в прежнем режиме — для WAL локально укажите свой DATABASE_URL.
+# Postgres: пул соединений psycopg 3 на процесс и базу; пул проверяет
+# соединение перед выдачей (check), CONN_HEALTH_CHECKS при пуле не
+# действует. SQLITE_WAL=0 и DB_POOL=0 отключают.
+TRACKED_SQLITE = BASE_DIR / 'db.sqlite3'
+for database in DATABASES.values():
+    if database['ENGINE'] == 'django.db.backends.sqlite3' and os.getenv('SQLITE_WAL', '1') == '1':
+        tracked = Path(database['NAME']).resolve() == TRACKED_SQLITE
+        database['OPTIONS'] = {
+            'init_command': (
+                ('' if tracked else 'PRAGMA journal_mode=WAL;') +
+                'PRAGMA synchronous=NORMAL;'
+                f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_SIZE', 128 * 1024 * 1024))};"
+            ),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT', 20)),
+        }
+    elif database['ENGINE'] == 'django.db.backends.postgresql' and os.getenv('DB_POOL', '1') == '1':
+        from psycopg_pool import ConnectionPool
+
+        # Пул не совместим с постоянными соединениями Django
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS'] = {
+            **database.get('OPTIONS', {}),
+            'pool': {
+                # Соединение, закрытое базой или прокси за время простоя, пул
+                # заменит до выдачи, а не отдаст запросу
+                'check': ConnectionPool.check_connection,
+                'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+                'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 4)),
+                'timeout': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+                'max_idle': 300,
+            },
+        }
+
+# Cache
+# Кэш ответов, версии, пользователи JWT, закрепление за основной базой и
+# метрики воркеров должны быть общими для процессов. REDIS_URL (его задает
+# плагин Redis на Railway) включает Redis; иначе бэкенд задается через
+# CACHE_BACKEND и CACHE_LOCATION. По умолчанию — память процесса: годится
+# только для одного воркера, с несколькими gunicorn не запустится
+# (SiteC/gunicorn_config.py).
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+            'LOCATION': os.getenv('CACHE_LOCATION', 'meowsite'),
+        }
+    }
+# Асинхронные обработчики чтения (recipes.async_views); включается в SiteC/asgi.py
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', '0') == '1'
+
+# Прогрев перед приемом трафика (recipes.warmup, SiteC/gunicorn_config.py):
+# какие страницы запросить и с каким Host — ключи кэша ответов строятся по
+# полному URL, поэтому хост должен быть публичным
+WARMUP_PATHS = [path for path in os.getenv('WARMUP_PATHS', '/api/recipes/').split(',') if path]
+WARMUP_HOST = os.getenv('WARMUP_HOST', 'meowsite-backend-production.up.railway.app')
+
+# Замер запросов (recipes.timing): заголовок Server-Timing, порог журнала
+# медленных запросов (мс) и период публикации гистограмм в кэш для
+# /api/metrics/ (с)
+SERVER_TIMING = os.getenv('SERVER_TIMING', '1') == '1'
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', 500))
+METRICS_PUBLISH_INTERVAL = 10
+
+# Журналы (recipes.logs): JSON в stdout из фонового потока, с id и замерами
+# запроса. Журнал запросов recipes.requests пишется для доли
+# LOG_REQUEST_SAMPLE_RATE запросов (ошибки и медленные — всегда); отладку
+# отдельного логгера включает LOG_DEBUG=recipes.views,recipes.cache
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_REQUEST_SAMPLE_RATE = float(os.getenv('LOG_REQUEST_SAMPLE_RATE', 0.1))
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'request_context': {'()': 'recipes.logs.RequestContextFilter'},
+        'sample_requests': {'()': 'recipes.logs.SamplingFilter', 'rate': LOG_REQUEST_SAMPLE_RATE},
+    },
+    'formatters': {
+        'json': {'()': 'recipes.logs.JSONFormatter'},
+    },
+    'handlers': {
+        'queue': {
+            '()': 'recipes.logs.QueueHandler',
+            'stream': 'ext://sys.stdout',
+            'formatter': 'json',
+            'filters': ['request_context'],
+        },
+    },
+    'root': {'handlers': ['queue'], 'level': LOG_LEVEL},
+    'loggers': {
+        'recipes.requests': {'level': 'INFO', 'filters': ['sample_requests']},
+        **{name: {'level': 'DEBUG'} for name in os.getenv('LOG_DEBUG', '').split(',') if name},
+    },
+}
+
+# Время жизни закэшированных ответов для рецептов, секунды
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 60))
+
+# Уменьшенные копии фото рецептов и шагов (ширины в пикселях)
+IMAGE_RENDITION_WIDTHS = (320, 640, 1280)
+IMAGE_RENDITION_FORMATS = ('webp', 'jpeg')
+IMAGE_RENDITION_QUALITY = 80
+# Копии создаются после коммита в фоновом потоке, а не в запросе
+IMAGE_RENDITIONS_BACKGROUND = os.getenv('IMAGE_RENDITIONS_BACKGROUND', '1') == '1'
+
+# Максимум рецептов в одном запросе пакетного импорта
+RECIPE_BULK_MAX = int(os.getenv('RECIPE_BULK_MAX', 1000))
+
+# Размер пачки при потоковой выгрузке каталога /api/recipes/export/
+RECIPE_EXPORT_CHUNK_SIZE = 500
+
+# Границы корзин для фасетов ?facets=1: время в минутах, калории
+RECIPE_FACET_BUCKETS = {
+    'cooking_time': (15, 30, 60, 120),
+    'calories': (200, 400, 600, 800),
+}
+
+# Сколько держать в кэше множество избранных рецептов пользователя, секунды
+FAVORITES_CACHE_TIMEOUT = 300
+
+# Пользователи из JWT (recipes.auth): LRU процесса и общий кэш, секунды;
+# с LocMemCache запись в кэше живет не дольше USER_CACHE_LOCAL_TIMEOUT
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 1024))
+USER_CACHE_LOCAL_TIMEOUT = int(os.getenv('USER_CACHE_LOCAL_TIMEOUT', 5))
+USER_CACHE_TIMEOUT = int(os.getenv('USER_CACHE_TIMEOUT', 300))
+
+# Лента "в тренде": веса вовлеченности и за сколько секунд свежесть
+# добавляет столько же, сколько десятикратный рост вовлеченности
+TRENDING_WEIGHTS = {'favorite': 3, 'comment': 2, 'view': 0.1}
+TRENDING_DECAY_SECONDS = 45000
+
+# История просмотров: сколько рецептов хранить на пользователя и как часто
+# сбрасывать буфер просмотров в базу (0 — писать сразу в запросе)
+RECENTLY_VIEWED_LIMIT = int(os.getenv('RECENTLY_VIEWED_LIMIT', 50))
+RECENTLY_VIEWED_FLUSH_INTERVAL = float(os.getenv('RECENTLY_VIEWED_FLUSH_INTERVAL', 5))
+RECENTLY_VIEWED_BATCH_SIZE = 500
+
+# История поиска: сколько запросов хранить на пользователя
+SEARCH_HISTORY_LIMIT = int(os.getenv('SEARCH_HISTORY_LIMIT', 20))
+
+# Подсказки поиска: со скольких пользователей запрос из истории становится
+# подсказкой, вес названия рецепта, период фоновой пересборки индекса (с)
+# и время кэширования ответа клиентом (с)
+SUGGEST_MIN_USERS = 2
+SUGGEST_RECIPE_WEIGHT = 3
+SUGGEST_REFRESH_INTERVAL = 600
+SUGGEST_CACHE_MAX_AGE = 60
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
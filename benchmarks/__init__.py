@@ -0,0 +1,4 @@
+"""
+Нагрузочные замеры API. Запускаются вручную из корня проекта, например
+``python -m benchmarks.asgi_vs_wsgi``; в тестах не участвуют.
+"""
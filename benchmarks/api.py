@@ -0,0 +1,198 @@
+"""
+Замер API по эндпоинтам: задержки p50/p95/p99, пропускная способность и
+число SQL-запросов.
+
+    python -m benchmarks.api --users 50 --recipes 2000 --duration 10
+    python -m benchmarks.compare benchmarks/results/<до>.json benchmarks/results/<после>.json
+
+База — временная SQLite (или --database-url), наполняется benchmarks.seed.
+Число запросов к базе считается в этом же процессе тестовым клиентом
+Django, по одному запросу на эндпоинт; нагрузка идет по HTTP на gunicorn с
+профилем SiteC/gunicorn_config.py. Кэш ответов по умолчанию отключен
+(--with-cache включает), чтобы мерить путь до базы.
+
+Результат сохраняется в JSON (по умолчанию benchmarks/results/) вместе с
+коммитом, временем и параметрами запуска — файлы разных коммитов
+сравнивает benchmarks.compare.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import quote, urlencode
+
+from .asgi_vs_wsgi import ROOT, prepare_database
+from .loadgen import run_load, wait_until_ready
+
+RESULTS_DIR = ROOT / 'benchmarks' / 'results'
+HOST = '127.0.0.1'
+
+
+def endpoints(seeded):
+    """Имя -> (метод, пути, нужен ли токен, тело, Content-Type)."""
+    ids = seeded['recipe_ids']
+    new_recipe = {
+        'name': 'Борщ для замера',
+        'description': 'Описание',
+        'instructions': 'Сварить',
+        'ingredients_list': json.dumps(['свекла', 'капуста', 'картофель'], ensure_ascii=False),
+        'cooking_time': 60,
+        'calories': 300,
+        'attribute_name_0': 'Кухня',
+        'attribute_value_0': 'Русская',
+    }
+    return {
+        'list': ('GET', ['/api/recipes/?page_size=20'], False, None, None),
+        'detail': ('GET', [f'/api/recipes/{pk}/' for pk in ids[:50]], False, None, None),
+        'search': ('GET', ['/api/recipes/?page_size=20&search=' + quote(query) for query in ('борщ', 'пирог', 'каша')],
+                   False, None, None),
+        'create': ('POST', ['/api/recipes/'], True, urlencode(new_recipe), 'application/x-www-form-urlencoded'),
+        'favorites': ('GET', ['/api/favorites/'], True, None, None),
+        'comments': ('GET', [f'/api/comments/?recipe={pk}' for pk in ids[:50]], False, None, None),
+    }
+
+
+def git_revision():
+    def git(*args):
+        result = subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else None
+
+    return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def count_queries(env, seeded, selected):
+    """Число SQL-запросов на один запрос к каждому эндпоинту — в этом процессе."""
+    os.environ.update(env)
+    import django
+    django.setup()
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+
+    client = Client(HTTP_HOST='localhost')
+    auth = {'HTTP_AUTHORIZATION': f"Bearer {seeded['token']}"}
+    counts = {}
+    for name, (method, paths, needs_token, body, content_type) in selected.items():
+        extra = auth if needs_token else {}
+        with CaptureQueriesContext(connection) as ctx:
+            if method == 'GET':
+                response = client.get(paths[0], secure=True, **extra)
+            else:
+                response = client.generic(method, paths[0], body, content_type, secure=True, **extra)
+        if response.status_code >= 400:
+            raise RuntimeError(f'{name}: {method} {paths[0]} -> {response.status_code}: {response.content[:300]!r}')
+        counts[name] = len(ctx.captured_queries)
+    connection.close()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Задержки, пропускная способность и SQL-запросы по эндпоинтам API')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--recipes', type=int, default=1000)
+    parser.add_argument('--comments', type=int, default=5, help='комментариев на рецепт')
+    parser.add_argument('--favorites', type=int, default=10, help='избранных рецептов на пользователя')
+    parser.add_argument('--step-images', type=int, default=3, help='фото шагов на рецепт')
+    parser.add_argument('--endpoints', help='через запятую, по умолчанию все: ' + ', '.join(endpoints({'recipe_ids': []})))
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='секунд нагрузки на эндпоинт')
+    parser.add_argument('--warmup', type=float, default=1.0, help='секунд прогрева перед замером')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=2)
+    parser.add_argument('--database-url', help='своя база вместо временной SQLite (будет мигрирована и наполнена)')
+    parser.add_argument('--with-cache', action='store_true', help='не отключать кэш ответов')
+    parser.add_argument('--port', type=int, default=8768)
+    parser.add_argument('--output', help='файл результата; по умолчанию benchmarks/results/<время>-<коммит>.json')
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='bench-api-')}/bench.sqlite3"
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'SiteC.settings',
+        'DATABASE_URL': database_url,
+        'WEB_CONCURRENCY': str(args.workers),
+        'GUNICORN_THREADS': str(args.threads),
+        'PORT': str(args.port),
+        'WARMUP_HOST': f'{HOST}:{args.port}',
+    }
+    if args.with_cache:
+        # Профиль с несколькими воркерами требует общего кэша — файловый, как Redis в продакшене
+        env['CACHE_BACKEND'] = 'django.core.cache.backends.filebased.FileBasedCache'
+        env['CACHE_LOCATION'] = tempfile.mkdtemp(prefix='bench-api-cache-')
+    else:
+        env['CACHE_BACKEND'] = 'django.core.cache.backends.dummy.DummyCache'
+
+    seeded = prepare_database(env, args.recipes, users=args.users, comments=args.comments,
+                              favorites=args.favorites, step_images=args.step_images)
+    selected = endpoints(seeded)
+    if args.endpoints:
+        names = [name.strip() for name in args.endpoints.split(',')]
+        unknown = set(names) - set(selected)
+        if unknown:
+            parser.error(f"неизвестные эндпоинты: {', '.join(sorted(unknown))}")
+        selected = {name: selected[name] for name in names}
+
+    queries = count_queries(env, seeded, selected)
+
+    command = [sys.executable, '-m', 'gunicorn', 'SiteC.wsgi:application', '-c', 'python:SiteC.gunicorn_config',
+               '--bind', f'{HOST}:{args.port}', '--log-level', 'warning']
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    base_url = f'http://{HOST}:{args.port}'
+    results = {}
+    try:
+        wait_until_ready(base_url, '/api/recipes/?page_size=1')
+        for name, (method, paths, needs_token, body, content_type) in selected.items():
+            headers = {}
+            if needs_token:
+                headers['Authorization'] = f"Bearer {seeded['token']}"
+            if content_type:
+                headers['Content-Type'] = content_type
+            payload = body.encode('utf-8') if body else None
+            load = dict(concurrency=args.concurrency, headers=headers, method=method, body=payload)
+            if args.warmup > 0:
+                run_load(base_url, paths, duration=args.warmup, **load)
+            results[name] = {
+                'method': method,
+                'path': paths[0],
+                'queries': queries[name],
+                **run_load(base_url, paths, duration=args.duration, **load),
+            }
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    print(f"{'endpoint':<10} {'queries':>7} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+    for name, row in results.items():
+        print(f"{name:<10} {row['queries']:>7} {row['rps']:>8} {row['p50_ms']!s:>8} {row['p95_ms']!s:>8} "
+              f"{row['p99_ms']!s:>8} {row['errors']:>7}")
+
+    created_at = datetime.now(timezone.utc)
+    revision = git_revision()
+    report = {
+        'meta': {
+            **revision,
+            'created_at': created_at.isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'database_url')},
+        'seed': {key: value for key, value in seeded.items() if key not in ('recipe_ids', 'token')},
+        'endpoints': results,
+    }
+    if args.output:
+        output = Path(args.output)
+    else:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        output = RESULTS_DIR / f"{created_at:%Y%m%d-%H%M%S}-{(revision['commit'] or 'nogit')[:8]}.json"
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f'Результат: {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+import os
+import time
+
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+def slow_execute(execute, sql, params, many, context):
+    time.sleep(float(os.getenv('BENCH_DB_LATENCY_MS', 0)) / 1000)
+    return execute(sql, params, many, context)
+
+
+def add_latency(connection, **kwargs):
+    # connection_created приходит и при переподключении — обертка нужна одна
+    if float(os.getenv('BENCH_DB_LATENCY_MS', 0)) > 0 and slow_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(slow_execute)
+
+
+class BenchmarksConfig(AppConfig):
+    name = 'benchmarks'
+
+    def ready(self):
+        connection_created.connect(add_latency)
@@ -0,0 +1,120 @@
+"""
+Сравнение WSGI (gunicorn, sync-воркеры) и ASGI (gunicorn + UvicornWorker,
+recipes.async_views) под одинаковой нагрузкой на чтение.
+
+    python -m benchmarks.asgi_vs_wsgi --workers 2 --concurrency 32 --duration 15
+
+Для каждого сервера поднимается отдельный процесс на временной SQLite-базе
+с одними и теми же данными; кэш ответов отключен (DummyCache через
+CACHE_BACKEND), чтобы каждый запрос доходил до базы. --db-latency-ms
+добавляет задержку к каждому SQL-запросу (см. benchmarks.apps) — так видно,
+что происходит при удаленной базе, когда воркер ждет сеть, а не считает.
+Результат печатается таблицей и при --output сохраняется в JSON.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .loadgen import run_load, wait_until_ready
+
+ROOT = Path(__file__).resolve().parent.parent
+
+SERVERS = {
+    'wsgi': ['SiteC.wsgi:application'],
+    'asgi': ['SiteC.asgi:application', '--worker-class', 'uvicorn.workers.UvicornWorker'],
+}
+
+
+def scenarios(seeded):
+    ids = seeded['recipe_ids']
+    auth = {'Authorization': f"Bearer {seeded['token']}"}
+    return {
+        'list': (['/api/recipes/?page_size=20&fields=summary'], {}),
+        'detail': ([f'/api/recipes/{pk}/' for pk in ids[:50]], {}),
+        'comments': ([f'/api/comments/?recipe={pk}' for pk in ids[:50]], {}),
+        'favorites': (['/api/favorites/'], auth),
+    }
+
+
+def prepare_database(env, recipes, **scale):
+    """Мигрирует базу из env и наполняет ее; scale — остальные параметры seed (users=, comments=, ...)."""
+    subprocess.run([sys.executable, 'manage.py', 'migrate', '--noinput', '-v', '0'],
+                   cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+    options = [f"--{name.replace('_', '-')}={value}" for name, value in scale.items()]
+    output = subprocess.run([sys.executable, '-m', 'benchmarks.seed', '--recipes', str(recipes), *options],
+                            cwd=ROOT, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def start_server(kind, env, port, workers, threads):
+    command = [
+        sys.executable, '-m', 'gunicorn', *SERVERS[kind],
+        '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+        '--threads', str(threads), '--log-level', 'warning',
+    ]
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='WSGI против ASGI под одинаковой нагрузкой')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=1, help='потоков на sync-воркер WSGI')
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=15.0)
+    parser.add_argument('--recipes', type=int, default=500)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--db-latency-ms', type=float, default=0.0,
+                        help='искусственная задержка каждого SQL-запроса на сервере')
+    parser.add_argument('--output', help='куда сохранить результаты в JSON')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='bench-asgi-')
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'benchmarks.settings',
+        'DATABASE_URL': f'sqlite:///{workdir}/bench.sqlite3',
+        'CACHE_BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        'RECENTLY_VIEWED_FLUSH_INTERVAL': '5',
+    }
+    seeded = prepare_database(env, args.recipes)
+
+    results = {}
+    for kind in SERVERS:
+        server_env = {
+            **env,
+            'ASYNC_READ_VIEWS': '1' if kind == 'asgi' else '0',
+            'BENCH_DB_LATENCY_MS': str(args.db_latency_ms),
+        }
+        server = start_server(kind, server_env, args.port, args.workers, args.threads)
+        base_url = f'http://127.0.0.1:{args.port}'
+        try:
+            wait_until_ready(base_url, '/api/recipes/?page_size=1')
+            results[kind] = {}
+            for name, (paths, headers) in scenarios(seeded).items():
+                run_load(base_url, paths, concurrency=args.concurrency, duration=1.0, headers=headers)  # прогрев
+                results[kind][name] = run_load(base_url, paths, concurrency=args.concurrency,
+                                               duration=args.duration, headers=headers)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        time.sleep(0.5)
+
+    print(f"{'endpoint':<10} {'server':<5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}")
+    for name in scenarios(seeded):
+        for kind in SERVERS:
+            row = results[kind][name]
+            print(f"{name:<10} {kind:<5} {row['rps']:>8} {row['p50_ms']:>8} {row['p95_ms']:>8} "
+                  f"{row['p99_ms']:>8} {row['errors']:>7}")
+
+    if args.output:
+        report = {'config': vars(args), 'results': results}
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Холодный старт: прежняя команда из Procfile против профиля
+SiteC/gunicorn_config.py.
+
+    python -m benchmarks.cold_start --workers 2 --runs 3
+
+baseline — migrate и gunicorn с настройками по умолчанию, как до профиля;
+profile — gunicorn -c python:SiteC.gunicorn_config (миграции уже выполнены
+шагом релиза). Для каждого запуска меряется время от старта процесса до
+первого ответа и задержки первых секунд трафика (--burst), пока воркеры
+еще не обслужили ни одного запроса. В отчете медианы по запускам.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+from .asgi_vs_wsgi import ROOT, prepare_database
+from .loadgen import run_load
+
+PROFILES = {
+    'baseline': ['SiteC.wsgi:application'],
+    'profile': ['SiteC.wsgi:application', '-c', 'python:SiteC.gunicorn_config'],
+}
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.01)
+    raise RuntimeError(f'Порт {port} не открылся за {timeout} с')
+
+
+def first_response(port, path):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    connection.request('GET', path, headers={'X-Forwarded-Proto': 'https'})
+    status = connection.getresponse()
+    status.read()
+    connection.close()
+    return status.status
+
+
+def boot(kind, env, args, paths):
+    started = time.perf_counter()
+    if kind == 'baseline':
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '--noinput', '-v', '0'],
+                       cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+    command = [sys.executable, '-m', 'gunicorn', *PROFILES[kind], '--bind', f'127.0.0.1:{args.port}',
+               '--log-level', 'warning']
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(args.port)
+        status = first_response(args.port, paths[0])
+        ready = time.perf_counter() - started
+        burst = run_load(f'http://127.0.0.1:{args.port}', paths, concurrency=args.concurrency,
+                         duration=args.burst)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return {'first_response_s': round(ready, 3), 'first_status': status, **burst}
+
+
+def median_row(runs):
+    keys = ('first_response_s', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')
+    return {key: round(statistics.median(run[key] for run in runs), 3) for key in keys}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Холодный старт: прежний запуск против профиля gunicorn')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--burst', type=float, default=3.0, help='секунд нагрузки сразу после старта')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--recipes', type=int, default=500)
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--output', help='куда сохранить результаты в JSON')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='bench-boot-')
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'SiteC.settings',
+        'DATABASE_URL': f'sqlite:///{workdir}/bench.sqlite3',
+        'WEB_CONCURRENCY': str(args.workers),
+        # Профиль с несколькими воркерами требует общего кэша
+        'CACHE_BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'CACHE_LOCATION': f'{workdir}/cache',
+        'PORT': str(args.port),
+        'WARMUP_HOST': f'127.0.0.1:{args.port}',
+    }
+    seeded = prepare_database(env, args.recipes)
+    paths = [
+        '/api/recipes/',
+        '/api/search/suggest/?q=' + quote('ре'),
+        *[f'/api/recipes/{pk}/' for pk in seeded['recipe_ids'][:20]],
+    ]
+
+    results = {}
+    for kind in PROFILES:
+        runs = [boot(kind, env, args, paths) for _ in range(args.runs)]
+        results[kind] = {'median': median_row(runs), 'runs': runs}
+        time.sleep(0.5)
+
+    print(f"{'profile':<9} {'first, s':>9} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    for kind, result in results.items():
+        row = result['median']
+        print(f"{kind:<9} {row['first_response_s']:>9} {row['rps']:>8} {row['p50_ms']:>8} "
+              f"{row['p95_ms']:>8} {row['p99_ms']:>8} {row['max_ms']:>8}")
+
+    if args.output:
+        report = {'config': vars(args), 'results': results}
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
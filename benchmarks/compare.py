@@ -0,0 +1,80 @@
+"""
+Сравнение двух результатов benchmarks.api.
+
+    python -m benchmarks.compare benchmarks/results/<до>.json benchmarks/results/<после>.json
+
+Для каждого эндпоинта печатает метрики обоих запусков и изменение в
+процентах; --fail-above 10 завершает с кодом 1, если задержка или число
+запросов выросли больше чем на 10%, — для проверки в CI.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+METRICS = ('queries', 'rps', 'p50_ms', 'p95_ms', 'p99_ms')
+# Для этих метрик рост — ухудшение
+LOWER_IS_BETTER = ('queries', 'p50_ms', 'p95_ms', 'p99_ms')
+
+
+def change(before, after):
+    if before in (None, 0) or after is None:
+        return None
+    return (after - before) / before * 100
+
+
+def compare(base, head):
+    """[(эндпоинт, метрика, до, после, изменение в %)] по общим эндпоинтам."""
+    rows = []
+    for name, before in base['endpoints'].items():
+        after = head['endpoints'].get(name)
+        if after is None:
+            continue
+        for metric in METRICS:
+            rows.append((name, metric, before.get(metric), after.get(metric),
+                         change(before.get(metric), after.get(metric))))
+    return rows
+
+
+def regressions(rows, threshold):
+    return [
+        row for row in rows
+        if row[4] is not None and row[1] in LOWER_IS_BETTER and row[4] > threshold
+    ]
+
+
+def label(report):
+    meta = report.get('meta', {})
+    commit = (meta.get('commit') or '?')[:8]
+    return f"{commit}{'+' if meta.get('dirty') else ''} {meta.get('created_at', '')}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Сравнение двух результатов benchmarks.api')
+    parser.add_argument('base', help='результат "до"')
+    parser.add_argument('head', help='результат "после"')
+    parser.add_argument('--fail-above', type=float, help='порог ухудшения в процентах')
+    args = parser.parse_args(argv)
+
+    base = json.loads(Path(args.base).read_text(encoding='utf-8'))
+    head = json.loads(Path(args.head).read_text(encoding='utf-8'))
+    if base.get('config') != head.get('config') or base.get('seed') != head.get('seed'):
+        print('Внимание: параметры запусков различаются, сравнение может быть некорректным')
+
+    print(f'до:    {label(base)}\nпосле: {label(head)}')
+    print(f"{'endpoint':<10} {'metric':<8} {'до':>10} {'после':>10} {'изм.':>8}")
+    rows = compare(base, head)
+    for name, metric, before, after, delta in rows:
+        shown = f'{delta:+.1f}%' if delta is not None else '—'
+        print(f'{name:<10} {metric:<8} {before!s:>10} {after!s:>10} {shown:>8}')
+
+    if args.fail_above is not None:
+        worse = regressions(rows, args.fail_above)
+        for name, metric, before, after, delta in worse:
+            print(f'Ухудшение: {name} {metric} {before} -> {after} ({delta:+.1f}%)', file=sys.stderr)
+        if worse:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
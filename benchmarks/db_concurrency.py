@@ -0,0 +1,102 @@
+"""
+Одновременные чтение и запись в SQLite: журнал по умолчанию против
+профиля WAL из SiteC/settings.py.
+
+    python -m benchmarks.db_concurrency --readers 16 --writers 4 --duration 10
+
+Для каждого профиля создается своя база (режим журнала сохраняется в
+файле), поднимается gunicorn с профилем SiteC/gunicorn_config.py, и
+одновременно идут две нагрузки: читатели запрашивают список и карточки
+рецептов, писатели добавляют комментарии. Кэш ответов отключен, чтобы
+чтение доходило до базы. Ошибки записи — в основном "database is locked".
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from .asgi_vs_wsgi import ROOT, prepare_database
+from .loadgen import run_load, wait_until_ready
+
+PROFILES = {
+    'rollback': '0',
+    'wal': '1',
+}
+
+
+def run_mixed(base_url, seeded, args):
+    ids = seeded['recipe_ids']
+    reads = ['/api/recipes/?page_size=20&fields=summary', *[f'/api/recipes/{pk}/' for pk in ids[:50]]]
+    write_headers = {'Authorization': f"Bearer {seeded['token']}", 'Content-Type': 'application/json'}
+    body = json.dumps({'recipe': ids[0], 'text': 'Комментарий под нагрузкой'}).encode('utf-8')
+
+    results = {}
+
+    def writers():
+        results['write'] = run_load(base_url, ['/api/comments/'], concurrency=args.writers,
+                                    duration=args.duration, headers=write_headers, method='POST', body=body)
+
+    thread = threading.Thread(target=writers)
+    thread.start()
+    results['read'] = run_load(base_url, reads, concurrency=args.readers, duration=args.duration)
+    thread.join()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Чтение и запись в SQLite одновременно: журнал против WAL')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--recipes', type=int, default=500)
+    parser.add_argument('--port', type=int, default=8767)
+    parser.add_argument('--output', help='куда сохранить результаты в JSON')
+    args = parser.parse_args(argv)
+
+    results = {}
+    for profile, wal in PROFILES.items():
+        workdir = tempfile.mkdtemp(prefix=f'bench-{profile}-')
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'SiteC.settings',
+            'DATABASE_URL': f'sqlite:///{workdir}/bench.sqlite3',
+            'SQLITE_WAL': wal,
+            'CACHE_BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+            'WEB_CONCURRENCY': str(args.workers),
+            'GUNICORN_THREADS': str(args.threads),
+            'PORT': str(args.port),
+            'WARMUP_HOST': f'127.0.0.1:{args.port}',
+        }
+        seeded = prepare_database(env, args.recipes)
+        command = [sys.executable, '-m', 'gunicorn', 'SiteC.wsgi:application', '-c', 'python:SiteC.gunicorn_config',
+                   '--bind', f'127.0.0.1:{args.port}', '--log-level', 'warning']
+        server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+        base_url = f'http://127.0.0.1:{args.port}'
+        try:
+            wait_until_ready(base_url, '/api/recipes/?page_size=1')
+            results[profile] = run_mixed(base_url, seeded, args)
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+        time.sleep(0.5)
+
+    print(f"{'profile':<9} {'load':<6} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>9} {'errors':>7}")
+    for profile, loads in results.items():
+        for load, row in loads.items():
+            print(f"{profile:<9} {load:<6} {row['rps']:>8} {row['p50_ms']!s:>8} {row['p95_ms']!s:>8} "
+                  f"{row['p99_ms']!s:>8} {row['max_ms']!s:>9} {row['errors']:>7}")
+
+    if args.output:
+        report = {'config': vars(args), 'results': results}
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Генератор нагрузки на стандартной библиотеке.
+
+Замкнутая модель: ``concurrency`` клиентов в потоках, у каждого свое
+keep-alive соединение; следующий запрос уходит сразу после ответа на
+предыдущий. Все запросы идут с X-Forwarded-Proto: https, как из-за прокси,
+иначе SECURE_SSL_REDIRECT ответит редиректом.
+"""
+import http.client
+import itertools
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, errors, elapsed):
+    ms = [latency * 1000 for latency in latencies]
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(ms, 50), 2) if ms else None,
+        'p95_ms': round(percentile(ms, 95), 2) if ms else None,
+        'p99_ms': round(percentile(ms, 99), 2) if ms else None,
+        'max_ms': round(max(ms), 2) if ms else None,
+    }
+
+
+def run_load(base_url, paths, concurrency=16, duration=10.0, headers=None, method='GET', body=None):
+    """Гоняет запросы по кругу по paths в течение duration секунд и возвращает сводку."""
+    parts = urlsplit(base_url)
+    headers = {'X-Forwarded-Proto': 'https', 'Connection': 'keep-alive', **(headers or {})}
+    cycle = itertools.cycle(paths)
+    cycle_lock = threading.Lock()
+    latencies, lock = [], threading.Lock()
+    errors = [0]
+    deadline = time.perf_counter() + duration
+
+    def client():
+        connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        local, failed = [], 0
+        while time.perf_counter() < deadline:
+            with cycle_lock:
+                path = next(cycle)
+            started = time.perf_counter()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 400:
+                    failed += 1
+                else:
+                    local.append(time.perf_counter() - started)
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+
+def wait_until_ready(base_url, path='/', timeout=30.0):
+    parts = urlsplit(base_url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=2)
+            connection.request('GET', path, headers={'X-Forwarded-Proto': 'https'})
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Сервер {base_url} не поднялся за {timeout} с')
@@ -0,0 +1,109 @@
+"""
+Чтение своих записей при отстающей реплике.
+
+    python -m benchmarks.replica_lag --lag 2 --writes 20
+
+Основная база и реплика — две временные SQLite; manage.py sync_replica
+копирует основную в реплику раз в --lag секунд. На gunicorn с профилем
+SiteC/gunicorn_config.py пользователь добавляет комментарий и сразу
+запрашивает комментарии рецепта — сам и анонимно. Запуск повторяется с
+закреплением записавшего за основной базой (REPLICA_PIN_SECONDS) и без
+него. Кэш — файловый, общий для воркеров, как Redis в продакшене.
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from .asgi_vs_wsgi import ROOT, prepare_database
+from .loadgen import wait_until_ready
+
+HOST = '127.0.0.1'
+
+
+def request(port, method, path, token=None, body=None):
+    headers = {'X-Forwarded-Proto': 'https', 'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    connection = http.client.HTTPConnection(HOST, port, timeout=10)
+    try:
+        connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or 'null')
+    finally:
+        connection.close()
+
+
+def comment_ids(payload):
+    items = payload['results'] if isinstance(payload, dict) else payload
+    return {item['id'] for item in items}
+
+
+def run_writes(port, seeded, writes):
+    recipe = seeded['recipe_ids'][0]
+    stale = {'writer': 0, 'anonymous': 0}
+    for index in range(writes):
+        status, created = request(port, 'POST', '/api/comments/', seeded['token'],
+                                  {'recipe': recipe, 'text': f'Комментарий {index}'})
+        if status != 201:
+            raise RuntimeError(f'POST /api/comments/ -> {status}: {created}')
+        path = f'/api/comments/?recipe={recipe}&page_size=100'
+        for reader, token in (('writer', seeded['token']), ('anonymous', None)):
+            _, payload = request(port, 'GET', path, token)
+            stale[reader] += created['id'] not in comment_ids(payload)
+        time.sleep(0.05)
+    return stale
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Чтение своих записей при отстающей SQLite-реплике')
+    parser.add_argument('--lag', type=float, default=2.0, help='период копирования в реплику, секунд')
+    parser.add_argument('--writes', type=int, default=20)
+    parser.add_argument('--recipes', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--port', type=int, default=8769)
+    args = parser.parse_args(argv)
+
+    results = {}
+    for profile, pin_seconds in (('pinned', '10'), ('unpinned', '0')):
+        workdir = tempfile.mkdtemp(prefix=f'bench-replica-{profile}-')
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'SiteC.settings',
+            'DATABASE_URL': f'sqlite:///{workdir}/primary.sqlite3',
+            'DATABASE_REPLICA_URLS': f'sqlite:///{workdir}/replica.sqlite3',
+            'REPLICA_PIN_SECONDS': pin_seconds,
+            'CACHE_BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'CACHE_LOCATION': f'{workdir}/cache',
+            'WEB_CONCURRENCY': str(args.workers),
+            'PORT': str(args.port),
+            'WARMUP_HOST': f'{HOST}:{args.port}',
+        }
+        seeded = prepare_database(env, args.recipes)
+        manage = [sys.executable, 'manage.py', 'sync_replica']
+        subprocess.run(manage, cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+        syncer = subprocess.Popen([*manage, '--interval', str(args.lag)], cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+        command = [sys.executable, '-m', 'gunicorn', 'SiteC.wsgi:application', '-c', 'python:SiteC.gunicorn_config',
+                   '--bind', f'{HOST}:{args.port}', '--log-level', 'warning']
+        server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL)
+        try:
+            wait_until_ready(f'http://{HOST}:{args.port}', '/api/recipes/?page_size=1')
+            results[profile] = run_writes(args.port, seeded, args.writes)
+        finally:
+            for process in (server, syncer):
+                process.terminate()
+                process.wait(timeout=30)
+        time.sleep(0.5)
+
+    print(f'Устаревших чтений сразу после записи из {args.writes} (реплика обновляется раз в {args.lag} с):')
+    print(f"{'profile':<10} {'writer':>7} {'anonymous':>10}")
+    for profile, stale in results.items():
+        print(f"{profile:<10} {stale['writer']:>7} {stale['anonymous']:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Тестовые данные для замеров: пользователи, рецепты с атрибутами, фото и
+фото шагов, комментарии и избранное. Масштаб задается параметрами, данные
+детерминированы (--seed).
+
+    DATABASE_URL=sqlite:////tmp/bench.sqlite3 python -m benchmarks.seed --users 100 --recipes 5000
+
+Печатает JSON со сводкой и access-токеном первого пользователя.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+
+
+def seed(users=20, recipes=200, comments=5, favorites=10, step_images=3, random_seed=42):
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    from recipes.bulk import bulk_insert_recipes
+    from recipes.models import Comment, Favorite
+
+    rng = random.Random(random_seed)
+    people = User.objects.bulk_create([User(username=f'bench{i}') for i in range(users)])
+    cuisines = ['Русская', 'Итальянская', 'Грузинская', 'Японская']
+    dishes = ['Борщ', 'Омлет', 'Салат', 'Пирог', 'Суп', 'Плов', 'Блины', 'Паста', 'Котлеты', 'Каша']
+    products = ['яйца', 'мука', 'молоко', 'соль', 'сахар', 'помидоры', 'сыр', 'курица', 'рис', 'лук']
+    items = [
+        {
+            'name': f'{rng.choice(dishes)} — рецепт {i}',
+            'description': 'Описание рецепта ' * 10,
+            'ingredients_list': rng.sample(products, 5),
+            'instructions': 'Шаг приготовления. ' * 5,
+            'image': f'recipes/bench-{i}.jpg',
+            'step_images': [f'recipes/steps/bench-{i}-{step}.jpg' for step in range(step_images)],
+            'cooking_time': rng.randint(5, 180),
+            'calories': rng.randint(50, 1200),
+            'attributes': [
+                {'name': 'Кухня', 'value': rng.choice(cuisines)},
+                {'name': 'Сложность', 'value': rng.choice(['Легко', 'Средне', 'Сложно'])},
+            ],
+        }
+        for i in range(recipes)
+    ]
+    created = bulk_insert_recipes(items, user=people[0])
+    Comment.objects.bulk_create([
+        Comment(recipe=recipe, author=rng.choice(people), text='Отличный рецепт')
+        for recipe in created for _ in range(comments)
+    ], batch_size=500)
+    Favorite.objects.bulk_create([
+        Favorite(user=user, recipe=recipe)
+        for user in people for recipe in rng.sample(created, min(favorites, len(created)))
+    ], batch_size=500)
+    # bulk_create не шлет сигналов: счетчики и trending_score для /popular/ и
+    # /trending/ сверяются с таблицами одним проходом
+    call_command('reconcile_counters', stdout=io.StringIO())
+    return {
+        'users': users,
+        'recipes': recipes,
+        'comments': comments * recipes,
+        'favorites': favorites * users,
+        'step_images': step_images * recipes,
+        'recipe_ids': [recipe.pk for recipe in created],
+        'token': str(RefreshToken.for_user(people[0]).access_token),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--recipes', type=int, default=200)
+    parser.add_argument('--comments', type=int, default=5, help='комментариев на рецепт')
+    parser.add_argument('--favorites', type=int, default=10, help='избранных рецептов на пользователя')
+    parser.add_argument('--step-images', type=int, default=3, help='фото шагов на рецепт')
+    parser.add_argument('--seed', type=int, default=42, help='зерно генератора')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SiteC.settings')
+    import django
+    django.setup()
+    summary = seed(args.users, args.recipes, args.comments, args.favorites, args.step_images, args.seed)
+    json.dump(summary, sys.stdout, ensure_ascii=False)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
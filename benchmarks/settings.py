@@ -0,0 +1,8 @@
+"""
+Настройки для замеров: проектные плюс приложение benchmarks, которое при
+BENCH_DB_LATENCY_MS > 0 добавляет задержку к каждому SQL-запросу — как
+сетевой round trip до удаленной базы.
+"""
+from SiteC.settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [*INSTALLED_APPS, 'benchmarks']  # noqa: F405
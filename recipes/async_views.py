@@ -0,0 +1,157 @@
+"""
+Асинхронные обработчики чтения для запуска под ASGI.
+
+Под gunicorn с sync-воркерами каждый медленный запрос к базе или хранилищу
+занимает целый воркер. Здесь GET для списка и карточки рецепта, комментариев
+и избранного выполняется корутиной: запросы идут через async ORM, кэш — через
+aget/aset, поэтому воркер продолжает обслуживать другие соединения.
+
+Построение queryset, фильтры, пагинация и сериализация общие с DRF-view из
+views.py; остальные методы (POST, PUT, DELETE) передаются им же. Маршруты
+подключаются в urls.py при ASYNC_READ_VIEWS (его включает SiteC/asgi.py),
+под WSGI работают только обычные view.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.shortcuts import aget_object_or_404
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .cache import acached_response, acollection_version, arecipe_version
+from .favorites import afavorites_version, favorites_personalization, get_favorite_ids
+from .filters import facet_counts
+from .models import Recipe
+from .serializers import CommentSerializer, FavoriteSerializer, RecipeSerializer
+from .timing import span
+from .tracking import view_tracker
+from .views import CommentViewSet, FavoriteListCreateView, RecipeViewSet
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    with span('render'):
+        return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status_code)
+
+
+def error_response(request, exc):
+    # Тот же формат, что у обработчика исключений DRF
+    detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = render(detail, exc.status_code)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        authenticators = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        if authenticators:
+            header = authenticators[0]().authenticate_header(request)
+            if header:
+                response['WWW-Authenticate'] = header
+        else:
+            response.status_code = status.HTTP_403_FORBIDDEN
+    return response
+
+
+def async_read(sync_view):
+    """GET и HEAD обслуживает корутина, остальные методы — синхронный DRF-view."""
+    def decorator(handler):
+        @wraps(handler)
+        async def view(request, *args, **kwargs):
+            if request.method not in SAFE_METHODS:
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+            authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+            drf_request = Request(request, authenticators=authenticators)
+            try:
+                if 'HTTP_AUTHORIZATION' in request.META:
+                    # Пользователь из JWT берется из кэша, а при промахе — из базы
+                    await sync_to_async(lambda: drf_request.user)()
+                else:
+                    drf_request.user  # Аноним: без токена в базу не ходим
+                return await handler(drf_request, *args, **kwargs)
+            except Http404 as exc:
+                return error_response(drf_request, exceptions.NotFound(*exc.args))
+            except exceptions.APIException as exc:
+                return error_response(drf_request, exc)
+
+        # Как у DRF: аутентификация по токену, а не по cookie
+        view.csrf_exempt = True
+        return view
+    return decorator
+
+
+def bind_view(view_class, request, action=None, **kwargs):
+    """Экземпляр DRF-view для построения queryset без вызова его обработчиков."""
+    view = view_class()
+    view.request = request
+    view.args = ()
+    view.kwargs = kwargs
+    view.format_kwarg = None
+    view.action = action
+    return view
+
+
+async def personalization(request):
+    if not request.user.is_authenticated:
+        return {}
+    favorite_ids = await sync_to_async(get_favorite_ids)(request.user)
+    return favorites_personalization(favorite_ids, await afavorites_version(request.user.pk))
+
+
+@async_read(RecipeViewSet.as_view({'get': 'list', 'post': 'create'}))
+async def recipe_list(request):
+    view = bind_view(RecipeViewSet, request, action='list')
+
+    async def build():
+        queryset = view.filter_queryset(view.get_queryset())
+        page = await view.paginator.apaginate_queryset(queryset, request, view)
+        items = page if page is not None else [recipe async for recipe in queryset]
+        facets = await sync_to_async(facet_counts)(queryset) if view.wants_facets(request) else None
+        return view.list_payload(request, items, page is not None, facets)
+
+    return await acached_response(request._request, await acollection_version(), build,
+                                  **await personalization(request))
+
+
+@async_read(RecipeViewSet.as_view({'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy'}))
+async def recipe_detail(request, pk):
+    view = bind_view(RecipeViewSet, request, action='retrieve', pk=pk)
+
+    async def build():
+        recipe = await aget_object_or_404(RecipeSerializer.setup_eager_loading(Recipe.objects.all(), request), pk=pk)
+        with span('serialize'):
+            return RecipeSerializer(recipe, context=view.get_cacheable_context(request)).data
+
+    response = await acached_response(request._request, await arecipe_version(pk), build,
+                                      **await personalization(request))
+    if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+        user_id = request.user.id if request.user.is_authenticated else None
+        if view_tracker.interval <= 0:
+            # Без буфера запись идет сразу в базу — только из потока
+            await sync_to_async(view_tracker.record)(user_id, pk)
+        else:
+            view_tracker.record(user_id, pk)
+    return response
+
+
+@async_read(CommentViewSet.as_view({'get': 'list', 'post': 'create'}))
+async def comment_list(request):
+    view = bind_view(CommentViewSet, request, action='list')
+    page = await view.paginator.apaginate_queryset(view.get_queryset(), request, view)
+    with span('serialize'):
+        data = CommentSerializer(page, many=True, context={'request': request}).data
+    return render(view.paginator.get_paginated_response(data).data)
+
+
+@async_read(FavoriteListCreateView.as_view())
+async def favorite_list(request):
+    if not request.user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    view = bind_view(FavoriteListCreateView, request)
+    favorites = [favorite async for favorite in view.get_queryset()]
+    # Множество избранного читаем заранее: в корутине сериализатор не должен ходить в базу
+    favorite_ids = await sync_to_async(get_favorite_ids)(request.user)
+    context = {'request': request, 'favorite_ids': favorite_ids}
+    with span('serialize'):
+        data = FavoriteSerializer(favorites, many=True, context=context).data
+    return render(data)
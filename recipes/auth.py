@@ -0,0 +1,171 @@
+"""
+Аутентификация по JWT без запроса к auth_user на каждый запрос.
+
+CachedJWTAuthentication ищет пользователя из токена сначала в LRU процесса
+(USER_CACHE_SIZE записей на USER_CACHE_LOCAL_TIMEOUT секунд), затем в общем
+кэше Django (USER_CACHE_TIMEOUT секунд) и только потом в базе. Проверки те
+же, что у JWTAuthentication: пользователь активен, пароль не менялся
+(CHECK_REVOKE_TOKEN).
+
+В кэше лежит не строка auth_user, а только id, is_active и md5 от хэша
+пароля (тот же, что в токене) — хэш пароля и личные данные в общий кэш не
+попадают. request.user собирается из этой записи с отложенными полями:
+username, email и прочее читаются из базы при первом обращении.
+
+Сигналы (recipes/signals.py) сбрасывают запись при сохранении и удалении
+пользователя — деактивация, смена пароля или прав тоже идут через save().
+Другие процессы узнают об изменении только из общего кэша, поэтому их LRU
+может отдавать прежнюю запись до USER_CACHE_LOCAL_TIMEOUT секунд. Если кэш
+Django — память процесса (LocMemCache), сброс до других воркеров не доходит
+вовсе, поэтому запись в нем тоже живет не дольше USER_CACHE_LOCAL_TIMEOUT.
+QuerySet.update() сигналов не шлет — после него нужен invalidate_user().
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import is_process_local
+
+# Метка сброшенной записи в общем кэше: пока она жива, прочитанного из базы
+# пользователя в кэш не кладем — чтение могло начаться до коммита изменения
+INVALIDATED = 'invalidated'
+
+
+def user_key(user_id):
+    return f'recipes:auth:{user_id}'
+
+
+def shared_timeout():
+    timeout = getattr(settings, 'USER_CACHE_TIMEOUT', 300)
+    if is_process_local():
+        # Деактивацию в другом воркере этот кэш не увидит — держим запись не дольше LRU
+        return min(timeout, getattr(settings, 'USER_CACHE_LOCAL_TIMEOUT', 5))
+    return timeout
+
+
+def user_entry(user):
+    """Запись кэша: только то, что нужно для проверок токена."""
+    return {
+        'pk': user.pk,
+        'is_active': user.is_active,
+        'password_digest': get_md5_hash_password(user.password),
+    }
+
+
+class LocalUserCache:
+    """LRU пользователей в памяти процесса с коротким временем жизни записи."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @property
+    def size(self):
+        return getattr(settings, 'USER_CACHE_SIZE', 1024)
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'USER_CACHE_LOCAL_TIMEOUT', 5)
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            expires, user = entry
+            if expires <= time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, user):
+        if self.timeout <= 0:
+            return
+        with self._lock:
+            self._entries[user_id] = (time.monotonic() + self.timeout, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def delete(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_users = LocalUserCache()
+
+
+def invalidate_user(user_id):
+    user_id = str(user_id)
+    local_users.delete(user_id)
+    timeout = max(getattr(settings, 'USER_CACHE_LOCAL_TIMEOUT', 5), 1)
+    cache.set(user_key(user_id), INVALIDATED, timeout)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        # В токене id может быть и числом, и строкой — ключ кэша всегда строка
+        entry = self.get_cached_user(str(user_id))
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not entry['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != entry['password_digest']:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return self.build_user(entry)
+
+    def build_user(self, entry):
+        """
+        Пользователь с загруженными pk и is_active; остальные поля отложены и
+        читаются из базы при обращении. Каждый запрос получает свой объект.
+        """
+        loaded = {self.user_model._meta.pk.attname: entry['pk'], 'is_active': entry['is_active']}
+        fields = [field.attname for field in self.user_model._meta.concrete_fields if field.attname in loaded]
+        return self.user_model.from_db(
+            router.db_for_write(self.user_model), fields, [loaded[name] for name in fields])
+
+    def get_cached_user(self, user_id):
+        entry = local_users.get(user_id)
+        if entry is not None:
+            return entry
+
+        key = user_key(user_id)
+        cached = cache.get(key)
+        if cached is not None and cached != INVALIDATED:
+            local_users.set(user_id, cached)
+            return cached
+
+        try:
+            # Кэш наполняется из основной базы: реплика может не знать о деактивации
+            user = self.user_model.objects.db_manager(router.db_for_write(self.user_model)).only(
+                'is_active', 'password').get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        entry = user_entry(user)
+        if cached is None:
+            # add, а не set: не затираем метку, поставленную параллельным сбросом
+            cache.add(key, entry, shared_timeout())
+            local_users.set(user_id, entry)
+        return entry
@@ -0,0 +1,54 @@
+"""
+Пакетная запись рецептов: импорт через API и из файлов.
+
+bulk_create не вызывает ни save(), ни сигналы, поэтому trending_score,
+поисковый индекс, индекс ингредиентов, уменьшенные копии фото и версии кэша обновляются здесь явно.
+"""
+from django.db import transaction
+
+from .cache import bump_collection
+from .images import schedule_renditions
+from .ingredients import index_ingredients
+from .models import Recipe, RecipeAttribute, RecipeStepImage
+from .search import index_recipes
+
+
+def bulk_insert_recipes(items, user=None, using='default', batch_size=500):
+    """
+    items — словари с полями рецепта плюс необязательные ``attributes``
+    (список {'name', 'value'}) и ``step_images`` (список путей в хранилище).
+    Возвращает созданные рецепты в том же порядке.
+    """
+    recipes, attributes, step_images = [], [], []
+    for item in items:
+        item = dict(item)
+        attributes.append(item.pop('attributes', None) or [])
+        step_images.append(item.pop('step_images', None) or [])
+        item.setdefault('user', user)
+        recipe = Recipe(**item)
+        recipe.trending_score = recipe.compute_trending_score()
+        recipes.append(recipe)
+
+    with transaction.atomic(using=using):
+        Recipe.objects.using(using).bulk_create(recipes, batch_size=batch_size)
+        RecipeAttribute.objects.using(using).bulk_create(
+            [
+                RecipeAttribute(recipe=recipe, name=attr['name'], value=attr['value'])
+                for recipe, attrs in zip(recipes, attributes)
+                for attr in attrs
+            ],
+            batch_size=batch_size,
+        )
+        steps = RecipeStepImage.objects.using(using).bulk_create(
+            [
+                RecipeStepImage(recipe=recipe, image=image)
+                for recipe, images in zip(recipes, step_images)
+                for image in images
+            ],
+            batch_size=batch_size,
+        )
+        index_recipes(recipes, using=using)
+        index_ingredients(recipes, using=using)
+        schedule_renditions([*recipes, *steps], using=using)
+        transaction.on_commit(bump_collection, using=using)
+    return recipes
@@ -0,0 +1,186 @@
+"""
+Кэш ответов для чтения рецептов.
+
+Ключ ответа включает версию: у всей коллекции и у каждого рецепта она своя.
+Сигналы поднимают версию при любом изменении рецепта, его атрибутов или
+фото шагов, а recipes.counters — при изменении избранного и комментариев,
+поэтому старые записи просто перестают читаться и истекают по таймауту.
+Просмотры версию не поднимают: view_count в ответах обновляется, когда
+запись истекает (RECIPE_CACHE_TIMEOUT).
+
+ETag — хэш JSON закэшированных данных, Last-Modified — время их сборки,
+поэтому валидаторы всегда соответствуют телу: пересобранный ответ с другими
+данными получает новый ETag, даже если версия не менялась (запись истекла,
+или изменение сделал воркер, который не видит кэш этого процесса).
+
+Версия — время последнего изменения. Пока она моложе REPLICA_PIN_SECONDS,
+реплика может еще не содержать изменение, поэтому ответ для кэша собирается
+по основной базе (recipes.replicas.primary_reads).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .replicas import pin_timeout, primary_reads
+
+COLLECTION_VERSION_KEY = 'recipes:version:collection'
+
+
+def is_process_local(alias='default'):
+    """LocMemCache живет в памяти процесса: записи и сбросы не видны другим воркерам."""
+    return isinstance(caches[alias], LocMemCache)
+
+
+def recipe_version_key(pk):
+    return f'recipes:version:recipe:{pk}'
+
+
+def get_timeout():
+    return getattr(settings, 'RECIPE_CACHE_TIMEOUT', 60)
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Холодный кэш: заводим новую версию, все прежние ETag становятся недействительны
+        cache.add(key, time.time(), timeout=None)
+        version = cache.get(key) or time.time()
+    return version
+
+
+def bump_collection():
+    cache.set(COLLECTION_VERSION_KEY, time.time(), timeout=None)
+
+
+def bump_recipe(pk):
+    bump_recipes([pk])
+
+
+def bump_recipes(pks):
+    now = time.time()
+    cache.set_many({COLLECTION_VERSION_KEY: now, **{recipe_version_key(pk): now for pk in pks}}, timeout=None)
+
+
+def collection_version():
+    return get_version(COLLECTION_VERSION_KEY)
+
+
+def recipe_version(pk):
+    return get_version(recipe_version_key(pk))
+
+
+def is_recent(version):
+    return time.time() - version < pin_timeout()
+
+
+def response_key(request, fmt, version):
+    raw = f'{request.build_absolute_uri()}|{fmt}|{version!r}'
+    return f'recipes:entry:{hashlib.md5(raw.encode("utf-8")).hexdigest()}'
+
+
+def make_entry(data):
+    """Запись кэша: данные, хэш их JSON (основа ETag) и время сборки (Last-Modified)."""
+    body = JSONRenderer().render(data)
+    return {'data': data, 'digest': hashlib.md5(body).hexdigest(), 'modified': time.time()}
+
+
+def entry_validators(entry, variant='', variant_modified=None):
+    """
+    ETag и Last-Modified записи. variant добавляет к ETag персональную часть,
+    variant_modified — время ее изменения; Last-Modified — более позднее из двух.
+    """
+    digest = entry['digest']
+    etag = quote_etag(hashlib.md5(f'{digest}|{variant}'.encode('utf-8')).hexdigest() if variant else digest)
+    return etag, int(max(entry['modified'], variant_modified or 0))
+
+
+def cached_response(request, version, build, variant='', personalize=None, variant_modified=None):
+    """
+    Отдает 304, если у клиента актуальная копия, иначе данные из кэша или
+    результат build() (Response), который затем кэшируется.
+
+    Закэшированные данные общие для всех пользователей; personalize(data)
+    добавляет к ним персональную часть, variant учитывает ее в ETag, а
+    variant_modified — в Last-Modified (для If-Modified-Since).
+    """
+    key = response_key(request, request.accepted_renderer.format, version)
+    entry = cache.get(key)
+    if entry is None:
+        if is_recent(version):
+            with primary_reads():
+                response = build()
+        else:
+            response = build()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        entry = make_entry(response.data)
+        cache.set(key, entry, get_timeout())
+
+    etag, last_modified = entry_validators(entry, variant, variant_modified)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    data = entry['data']
+    if personalize is not None:
+        data = personalize(data)
+    response = Response(data)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+async def aget_version(key):
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time(), timeout=None)
+        version = await cache.aget(key) or time.time()
+    return version
+
+
+async def acollection_version():
+    return await aget_version(COLLECTION_VERSION_KEY)
+
+
+async def arecipe_version(pk):
+    return await aget_version(recipe_version_key(pk))
+
+
+async def acached_response(request, version, build, variant='', personalize=None, variant_modified=None):
+    """
+    Асинхронный вариант cached_response для async_views: build — корутина,
+    возвращающая данные ответа. Записи кэша общие с синхронными view (формат json).
+    """
+    key = response_key(request, 'json', version)
+    entry = await cache.aget(key)
+    if entry is None:
+        if is_recent(version):
+            # Потоки sync_to_async внутри build() получают копию контекста с None
+            with primary_reads():
+                data = await build()
+        else:
+            data = await build()
+        entry = make_entry(data)
+        await cache.aset(key, entry, get_timeout())
+
+    etag, last_modified = entry_validators(entry, variant, variant_modified)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    data = entry['data']
+    if personalize is not None:
+        data = personalize(data)
+    response = HttpResponse(JSONRenderer().render(data), content_type='application/json')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
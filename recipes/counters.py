@@ -0,0 +1,66 @@
+"""
+Счетчики избранного, комментариев и просмотров на Recipe.
+
+Изменения применяются атомарно через F()-выражения: одиночное +1/-1 из
+сигналов или пачка дельт одним UPDATE (просмотры из буфера). После этого
+пересчитывается trending_score затронутых рецептов, а после коммита
+поднимаются версии кэша: счетчики есть в ответах, а по ним строятся
+ленты /popular/ и /trending/.
+
+Просмотры версии не поднимают: буфер просмотров сбрасывается каждые
+несколько секунд, и иначе кэш ответов и ETag обнулялись бы с той же
+частотой, а клиент сбрасывал бы ETag своим же просмотром. view_count в
+закэшированных ответах обновляется по истечении RECIPE_CACHE_TIMEOUT.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+
+from .cache import bump_recipes
+from .models import Recipe
+
+COUNTERS = ('favorite_count', 'comment_count', 'view_count')
+# Счетчики, изменение которых сразу видно в кэшированных ответах
+VERSIONED_COUNTERS = ('favorite_count', 'comment_count')
+
+
+def apply_deltas(field, deltas, using='default'):
+    """deltas: {recipe_id: n}. Счетчик не опускается ниже нуля."""
+    deltas = {pk: n for pk, n in deltas.items() if n}
+    if not deltas:
+        return
+    if len(deltas) == 1:
+        (delta,) = deltas.values()
+        change = Value(delta)
+    else:
+        change = Case(
+            *[When(pk=pk, then=Value(n)) for pk, n in deltas.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    with transaction.atomic(using=using):
+        Recipe.objects.using(using).filter(pk__in=deltas).update(
+            **{field: Greatest(F(field) + change, Value(0))}
+        )
+        refresh_trending(deltas, using=using)
+        if field in VERSIONED_COUNTERS:
+            transaction.on_commit(partial(bump_recipes, list(deltas)), using=using)
+
+
+def increment(field, recipe_id, using='default'):
+    apply_deltas(field, {recipe_id: 1}, using=using)
+
+
+def decrement(field, recipe_id, using='default'):
+    apply_deltas(field, {recipe_id: -1}, using=using)
+
+
+def refresh_trending(recipe_ids, using='default'):
+    recipes = list(
+        Recipe.objects.using(using).filter(pk__in=list(recipe_ids)).only('id', 'created_at', *COUNTERS)
+    )
+    for recipe in recipes:
+        recipe.trending_score = recipe.compute_trending_score()
+    Recipe.objects.using(using).bulk_update(recipes, ['trending_score'])
@@ -0,0 +1,70 @@
+"""
+Множество избранных рецептов пользователя.
+
+Хранится в кэше целиком, поэтому флаг is_favorited для страницы любого
+размера стоит не больше одного запроса к базе. Сигналы сбрасывают запись
+при добавлении и удалении избранного и поднимают версию избранного
+пользователя — она входит в Last-Modified персональных ответов.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import aget_version, get_version
+from .models import Favorite
+
+
+def favorites_key(user_id):
+    return f'recipes:favorites:{user_id}'
+
+
+def favorites_version_key(user_id):
+    return f'recipes:favorites:version:{user_id}'
+
+
+def get_favorite_ids(user):
+    if user is None or not user.is_authenticated:
+        return frozenset()
+    key = favorites_key(user.pk)
+    favorite_ids = cache.get(key)
+    if favorite_ids is None:
+        favorite_ids = frozenset(Favorite.objects.filter(user=user).values_list('recipe_id', flat=True))
+        cache.set(key, favorite_ids, getattr(settings, 'FAVORITES_CACHE_TIMEOUT', 300))
+    return favorite_ids
+
+
+def invalidate_favorites(user_id):
+    cache.delete(favorites_key(user_id))
+    cache.set(favorites_version_key(user_id), time.time(), timeout=None)
+
+
+def favorites_version(user_id):
+    return get_version(favorites_version_key(user_id))
+
+
+async def afavorites_version(user_id):
+    return await aget_version(favorites_version_key(user_id))
+
+
+def mark_favorites(data, favorite_ids):
+    """Проставляет is_favorited в уже сериализованных рецептах (список, страница или один рецепт)."""
+    if isinstance(data, dict) and 'results' in data:
+        return {**data, 'results': mark_favorites(data['results'], favorite_ids)}
+    if isinstance(data, list):
+        return [mark_favorites(item, favorite_ids) for item in data]
+    if isinstance(data, dict) and 'is_favorited' in data:
+        return {**data, 'is_favorited': data['id'] in favorite_ids}
+    return data
+
+
+def favorites_personalization(favorite_ids, modified):
+    """
+    Аргументы cached_response: общий кэш плюс is_favorited текущего
+    пользователя; modified — версия его избранного (favorites_version).
+    """
+    return {
+        'variant': f'favorites:{hash(favorite_ids)}',
+        'variant_modified': modified,
+        'personalize': lambda data: mark_favorites(data, favorite_ids),
+    }
@@ -0,0 +1,117 @@
+"""
+Фильтры и фасеты списка рецептов.
+
+?cooking_time_min=&cooking_time_max=, ?calories_min=&calories_max= — диапазоны
+(границы включительно), ?attr=Кухня:Русская — атрибут; несколько значений
+одного атрибута объединяются через ИЛИ, разные атрибуты — через И.
+
+Фасеты (?facets=1) считаются по уже отфильтрованному списку одним запросом:
+группировки по атрибутам и по корзинам времени и калорийности склеены UNION ALL.
+"""
+from collections import defaultdict
+
+import django_filters
+from django import forms
+from django.conf import settings
+from django.db.models import Case, CharField, Count, F, Value, When
+
+from .models import Recipe, RecipeAttribute
+
+DEFAULT_BUCKETS = {
+    'cooking_time': (15, 30, 60, 120),
+    'calories': (200, 400, 600, 800),
+}
+
+
+class AttributeField(forms.Field):
+    # SelectMultiple читает все значения параметра (getlist)
+    widget = forms.SelectMultiple
+
+    def to_python(self, value):
+        pairs = []
+        for item in value or ():
+            name, separator, attr_value = item.partition(':')
+            if not separator or not name.strip() or not attr_value.strip():
+                raise forms.ValidationError('Ожидается имя:значение, например Кухня:Русская.')
+            pairs.append((name.strip(), attr_value.strip()))
+        return pairs
+
+
+class AttributeFilter(django_filters.Filter):
+    field_class = AttributeField
+
+
+class RecipeFilter(django_filters.FilterSet):
+    cooking_time = django_filters.RangeFilter()
+    calories = django_filters.RangeFilter()
+    attr = AttributeFilter(method='filter_attributes')
+
+    class Meta:
+        model = Recipe
+        fields = ['cooking_time', 'calories', 'attr']
+
+    def filter_attributes(self, queryset, name, pairs):
+        grouped = defaultdict(list)
+        for attr_name, value in pairs:
+            grouped[attr_name].append(value)
+        for attr_name, values in grouped.items():
+            # IN-подзапрос читается по индексу (name, value, recipe) и не размножает строки
+            queryset = queryset.filter(id__in=RecipeAttribute.objects.filter(
+                name=attr_name, value__in=values).values('recipe_id'))
+        return queryset
+
+
+def get_buckets():
+    return {**DEFAULT_BUCKETS, **getattr(settings, 'RECIPE_FACET_BUCKETS', {})}
+
+
+def bucket_ranges(bounds):
+    """(15, 30) -> [(0, 15), (16, 30), (31, None)] — целые границы включительно."""
+    ranges, low = [], 0
+    for bound in bounds:
+        ranges.append((low, bound))
+        low = bound + 1
+    ranges.append((low, None))
+    return ranges
+
+
+def bucket_case(field, ranges):
+    whens = [
+        When(**{f'{field}__lte': high}, then=Value(str(index)))
+        for index, (_, high) in enumerate(ranges) if high is not None
+    ]
+    return Case(*whens, When(**{f'{field}__isnull': False}, then=Value(str(len(ranges) - 1))),
+                default=None, output_field=CharField())
+
+
+def facet_counts(queryset):
+    """Фасеты для отфильтрованного queryset рецептов — один SQL-запрос."""
+    recipes = queryset.order_by()
+    buckets = {field: bucket_ranges(bounds) for field, bounds in get_buckets().items()}
+    columns = ('facet', 'facet_name', 'facet_value')
+
+    attributes = (
+        RecipeAttribute.objects.filter(recipe_id__in=recipes.values('pk'))
+        .annotate(facet=Value('attributes'), facet_name=F('name'), facet_value=F('value'))
+        .values(*columns).annotate(total=Count('recipe_id', distinct=True)).order_by()
+    )
+    grouped = [
+        recipes.annotate(facet=Value(field), facet_name=Value(''), facet_value=bucket_case(field, ranges))
+        .values(*columns).annotate(total=Count('pk')).order_by()
+        for field, ranges in buckets.items()
+    ]
+
+    facets = {'attributes': {}}
+    counts = defaultdict(dict)
+    for row in attributes.union(*grouped, all=True):
+        if row['facet'] == 'attributes':
+            facets['attributes'].setdefault(row['facet_name'], {})[row['facet_value']] = row['total']
+        elif row['facet_value'] is not None:
+            counts[row['facet']][int(row['facet_value'])] = row['total']
+
+    for field, ranges in buckets.items():
+        facets[field] = [
+            {'min': low, 'max': high, 'count': counts[field].get(index, 0)}
+            for index, (low, high) in enumerate(ranges)
+        ]
+    return facets
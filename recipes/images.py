@@ -0,0 +1,179 @@
+"""
+Уменьшенные копии (рендишены) фото рецептов и шагов.
+
+Для каждого загруженного изображения рядом с оригиналом сохраняются
+варианты нужной ширины в WebP и JPEG без EXIF: ``recipes/abc.jpg`` ->
+``recipes/abc_640w.webp``. Изображение не увеличивается: если оригинал
+уже целевой ширины, вместо нее создается копия в исходной ширине, и в
+имени стоит настоящая ширина — дескрипторы srcset остаются верными.
+
+Какие копии созданы, записывается в поле ``renditions`` модели вместе с
+именем исходного файла: {'source': 'recipes/abc.jpg', 'widths': [...],
+'formats': [...]}. Сериализатор строит ссылки только по этой карте, без
+обращений к хранилищу; пока копий нет (или они от прежнего файла), в
+ответе None и клиент берет оригинал.
+
+Копии создаются после коммита (schedule_renditions) — из сигнала
+post_save и из пакетной записи recipes.bulk — в фоновом потоке, если
+включен IMAGE_RENDITIONS_BACKGROUND, иначе сразу. Уже готовые копии для
+того же файла повторно не создаются.
+"""
+import atexit
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+
+def get_widths():
+    return tuple(getattr(settings, 'IMAGE_RENDITION_WIDTHS', (320, 640, 1280)))
+
+
+def get_formats():
+    return tuple(getattr(settings, 'IMAGE_RENDITION_FORMATS', ('webp', 'jpeg')))
+
+
+def rendition_name(name, width, fmt):
+    root, _ = os.path.splitext(name)
+    return f'{root}_{width}w.{FORMATS[fmt][1]}'
+
+
+def target_widths(image_width):
+    """Ширины копий для оригинала данной ширины: больше исходной не бывает."""
+    return sorted({min(width, image_width) for width in get_widths()})
+
+
+def is_current(fieldfile, renditions):
+    return bool(fieldfile) and bool(renditions) and renditions.get('source') == fieldfile.name
+
+
+def rendition_names(fieldfile, renditions):
+    """{формат: {ширина: имя файла}} созданных копий или None, если их нет."""
+    if not is_current(fieldfile, renditions):
+        return None
+    return {
+        fmt: {width: rendition_name(fieldfile.name, width, fmt) for width in renditions['widths']}
+        for fmt in renditions['formats']
+    }
+
+
+def generate_renditions(fieldfile):
+    """Создает варианты для ImageField-файла. Возвращает карту для поля renditions или None."""
+    storage = fieldfile.storage
+    if not storage.exists(fieldfile.name):
+        return None
+    quality = getattr(settings, 'IMAGE_RENDITION_QUALITY', 80)
+    with storage.open(fieldfile.name, 'rb') as source:
+        image = Image.open(source)
+        # Поворот по EXIF применяем к пикселям, сами метаданные не копируем
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    widths, formats = target_widths(image.width), get_formats()
+    for width in widths:
+        resized = image
+        if image.width > width:
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        for fmt in formats:
+            pil_format, _ = FORMATS[fmt]
+            frame = resized.convert('RGB') if pil_format == 'JPEG' else resized
+            buffer = io.BytesIO()
+            frame.save(buffer, pil_format, quality=quality, optimize=True)
+            name = rendition_name(fieldfile.name, width, fmt)
+            if storage.exists(name):
+                storage.delete(name)
+            storage.save(name, ContentFile(buffer.getvalue()))
+    return {'source': fieldfile.name, 'widths': widths, 'formats': list(formats)}
+
+
+def update_renditions(obj, force=False, using='default'):
+    """
+    Создает копии obj.image и записывает карту в obj.renditions (Recipe или
+    RecipeStepImage). Возвращает число записанных файлов.
+    """
+    from .cache import bump_recipe
+    from .models import Recipe
+
+    if not obj.image or (not force and is_current(obj.image, obj.renditions)):
+        return 0
+    renditions = generate_renditions(obj.image)
+    if renditions is None:
+        return 0
+    # Файл могли заменить, пока создавались копии, — тогда карта уже не его
+    updated = type(obj).objects.using(using).filter(pk=obj.pk, image=obj.image.name).update(renditions=renditions)
+    obj.renditions = renditions
+    if updated:
+        transaction.on_commit(partial(bump_recipe, obj.pk if isinstance(obj, Recipe) else obj.recipe_id), using=using)
+    return len(renditions['widths']) * len(renditions['formats'])
+
+
+def render_pending(pending, using='default'):
+    """pending — [(модель, pk)]; объекты перечитываются, ошибки пишутся в журнал."""
+    for model, pk in pending:
+        obj = model.objects.using(using).filter(pk=pk).first()
+        if obj is None:
+            continue
+        try:
+            update_renditions(obj, using=using)
+        except Exception:
+            # Битое изображение не должно ломать сохранение рецепта — отдадим оригинал
+            logger.exception('Не удалось создать уменьшенные копии для %s', obj.image.name)
+
+
+class RenditionWorker:
+    """Один фоновый поток на процесс: копии создаются вне потока запроса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def submit(self, pending, using):
+        with self._lock:
+            # После fork (gunicorn --preload) потоков родителя в воркере нет
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='renditions')
+                self._pid = os.getpid()
+            self._executor.submit(self._run, pending, using)
+
+    def _run(self, pending, using):
+        try:
+            render_pending(pending, using)
+        finally:
+            connections.close_all()
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=True)
+
+
+rendition_worker = RenditionWorker()
+atexit.register(rendition_worker.shutdown)
+
+
+def schedule_renditions(objects, using='default'):
+    """После коммита создает копии для объектов, у которых их нет для текущего файла."""
+    pending = [(type(obj), obj.pk) for obj in objects if obj.image and not is_current(obj.image, obj.renditions)]
+    if not pending:
+        return
+    if getattr(settings, 'IMAGE_RENDITIONS_BACKGROUND', True):
+        transaction.on_commit(partial(rendition_worker.submit, pending, using), using=using)
+    else:
+        transaction.on_commit(partial(render_pending, pending, using), using=using)
@@ -0,0 +1,141 @@
+"""
+Нормализованный индекс ингредиентов.
+
+Строки из Recipe.ingredients_list ("2 спелых помидора", {"name": "Сыр"})
+приводятся к ключу: без количеств и единиц измерения, слова стеммированы
+и отсортированы, поэтому "помидоры" и "1 помидор", "филе куриное" и
+"куриное филе" — один ингредиент. Связи рецепт–ингредиент лежат в таблице
+RecipeIngredient с индексом (ingredient, recipe): подбор рецептов читает
+только строки запрошенных ингредиентов, а не весь каталог.
+"""
+from django.db import transaction
+from django.db.models import Count, F, FloatField
+from django.db.models.functions import Cast
+
+from .text import stem, tokenize
+
+# Единицы измерения и слова, которые не меняют сам продукт
+UNIT_WORDS = (
+    'г', 'гр', 'грамм', 'кг', 'килограмм', 'мг', 'мл', 'л', 'литр', 'шт', 'штука',
+    'ст', 'стакан', 'ч', 'ложка', 'столовая', 'чайная', 'десертная', 'щепотка',
+    'пучок', 'зубчик', 'долька', 'кусок', 'кусочек', 'упаковка', 'пачка', 'банка',
+    'веточка', 'горсть', 'капля', 'по', 'вкусу', 'для', 'на', 'и', 'или', 'с', 'без',
+    'около', 'примерно', 'средний', 'крупный', 'мелкий', 'небольшой',
+    # Состояние и обработка продукта
+    'спелый', 'свежий', 'молодой', 'охлажденный', 'замороженный', 'вареный',
+    'отварной', 'очищенный', 'измельченный', 'нарезанный', 'тертый', 'рубленый',
+)
+
+
+def ingredient_stem(word):
+    # Беглая гласная: огурец/огурцы, перец/перца, кабачок/кабачки
+    base = stem(word)
+    if len(base) > 4 and base[-2:] in ('ец', 'ок'):
+        base = base[:-2] + base[-1]
+    return base
+
+
+UNIT_STEMS = frozenset(ingredient_stem(word) for word in UNIT_WORDS)
+
+MAX_QUERY_INGREDIENTS = 30
+
+
+def ingredient_text(item):
+    """Название ингредиента из элемента списка: строка или словарь с name."""
+    if isinstance(item, dict):
+        item = item.get('name') or item.get('ingredient') or ''
+    return item if isinstance(item, str) else ''
+
+
+def normalize_ingredient(text):
+    """Возвращает (ключ, название) или None, если в строке нет продукта."""
+    stems = (
+        (token, ingredient_stem(token)) for token in tokenize(text)
+        if not any(char.isdigit() for char in token)
+    )
+    words = [(token, base) for token, base in stems if base not in UNIT_STEMS]
+    if not words:
+        return None
+    key = ' '.join(sorted(base for _, base in words))
+    return key[:100], ' '.join(token for token, _ in words)[:100]
+
+
+def parse_ingredients(ingredients_list):
+    """Уникальные ингредиенты рецепта: {ключ: название}."""
+    if not isinstance(ingredients_list, (list, tuple)):
+        ingredients_list = [ingredients_list]
+    parsed = {}
+    for item in ingredients_list:
+        normalized = normalize_ingredient(ingredient_text(item))
+        if normalized is not None:
+            parsed.setdefault(*normalized)
+    return parsed
+
+
+def resolve_ingredients(keys, model, using='default'):
+    """Id ингредиентов по ключам, недостающие создаются. keys: {ключ: название}."""
+    ids = dict(model.objects.using(using).filter(key__in=keys).values_list('key', 'id'))
+    missing = [model(key=key, name=name) for key, name in keys.items() if key not in ids]
+    if missing:
+        model.objects.using(using).bulk_create(missing, ignore_conflicts=True)
+        ids.update(model.objects.using(using).filter(key__in=[row.key for row in missing]).values_list('key', 'id'))
+    return ids
+
+
+def index_ingredients(recipes, using='default'):
+    """Пересобирает связи с ингредиентами и ingredient_count для пачки рецептов."""
+    recipes = [recipe for recipe in recipes if recipe.pk is not None]
+    if not recipes:
+        return
+    # Модели берем из того же реестра, что и рецепт, — функция работает и в миграциях
+    apps = recipes[0]._meta.apps
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    Recipe = apps.get_model('recipes', 'Recipe')
+
+    parsed = {recipe.pk: parse_ingredients(recipe.ingredients_list) for recipe in recipes}
+    ids = resolve_ingredients({key: name for keys in parsed.values() for key, name in keys.items()},
+                              Ingredient, using=using)
+    with transaction.atomic(using=using):
+        RecipeIngredient.objects.using(using).filter(recipe_id__in=parsed).delete()
+        RecipeIngredient.objects.using(using).bulk_create(
+            [RecipeIngredient(recipe_id=pk, ingredient_id=ids[key]) for pk, keys in parsed.items() for key in keys],
+            batch_size=500,
+        )
+        counts = [Recipe(pk=pk, ingredient_count=len(keys)) for pk, keys in parsed.items()]
+        Recipe.objects.using(using).bulk_update(counts, ['ingredient_count'], batch_size=500)
+
+
+def rebuild_ingredients(queryset, chunk_size=500):
+    batch = []
+    for recipe in queryset.only('id', 'ingredients_list').iterator(chunk_size=chunk_size):
+        batch.append(recipe)
+        if len(batch) >= chunk_size:
+            index_ingredients(batch, using=queryset.db)
+            batch = []
+    index_ingredients(batch, using=queryset.db)
+
+
+def match_recipes(queryset, texts, max_missing=None):
+    """
+    Рецепты, в которых есть хотя бы один из ингредиентов texts, с аннотациями
+    matched (сколько есть) и coverage (доля ингредиентов рецепта, что есть).
+    """
+    from .models import Ingredient
+
+    keys = {}
+    for text in texts[:MAX_QUERY_INGREDIENTS]:
+        normalized = normalize_ingredient(text)
+        if normalized is not None:
+            keys.setdefault(*normalized)
+    ingredient_ids = list(Ingredient.objects.using(queryset.db).filter(key__in=keys).values_list('id', flat=True))
+    if not ingredient_ids:
+        return queryset.none().annotate(matched=Count('ingredient_links'), coverage=Cast('ingredient_count', FloatField()))
+    queryset = (
+        queryset.filter(ingredient_links__ingredient_id__in=ingredient_ids)
+        .annotate(matched=Count('ingredient_links'))
+        .annotate(coverage=Cast('matched', FloatField()) / F('ingredient_count'))
+    )
+    if max_missing is not None:
+        queryset = queryset.filter(ingredient_count__lte=F('matched') + max_missing)
+    return queryset
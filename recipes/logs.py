@@ -0,0 +1,132 @@
+"""
+Структурированные журналы: JSON-записи с id запроса, запись вне потока запроса.
+
+Подключаются в LOGGING (SiteC/settings.py):
+
+* QueueHandler — кладет запись в очередь и сразу возвращается; в поток
+  вывода ее пишет QueueListener из фонового потока, там же работает
+  JSONFormatter. После fork (gunicorn --preload) слушатель запускается
+  заново в процессе воркера.
+* RequestContextFilter — добавляет к записи request_id и замеры текущего
+  запроса из recipes.timing (elapsed_ms, db_ms, queries).
+* SamplingFilter — пропускает долю rate записей логгера; WARNING и выше
+  проходят всегда. Решение принимается по request_id, поэтому для
+  попавшего в выборку запроса видны все его записи.
+
+Отладочные записи ничего не стоят, пока уровень логгера выше DEBUG:
+аргументы передаются в logger.debug('...%s', value) и не форматируются.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import zlib
+from datetime import datetime, timezone
+
+from .timing import current_timings
+
+# Атрибуты LogRecord, которые не считаются пользовательскими полями (extra)
+RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        payload = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload['exception'] = record.exc_text
+        if record.stack_info:
+            payload['stack'] = record.stack_info
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    def filter(self, record):
+        timings = current_timings.get()
+        if timings is None:
+            return True
+        record.request_id = getattr(record, 'request_id', timings.request_id)
+        if not hasattr(record, 'elapsed_ms'):
+            record.elapsed_ms = round(timings.total() * 1000, 2)
+            record.db_ms = round(timings.db * 1000, 2)
+            record.queries = timings.queries
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate=1.0, name=''):
+        super().__init__(name)
+        self.rate = float(rate)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1:
+            return True
+        if self.rate <= 0:
+            return False
+        timings = current_timings.get()
+        if timings is not None and timings.request_id:
+            return zlib.crc32(timings.request_id.encode()) / 2 ** 32 < self.rate
+        return random.random() < self.rate
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """Запись журнала уходит в очередь; форматирует и пишет фоновый поток."""
+
+    def __init__(self, stream=None):
+        self.target = logging.StreamHandler(stream)
+        self._lock = threading.Lock()
+        self._pid = None
+        self.listener = None
+        super().__init__(queue.SimpleQueue())
+
+    def setFormatter(self, fmt):
+        # Форматтер нужен слушателю: JSON собирается в фоновом потоке
+        self.target.setFormatter(fmt)
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Поток слушателя родителя в дочернем процессе не существует
+            self.queue = queue.SimpleQueue()
+            self.listener = logging.handlers.QueueListener(self.queue, self.target)
+            self.listener.start()
+            self._pid = os.getpid()
+        atexit.register(self.stop)
+
+    def stop(self):
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self._pid = None
+
+    def prepare(self, record):
+        # В потоке запроса остается только то, что нельзя отложить: подставить
+        # аргументы и превратить исключение в текст (трейсбек держит кадры стека)
+        record = logging.makeLogRecord(vars(record))
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self.start()
+        self.queue.put_nowait(record)
+
+    def close(self):
+        self.stop()
+        super().close()
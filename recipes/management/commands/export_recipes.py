@@ -0,0 +1,56 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+
+def recipe_record(recipe):
+    return {
+        'id': recipe.pk,
+        'user': recipe.user.username if recipe.user else None,
+        'name': recipe.name,
+        'description': recipe.description,
+        'ingredients_list': recipe.ingredients_list,
+        'instructions': recipe.instructions,
+        'step_instructions': recipe.step_instructions,
+        'image': recipe.image.name or '',
+        'cooking_time': recipe.cooking_time,
+        'calories': recipe.calories,
+        'created_at': recipe.created_at.isoformat(),
+        'attributes': [{'name': attr.name, 'value': attr.value} for attr in recipe.attributes.all()],
+        'step_images': [step.image.name for step in recipe.step_images.all()],
+    }
+
+
+class Command(BaseCommand):
+    help = 'Выгружает рецепты в NDJSON (по рецепту на строку) потоково, без загрузки всей базы в память'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-', help='Файл для записи, "-" — stdout')
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        queryset = (
+            Recipe.objects.using(options['database'])
+            .select_related('user')
+            .prefetch_related('attributes', 'step_images')
+            .order_by('id')
+        )
+        output = sys.stdout if options['output'] == '-' else open(options['output'], 'w', encoding='utf-8')
+        exported = 0
+        try:
+            # iterator() с chunk_size читает серверным курсором и делает prefetch по пачкам
+            for recipe in queryset.iterator(chunk_size=chunk_size):
+                output.write(json.dumps(recipe_record(recipe), ensure_ascii=False))
+                output.write('\n')
+                exported += 1
+                if exported % chunk_size == 0:
+                    self.stderr.write(f'Выгружено рецептов: {exported}')
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        self.stderr.write(self.style.SUCCESS(f'Готово, выгружено рецептов: {exported}'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import update_renditions
+from recipes.models import Recipe, RecipeStepImage
+
+
+class Command(BaseCommand):
+    help = 'Создает уменьшенные копии для уже загруженных фото рецептов и шагов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересоздать существующие копии')
+
+    def handle(self, *args, **options):
+        written = failed = 0
+        for model in (Recipe, RecipeStepImage):
+            objects = model.objects.exclude(image='').exclude(image=None)
+            if model is RecipeStepImage:
+                objects = objects.only('id', 'image', 'renditions', 'recipe')
+            else:
+                objects = objects.only('id', 'image', 'renditions')
+            for obj in objects.iterator():
+                try:
+                    written += update_renditions(obj, force=options['force'])
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'{model.__name__} {obj.pk}: {exc}')
+        self.stdout.write(self.style.SUCCESS(f'Создано файлов: {written}, ошибок: {failed}'))
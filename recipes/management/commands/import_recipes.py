@@ -0,0 +1,99 @@
+import json
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connections
+from django.utils.dateparse import parse_datetime
+
+from recipes.bulk import bulk_insert_recipes
+from recipes.models import Recipe, RecipeAttribute, RecipeStepImage
+from recipes.serializers import RecipeImportSerializer
+
+
+class Command(BaseCommand):
+    help = 'Загружает рецепты из NDJSON (формат export_recipes) пачками через bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', nargs='?', default='-', help='Файл для чтения, "-" — stdin')
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--keep-ids', action='store_true',
+                            help='Сохранить id рецептов из файла (для переноса базы целиком)')
+
+    def handle(self, *args, **options):
+        self.using = options['database']
+        self.keep_ids = options['keep_ids']
+        self.users = {}
+        chunk_size = options['chunk_size']
+        source = sys.stdin if options['input'] == '-' else open(options['input'], encoding='utf-8')
+
+        imported = skipped = 0
+        chunk = []
+        try:
+            for line_number, line in enumerate(source, start=1):
+                if not line.strip():
+                    continue
+                item = self.parse(line, line_number)
+                if item is None:
+                    skipped += 1
+                    continue
+                chunk.append(item)
+                if len(chunk) >= chunk_size:
+                    imported += self.flush(chunk)
+                    chunk = []
+                    self.stdout.write(f'Загружено рецептов: {imported}')
+            imported += self.flush(chunk)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        if self.keep_ids:
+            self.reset_sequences()
+        self.stdout.write(self.style.SUCCESS(f'Готово: загружено {imported}, пропущено {skipped}'))
+
+    def parse(self, line, line_number):
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            self.stderr.write(f'Строка {line_number}: некорректный JSON ({exc})')
+            return None
+        serializer = RecipeImportSerializer(data=record)
+        if not serializer.is_valid():
+            self.stderr.write(f'Строка {line_number}: {json.dumps(serializer.errors, ensure_ascii=False)}')
+            return None
+        item = dict(serializer.validated_data)
+        created_at = parse_datetime(record.get('created_at') or '')
+        if created_at is not None:
+            item['created_at'] = created_at
+        if self.keep_ids and record.get('id') is not None:
+            item['id'] = record['id']
+        item['user'] = record.get('user')
+        return item
+
+    def flush(self, chunk):
+        if not chunk:
+            return 0
+        self.resolve_users(chunk)
+        bulk_insert_recipes(chunk, using=self.using)
+        return len(chunk)
+
+    def resolve_users(self, chunk):
+        # Авторы сопоставляются по username одним запросом на пачку
+        missing = {item['user'] for item in chunk if item['user'] and item['user'] not in self.users}
+        if missing:
+            found = User.objects.using(self.using).filter(username__in=missing)
+            self.users.update({user.username: user for user in found})
+            self.users.update({username: None for username in missing - self.users.keys()})
+        for item in chunk:
+            item['user'] = self.users.get(item['user']) if item['user'] else None
+
+    def reset_sequences(self):
+        connection = connections[self.using]
+        statements = connection.ops.sequence_reset_sql(no_style(), [Recipe, RecipeAttribute, RecipeStepImage])
+        if not statements:
+            return
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from recipes.ingredients import rebuild_ingredients
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает индекс ингредиентов рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        queryset = Recipe.objects.using(options['database'])
+        rebuild_ingredients(queryset, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Проиндексировано рецептов: {queryset.count()}'))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from recipes.models import Comment, Favorite, Recipe
+
+
+def count_of(model):
+    return Coalesce(Subquery(
+        model.objects.filter(recipe=OuterRef('pk')).order_by().values('recipe')
+        .annotate(total=Count('*')).values('total')
+    ), Value(0))
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет favorite_count и comment_count с таблицами избранного и комментариев, '
+        'исправляет расхождения и пересчитывает trending_score. '
+        'view_count не сверяется: история просмотров хранится с ограничением.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        using, chunk_size = options['database'], options['chunk_size']
+        queryset = (
+            Recipe.objects.using(using).order_by('id')
+            .only('id', 'created_at', 'favorite_count', 'comment_count', 'view_count', 'trending_score')
+            .annotate(actual_favorites=count_of(Favorite), actual_comments=count_of(Comment))
+        )
+        fixed = checked = 0
+        changed = []
+        for recipe in queryset.iterator(chunk_size=chunk_size):
+            checked += 1
+            dirty = (recipe.favorite_count, recipe.comment_count) != (recipe.actual_favorites, recipe.actual_comments)
+            if dirty:
+                recipe.favorite_count = recipe.actual_favorites
+                recipe.comment_count = recipe.actual_comments
+                fixed += 1
+            score = recipe.compute_trending_score()
+            if dirty or score != recipe.trending_score:
+                recipe.trending_score = score
+                changed.append(recipe)
+            if len(changed) >= chunk_size:
+                self.save(changed, using)
+                changed = []
+        self.save(changed, using)
+        self.stdout.write(self.style.SUCCESS(f'Проверено рецептов: {checked}, исправлено счетчиков: {fixed}'))
+
+    def save(self, recipes, using):
+        if recipes:
+            Recipe.objects.using(using).bulk_update(
+                recipes, ['favorite_count', 'comment_count', 'trending_score'], batch_size=500,
+            )
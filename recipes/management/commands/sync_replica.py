@@ -0,0 +1,44 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует SQLite-базу default в SQLite-реплики из DATABASE_REPLICA_URLS — '
+        'локальная замена репликации; с --interval реплика отстает на столько секунд'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='повторять копирование раз в столько секунд (0 — один раз)')
+
+    def handle(self, *args, **options):
+        replicas = settings.REPLICA_DATABASES
+        if not replicas:
+            raise CommandError('Реплики не заданы: укажите DATABASE_REPLICA_URLS')
+        databases = [connections[alias].settings_dict for alias in ['default', *replicas]]
+        if any(database['ENGINE'] != 'django.db.backends.sqlite3' for database in databases):
+            raise CommandError('Копировать можно только SQLite; для Postgres нужна потоковая репликация')
+
+        source, *targets = [database['NAME'] for database in databases]
+        while True:
+            started = time.perf_counter()
+            for target in targets:
+                self.copy(source, target)
+            self.stdout.write(f'Реплики обновлены за {(time.perf_counter() - started) * 1000:.0f} мс')
+            if options['interval'] <= 0:
+                return
+            time.sleep(options['interval'])
+
+    def copy(self, source, target):
+        # Онлайн-бэкап SQLite: согласованный снимок даже при идущей записи
+        src, dst = sqlite3.connect(source), sqlite3.connect(target)
+        try:
+            src.backup(dst)
+        finally:
+            src.close()
+            dst.close()
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from recipes.search import get_backend, rebuild_index
+
+    alias = schema_editor.connection.alias
+    get_backend(alias).install(schema_editor)
+    Recipe = apps.get_model('recipes', 'Recipe')
+    rebuild_index(Recipe.objects.using(alias))
+
+
+def uninstall_search_index(apps, schema_editor):
+    from recipes.search import get_backend
+
+    get_backend(schema_editor.connection.alias).uninstall(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
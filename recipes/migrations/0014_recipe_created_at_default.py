@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-17 14:45
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recentlyviewed_viewed_at_default'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
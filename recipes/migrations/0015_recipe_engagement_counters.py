@@ -0,0 +1,87 @@
+# Generated by Django 5.1.6 on 2026-10-17 14:49
+
+import math
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_of(model):
+    return Coalesce(Subquery(
+        model.objects.filter(recipe=OuterRef('pk')).order_by().values('recipe')
+        .annotate(total=Count('*')).values('total')
+    ), Value(0))
+
+
+def trending_score(recipe):
+    # Копия Recipe.compute_trending_score на момент миграции
+    weights = getattr(settings, 'TRENDING_WEIGHTS', {})
+    engagement = (
+        recipe.favorite_count * weights.get('favorite', 3)
+        + recipe.comment_count * weights.get('comment', 2)
+        + recipe.view_count * weights.get('view', 0.1)
+    )
+    decay = getattr(settings, 'TRENDING_DECAY_SECONDS', 45000)
+    return math.log10(max(engagement, 1)) + recipe.created_at.timestamp() / decay
+
+
+def backfill_counters(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    Comment = apps.get_model('recipes', 'Comment')
+    Recipe.objects.using(alias).update(favorite_count=count_of(Favorite), comment_count=count_of(Comment))
+    recipes = list(Recipe.objects.using(alias).only('id', 'created_at', 'favorite_count', 'comment_count', 'view_count'))
+    for recipe in recipes:
+        recipe.trending_score = trending_score(recipe)
+    Recipe.objects.using(alias).bulk_update(recipes, ['trending_score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_created_at_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorite_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='view_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorite_count', '-id'], name='recipe_favorites_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-comment_count', '-id'], name='recipe_comments_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-view_count', '-id'], name='recipe_views_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending_score', '-id'], name='recipe_trending_idx'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
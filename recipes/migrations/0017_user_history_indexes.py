@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-17 14:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_comment_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', '-added_at'], name='favorite_user_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recentlyviewed',
+            index=models.Index(fields=['user', '-viewed_at', '-id'], name='recentlyviewed_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipestepimage',
+            index=models.Index(fields=['recipe', 'id'], name='stepimage_recipe_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchhistory',
+            index=models.Index(fields=['user', '-timestamp'], name='searchhistory_user_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.6 on 2026-10-17 14:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def index_existing_recipes(apps, schema_editor):
+    from recipes.ingredients import rebuild_ingredients
+
+    Recipe = apps.get_model('recipes', 'Recipe')
+    rebuild_ingredients(Recipe.objects.using(schema_editor.connection.alias))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0017_user_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Ingredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('name', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='RecipeIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_links', to='recipes.ingredient')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_links', to='recipes.recipe')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ingredient', 'recipe'], name='recipeingredient_lookup_idx')],
+                'unique_together': {('recipe', 'ingredient')},
+            },
+        ),
+        migrations.RunPython(index_existing_recipes, migrations.RunPython.noop),
+    ]
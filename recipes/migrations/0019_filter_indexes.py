@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-17 14:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0018_ingredient_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['cooking_time'], name='recipe_cooking_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['calories'], name='recipe_calories_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipeattribute',
+            index=models.Index(fields=['name', 'value', 'recipe'], name='attribute_name_value_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-17 15:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0019_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='renditions',
+            field=models.JSONField(default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipestepimage',
+            name='renditions',
+            field=models.JSONField(default=dict, editable=False),
+        ),
+    ]
@@ -1,4 +1,8 @@
-from django.db import models
+import math
+
+from django.conf import settings
+from django.db import models, router
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 class SearchHistory(models.Model):
@@ -8,6 +12,10 @@ class SearchHistory(models.Model):
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # История поиска пользователя, новые сверху
+            models.Index(fields=['user', '-timestamp'], name='searchhistory_user_ts_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username}: {self.query}"
@@ -20,16 +28,90 @@ class Recipe(models.Model):
     instructions = models.TextField(default='No instructions provided')
     step_instructions = models.JSONField(default=list)
     image = models.ImageField(upload_to='recipes/', null=True, blank=True)
+    # Созданные уменьшенные копии image, см. recipes.images
+    renditions = models.JSONField(default=dict, editable=False)
     cooking_time = models.IntegerField(null=True, blank=True)
     calories = models.IntegerField(null=True, blank=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # default вместо auto_now_add, чтобы импорт мог сохранить исходную дату
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Денормализованные счетчики, обновляются через recipes.counters
+    favorite_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    view_count = models.PositiveIntegerField(default=0, editable=False)
+    trending_score = models.FloatField(default=0, editable=False)
+    # Число разных ингредиентов — знаменатель покрытия в подборе по продуктам
+    ingredient_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Ключ курсорной пагинации списка рецептов
+            models.Index(fields=['-created_at', '-id'], name='recipe_created_id_idx'),
+            # Ленты /popular/ и /trending/
+            models.Index(fields=['-favorite_count', '-id'], name='recipe_favorites_idx'),
+            models.Index(fields=['-comment_count', '-id'], name='recipe_comments_idx'),
+            models.Index(fields=['-view_count', '-id'], name='recipe_views_idx'),
+            models.Index(fields=['-trending_score', '-id'], name='recipe_trending_idx'),
+            # Фильтры по диапазону ?cooking_time_min/max, ?calories_min/max
+            models.Index(fields=['cooking_time'], name='recipe_cooking_time_idx'),
+            models.Index(fields=['calories'], name='recipe_calories_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    # Меняются только в recipes.counters, атомарными UPDATE с F()
+    ENGAGEMENT_FIELDS = ('favorite_count', 'comment_count', 'view_count', 'trending_score')
+    # Не пишутся полным save(): счетчики и карта копий из фонового потока recipes.images
+    UNSAVED_FIELDS = ENGAGEMENT_FIELDS + ('renditions',)
+
+    def save(self, *args, **kwargs):
+        # Пересобирать ли связи с ингредиентами (сигнал post_save, recipes.ingredients)
+        self._ingredients_changed = True
+        if self._state.adding:
+            self.trending_score = self.compute_trending_score()
+        elif kwargs.get('update_fields') is not None:
+            self._ingredients_changed = 'ingredients_list' in kwargs['update_fields']
+        elif not args and not kwargs.get('force_insert'):
+            using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+            stored = list(type(self)._base_manager.using(using).filter(pk=self.pk).values_list('ingredients_list', flat=True))
+            # Строку удалили параллельно — обычный save() вставит ее заново
+            if stored:
+                deferred = self.get_deferred_fields()
+                self._ingredients_changed = 'ingredients_list' not in deferred and stored[0] != self.ingredients_list
+                # Полная запись строки вернула бы счетчики, прочитанные вместе с
+                # рецептом, и затерла параллельные приращения. Отложенные поля, как
+                # и в обычном save(), не пишем — иначе каждое читалось бы из базы
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in self.UNSAVED_FIELDS and field.attname not in deferred
+                ]
+        super().save(*args, **kwargs)
+
+    def ingredients_changed(self):
+        """Изменился ли состав при последнем save()."""
+        return getattr(self, '_ingredients_changed', True)
+
+    def compute_trending_score(self):
+        """
+        Оценка "в тренде" как у Reddit: логарифм вовлеченности плюс время
+        создания. Новые рецепты получают прибавку за возраст, поэтому значение
+        не нужно пересчитывать со временем — только при изменении счетчиков,
+        и по нему можно построить индекс.
+        """
+        weights = getattr(settings, 'TRENDING_WEIGHTS', {})
+        engagement = (
+            self.favorite_count * weights.get('favorite', 3)
+            + self.comment_count * weights.get('comment', 2)
+            + self.view_count * weights.get('view', 0.1)
+        )
+        created_at = self.created_at or timezone.now()
+        decay = getattr(settings, 'TRENDING_DECAY_SECONDS', 45000)
+        return math.log10(max(engagement, 1)) + created_at.timestamp() / decay
+
 class RecipeStepImage(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='step_images')
     image = models.ImageField(upload_to='recipes/steps/')
+    renditions = models.JSONField(default=dict, editable=False)
 
 
     def __str__(self):
@@ -37,21 +119,61 @@ class RecipeStepImage(models.Model):
 
     class Meta:
         ordering = ['id']  # Изменил с '-created_at' на 'id', так как поле created_at отсутствует
+        indexes = [
+            # Предзагрузка фото шагов: recipe_id IN (...) ORDER BY id
+            models.Index(fields=['recipe', 'id'], name='stepimage_recipe_id_idx'),
+        ]
 
 class RecipeAttribute(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='attributes')
     name = models.CharField(max_length=100)
     value = models.CharField(max_length=50)
 
+    class Meta:
+        indexes = [
+            # Фильтр ?attr=имя:значение и фасеты по атрибутам — покрывающий индекс
+            models.Index(fields=['name', 'value', 'recipe'], name='attribute_name_value_idx'),
+        ]
+
     def __str__(self):
         return f"{self.name}: {self.value} for {self.recipe.name}"
 
+class Ingredient(models.Model):
+    # Нормализованный ключ (см. recipes.ingredients.normalize_ingredient)
+    key = models.CharField(max_length=100, unique=True)
+    name = models.CharField(max_length=100)
+
+    def __str__(self):
+        return self.name
+
+class RecipeIngredient(models.Model):
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='ingredient_links')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, related_name='recipe_links')
+
+    class Meta:
+        unique_together = ('recipe', 'ingredient')
+        indexes = [
+            # Подбор по продуктам: все рецепты с данными ингредиентами
+            models.Index(fields=['ingredient', 'recipe'], name='recipeingredient_lookup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.ingredient} in {self.recipe}"
+
 class Comment(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Ветка комментариев рецепта: фильтр и курсор покрываются одним индексом
+            models.Index(fields=['recipe', 'created_at', 'id'], name='comment_recipe_created_idx'),
+            # Общая лента комментариев без ?recipe=
+            models.Index(fields=['created_at', 'id'], name='comment_created_id_idx'),
+        ]
+
     def __str__(self):
         return f'Comment by {self.author} on {self.recipe}'
 
@@ -63,6 +185,10 @@ class Favorite(models.Model):
     class Meta:
         unique_together = ('user', 'recipe')
         ordering = ['-added_at']
+        indexes = [
+            # Список избранного пользователя, новые сверху
+            models.Index(fields=['user', '-added_at'], name='favorite_user_added_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.recipe.name}"
@@ -70,11 +196,16 @@ class Favorite(models.Model):
 class RecentlyViewed(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recently_viewed')
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
-    viewed_at = models.DateTimeField(auto_now_add=True)
+    # Не auto_now_add: при отложенной записи сохраняется время самого просмотра
+    viewed_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['-viewed_at']
         unique_together = ['user', 'recipe']
+        indexes = [
+            # Список и обрезка истории просмотров (ViewTracker.trim)
+            models.Index(fields=['user', '-viewed_at', '-id'], name='recentlyviewed_user_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} viewed {self.recipe.name}"
\ No newline at end of file
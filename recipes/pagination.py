@@ -0,0 +1,191 @@
+import base64
+import json
+from functools import reduce
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная (keyset) пагинация по набору полей сортировки.
+
+    Вместо OFFSET страница выбирается условием "строго после последней
+    записи" по (created_at, id), поэтому время выборки не зависит от глубины
+    страницы. Курсоры непрозрачные: base64 от JSON с позицией и направлением.
+
+    Пагинация включается, только если клиент передал ``cursor`` или
+    ``page_size`` (или у view задан ``always_paginate``) — без них список
+    отдается целиком, как раньше.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        window = self.get_window(queryset, request, view)
+        if window is None:
+            return None
+        return self.set_page(list(window))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        window = self.get_window(queryset, request, view)
+        if window is None:
+            return None
+        return self.set_page([row async for row in window])
+
+    def get_window(self, queryset, request, view=None):
+        """Ленивый срез на страницу плюс одну строку (признак следующей страницы)."""
+        if not self.is_requested(request, view):
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.size = self.get_page_size(request)
+
+        ordering = self.get_ordering(view)
+        self.fields = [field.lstrip('-') for field in ordering]
+        self.descending = ordering[0].startswith('-')
+        self.position, self.reverse = self.decode_cursor(request, queryset.model)
+
+        if self.reverse:
+            ordering = [self._invert(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            queryset = queryset.filter(self.build_filter(self.position))
+        return queryset[:self.size + 1]
+
+    def set_page(self, rows):
+        has_more = len(rows) > self.size
+        self.page = rows[:self.size]
+        if self.reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.position is not None
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def is_requested(self, request, view=None):
+        if getattr(view, 'always_paginate', False):
+            return True
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_ordering(self, view):
+        if hasattr(view, 'get_pagination_ordering'):
+            return list(view.get_pagination_ordering())
+        return list(self.ordering)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self.position_of(self.page[-1])
+        else:
+            position = self.position
+        return self.encode_cursor(position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self.position_of(self.page[0])
+        else:
+            position = self.position
+        return self.encode_cursor(position, reverse=True)
+
+    def position_of(self, instance):
+        return [getattr(instance, field) for field in self.fields]
+
+    def build_filter(self, position):
+        # (a, b) < (x, y)  <=>  a < x OR (a = x AND b < y)
+        after = self.descending != self.reverse
+        lookup = 'lt' if after else 'gt'
+        conditions = []
+        for idx, field in enumerate(self.fields):
+            exact = {name: position[i] for i, name in enumerate(self.fields[:idx])}
+            exact[f'{field}__{lookup}'] = position[idx]
+            conditions.append(Q(**exact))
+        return reduce(lambda left, right: left | right, conditions)
+
+    def encode_cursor(self, position, reverse):
+        payload = {
+            'p': [value.isoformat() if hasattr(value, 'isoformat') else value for value in position],
+            'r': int(reverse),
+        }
+        raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        token = base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, model):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            payload = json.loads(raw)
+            values = payload['p']
+            if len(values) != len(self.fields):
+                raise ValueError
+            position = [self.to_python(model, field, value) for field, value in zip(self.fields, values)]
+            return position, bool(payload.get('r'))
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def to_python(model, field, value):
+        try:
+            return model._meta.get_field(field).to_python(value)
+        except FieldDoesNotExist:
+            # Аннотации (например, search_rank) хранятся в курсоре как есть
+            if not isinstance(value, (int, float)):
+                raise ValueError(field)
+            return value
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+
+class RecipeCursorPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class CommentCursorPagination(KeysetPagination):
+    # Ветка читается сверху вниз: от старых комментариев к новым
+    ordering = ('created_at', 'id')
+    page_size = 50
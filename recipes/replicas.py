@@ -0,0 +1,150 @@
+"""
+Чтение с реплик и read-your-writes.
+
+Реплики задаются в DATABASE_REPLICA_URLS (SiteC/settings.py) и получают
+алиасы replica_1, replica_2, ... (список — REPLICA_DATABASES).
+ReplicaMiddleware отправляет чтение безопасных запросов (GET, HEAD,
+OPTIONS) к путям из REPLICA_PATH_PREFIXES на случайную реплику: алиас
+кладется в ContextVar, его и отдает ReplicaRouter.db_for_read. Запись, а
+также все чтения небезопасных запросов, админки и фоновых потоков идут в
+основную базу.
+
+Реплика отстает, поэтому после успешной записи пользователь на
+REPLICA_PIN_SECONDS секунд закрепляется за основной базой — только что
+созданный рецепт или избранное видны сразу. Метка закрепления хранится в
+кэше по id пользователя, так что при нескольких воркерах нужен общий кэш.
+Пользователя безопасного запроса middleware узнает по JWT до
+аутентификации в представлении: подпись проверяется, база не нужна.
+
+Отставание реплики локально воспроизводит manage.py sync_replica: копирует
+SQLite-базу default в файлы реплик раз в --interval секунд.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+current_read_database = ContextVar('recipes_read_database', default=None)
+
+
+def pin_key(user_id):
+    return f'recipes:replica:pin:{user_id}'
+
+
+def pin_timeout():
+    return getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+
+
+@contextmanager
+def primary_reads():
+    """Чтение внутри блока идет в основную базу."""
+    token = current_read_database.set(None)
+    try:
+        yield
+    finally:
+        current_read_database.reset(token)
+
+
+def token_user_id(request):
+    """Id пользователя из JWT запроса или None — без обращения к базе."""
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header is None:
+        return None
+    try:
+        raw_token = authentication.get_raw_token(header)
+        if raw_token is None:
+            return None
+        return authentication.get_validated_token(raw_token).get(jwt_settings.USER_ID_CLAIM)
+    except AuthenticationFailed:
+        # Кривой или просроченный токен отклонит аутентификация представления
+        return None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return current_read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема приходит на реплику вместе с данными
+        return db not in getattr(settings, 'REPLICA_DATABASES', ())
+
+
+class ReplicaMiddleware:
+    """Ставится сразу после ServerTimingMiddleware. Работает и под WSGI, и под ASGI."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        alias = None
+        if self.reads_from_replica(request):
+            user_id = token_user_id(request)
+            if user_id is None or not cache.get(pin_key(user_id)):
+                alias = random.choice(settings.REPLICA_DATABASES)
+        token = current_read_database.set(alias)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_read_database.reset(token)
+        writer_id = self.writer_id(request, response)
+        if writer_id is not None and pin_timeout() > 0:
+            cache.set(pin_key(writer_id), True, pin_timeout())
+        return response
+
+    async def __acall__(self, request):
+        alias = None
+        if self.reads_from_replica(request):
+            user_id = token_user_id(request)
+            if user_id is None or not await cache.aget(pin_key(user_id)):
+                alias = random.choice(settings.REPLICA_DATABASES)
+        token = current_read_database.set(alias)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_read_database.reset(token)
+        writer_id = None
+        if request.method not in SAFE_METHODS:
+            # request.user вне DRF — ленивый пользователь сессии, он читает базу
+            writer_id = await sync_to_async(self.writer_id)(request, response)
+        if writer_id is not None and pin_timeout() > 0:
+            await cache.aset(pin_key(writer_id), True, pin_timeout())
+        return response
+
+    def reads_from_replica(self, request):
+        return (
+            bool(getattr(settings, 'REPLICA_DATABASES', ()))
+            and request.method in SAFE_METHODS
+            and request.path.startswith(tuple(getattr(settings, 'REPLICA_PATH_PREFIXES', ('/api/',))))
+        )
+
+    def writer_id(self, request, response):
+        """Id пользователя, который только что записал данные, иначе None."""
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return None
+        # DRF переносит пользователя, найденного по JWT, в request Django
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return user.pk
+        return None
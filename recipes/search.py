@@ -0,0 +1,195 @@
+"""
+Полнотекстовый поиск по рецептам.
+
+Индекс хранится в отдельной таблице рядом с ``recipes_recipe`` и
+обновляется сигналами при сохранении и удалении рецепта. Реализация
+выбирается по движку базы из ``DATABASES``: FTS5 для SQLite и
+tsvector + GIN для PostgreSQL. Для прочих движков остается прежний
+поиск через ``icontains``.
+"""
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .text import flatten_text, stem_text, tokenize, stem
+
+# Максимум слов в поисковом запросе — защищает индекс от огромных запросов
+MAX_QUERY_TERMS = 8
+
+
+def recipe_document(name, description, ingredients_list):
+    return name or '', description or '', flatten_text(ingredients_list)
+
+
+class SearchBackend:
+    vendor = None
+
+    def install(self, schema_editor):
+        pass
+
+    def uninstall(self, schema_editor):
+        pass
+
+    def index(self, documents, using='default'):
+        """documents: итерируемое из (id, name, description, ingredients_list)."""
+
+    def remove(self, ids, using='default'):
+        pass
+
+    def search(self, queryset, query):
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(description__icontains=query) |
+            Q(ingredients_list__icontains=query)
+        ).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    def empty(self, queryset):
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField())).none()
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    FTS5 не умеет русскую морфологию, поэтому в индекс пишутся уже
+    приведенные к основе слова (см. ``text.stem``), а запрос стеммится так же.
+    """
+    vendor = 'sqlite'
+    table = 'recipes_recipe_fts'
+    # Веса bm25 для name, description, ingredients
+    weights = (10.0, 1.0, 4.0)
+
+    def install(self, schema_editor):
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} USING fts5("
+            "name, description, ingredients, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+
+    def uninstall(self, schema_editor):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def index(self, documents, using='default'):
+        rows = []
+        for pk, name, description, ingredients in documents:
+            fields = recipe_document(name, description, ingredients)
+            rows.append((pk, *(stem_text(field) for field in fields)))
+        if not rows:
+            return
+        with connections[using].cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, name, description, ingredients) VALUES (%s, %s, %s, %s)',
+                rows,
+            )
+
+    def remove(self, ids, using='default'):
+        with connections[using].cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [(pk,) for pk in ids])
+
+    def build_query(self, query):
+        terms = [stem(token) for token in tokenize(query)][:MAX_QUERY_TERMS]
+        # Каждый термин — префикс: "карто" найдет "картофель"
+        return ' '.join(f'"{term}"*' for term in terms if term)
+
+    def search(self, queryset, query):
+        match = self.build_query(query)
+        if not match:
+            return self.empty(queryset)
+        table = self.table
+        weights = ', '.join(str(weight) for weight in self.weights)
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [match])
+        ).annotate(search_rank=RawSQL(
+            f'(SELECT -bm25({table}, {weights}) FROM {table} '
+            f'WHERE {table} MATCH %s AND rowid = recipes_recipe.id)',
+            [match],
+        ))
+
+
+class PostgresSearchBackend(SearchBackend):
+    vendor = 'postgresql'
+    table = 'recipes_recipe_search'
+    config = 'russian'
+
+    def install(self, schema_editor):
+        schema_editor.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table} ('
+            'recipe_id bigint PRIMARY KEY REFERENCES recipes_recipe (id) '
+            'ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+            'document tsvector NOT NULL)'
+        )
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {self.table}_document_gin '
+            f'ON {self.table} USING gin (document)'
+        )
+
+    def uninstall(self, schema_editor):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {self.table}')
+
+    def index(self, documents, using='default'):
+        rows = [(pk, *recipe_document(name, description, ingredients))
+                for pk, name, description, ingredients in documents]
+        if not rows:
+            return
+        config = self.config
+        with connections[using].cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.table} (recipe_id, document) VALUES (%s, '
+                f"setweight(to_tsvector('{config}', %s), 'A') || "
+                f"setweight(to_tsvector('{config}', %s), 'C') || "
+                f"setweight(to_tsvector('{config}', %s), 'B')) "
+                'ON CONFLICT (recipe_id) DO UPDATE SET document = EXCLUDED.document',
+                rows,
+            )
+
+    def remove(self, ids, using='default'):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE recipe_id = ANY(%s)', [list(ids)])
+
+    def build_query(self, query):
+        # Стемминг делает сам to_tsquery, здесь только экранирование и префиксы
+        terms = tokenize(query)[:MAX_QUERY_TERMS]
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    def search(self, queryset, query):
+        tsquery = self.build_query(query)
+        if not tsquery:
+            return self.empty(queryset)
+        table, config = self.table, self.config
+        return queryset.filter(id__in=RawSQL(
+            f"SELECT recipe_id FROM {table} WHERE document @@ to_tsquery('{config}', %s)",
+            [tsquery],
+        )).annotate(search_rank=RawSQL(
+            f"(SELECT ts_rank(document, to_tsquery('{config}', %s)) FROM {table} "
+            'WHERE recipe_id = recipes_recipe.id)',
+            [tsquery],
+        ))
+
+
+BACKENDS = {backend.vendor: backend for backend in (SQLiteSearchBackend(), PostgresSearchBackend())}
+
+
+def get_backend(using='default'):
+    return BACKENDS.get(connections[using].vendor, SearchBackend())
+
+
+def search_recipes(queryset, query):
+    """Фильтрует рецепты по запросу и добавляет аннотацию search_rank (чем больше, тем лучше)."""
+    return get_backend(queryset.db).search(queryset, query)
+
+
+def index_recipes(recipes, using='default'):
+    get_backend(using).index(
+        ((recipe.pk, recipe.name, recipe.description, recipe.ingredients_list) for recipe in recipes),
+        using=using,
+    )
+
+
+def rebuild_index(queryset, chunk_size=500):
+    backend = get_backend(queryset.db)
+    rows = queryset.values_list('id', 'name', 'description', 'ingredients_list')
+    batch = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        batch.append(row)
+        if len(batch) >= chunk_size:
+            backend.index(batch, using=queryset.db)
+            batch = []
+    backend.index(batch, using=queryset.db)
@@ -1,8 +1,32 @@
-from rest_framework import serializers
+from django.db.models import Prefetch
+from rest_framework import permissions, serializers
 from .models import Recipe, Comment, SearchHistory, Favorite, RecentlyViewed, RecipeAttribute, RecipeStepImage
+from .images import rendition_names
+from .favorites import get_favorite_ids
 from django.contrib.auth.models import User
 import json
 
+
+def media_url(request, url):
+    if request:
+        return request.build_absolute_uri(url).replace('http://', 'https://')
+    return url
+
+
+def rendition_urls(fieldfile, renditions, request):
+    """
+    Карта созданных вариантов изображения: {'webp': {'320': url, ...}, 'jpeg': {...}}.
+    None, пока копии не созданы — тогда клиент показывает оригинал.
+    """
+    names = rendition_names(fieldfile, renditions)
+    if names is None:
+        return None
+    storage = fieldfile.storage
+    return {
+        fmt: {str(width): media_url(request, storage.url(name)) for width, name in widths.items()}
+        for fmt, widths in names.items()
+    }
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -33,16 +57,94 @@ class RecipeStepImageSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(instance.image.url).replace('http://', 'https://')
         return instance.image.url if instance.image else None
 
+    def get_renditions(self, instance):
+        return rendition_urls(instance.image, instance.renditions, self.context.get('request'))
+
 class RecipeSerializer(serializers.ModelSerializer):
     attributes = RecipeAttributeSerializer(many=True, read_only=True)
     step_images = RecipeStepImageSerializer(many=True, read_only=True)
     image = serializers.SerializerMethodField()
+    image_renditions = serializers.SerializerMethodField()
+    step_image_renditions = serializers.SerializerMethodField()
+    is_favorited = serializers.SerializerMethodField()
     user = serializers.CharField(source='user.username', read_only=True)
 
     class Meta:
         model = Recipe
-        fields = ['id', 'name', 'user', 'description', 'ingredients_list', 'instructions', 'image', 'step_images', 'step_instructions', 'cooking_time', 'calories', 'created_at', 'attributes']
+        fields = ['id', 'name', 'user', 'description', 'ingredients_list', 'instructions', 'image', 'image_renditions', 'step_images', 'step_image_renditions', 'step_instructions', 'cooking_time', 'calories', 'created_at', 'attributes', 'is_favorited', 'favorite_count', 'comment_count', 'view_count']
         extra_kwargs = {'user': {'read_only': True}}
+        # Компактное представление для карточек в списках: ?fields=summary
+        summary_fields = ['id', 'name', 'user', 'image', 'image_renditions', 'cooking_time', 'calories', 'created_at', 'is_favorited']
+        # Поля, которые читают связанные таблицы или чужие колонки
+        prefetch_fields = {'attributes': 'attributes', 'step_images': 'step_images', 'step_image_renditions': 'step_images'}
+        # Порядок внутри рецепта прежний (по id), но recipe_id впереди дает
+        # выборку по индексу (recipe, id) без сортировки во временной таблице
+        prefetch_ordering = {'step_images': ('recipe_id', 'id')}
+        field_columns = {'image_renditions': ('image', 'renditions'), 'is_favorited': 'id'}
+
+    @classmethod
+    def requested_fields(cls, request):
+        """
+        Поля из ?fields= (плюс ?expand=) в порядке Meta.fields или None, если
+        нужно полное представление. Учитывается только для чтения.
+        """
+        if request is None or request.method not in permissions.SAFE_METHODS:
+            return None
+        fields = request.query_params.get('fields', '')
+        if not fields:
+            return None
+        selected = set()
+        for name in fields.split(',') + request.query_params.get('expand', '').split(','):
+            name = name.strip()
+            if name == 'summary':
+                selected.update(cls.Meta.summary_fields)
+            elif name in cls.Meta.fields:
+                selected.add(name)
+        return [name for name in cls.Meta.fields if name in selected] or None
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, request=None, prefix='', base_fields=()):
+        """
+        Загружает только то, что попадет в ответ: ненужные текстовые колонки
+        откладываются через only(), связи подтягиваются одним запросом.
+        prefix — путь до рецепта, например 'recipe__' для избранного.
+        """
+        requested = cls.requested_fields(request)
+        fields = requested or cls.Meta.fields
+        select = [prefix[:-2]] if prefix else []
+        prefetch = []
+        # id и created_at нужны всегда — по ним листает курсорная пагинация
+        columns = {*base_fields, prefix + 'id', prefix + 'created_at'}
+        for name in fields:
+            if name == 'user':
+                select.append(prefix + 'user')
+                columns.add(prefix + 'user__username')
+            elif name in cls.Meta.prefetch_fields:
+                prefetch.append(prefix + cls.Meta.prefetch_fields[name])
+            else:
+                names = cls.Meta.field_columns.get(name, name)
+                columns.update(prefix + column for column in ((names,) if isinstance(names, str) else names))
+        prefetch = [cls.prefetch_lookup(path, prefix) for path in dict.fromkeys(prefetch)]
+        queryset = queryset.select_related(*select).prefetch_related(*prefetch)
+        if requested is not None:
+            queryset = queryset.only(*columns)
+        return queryset
+
+    @classmethod
+    def prefetch_lookup(cls, path, prefix=''):
+        relation = path[len(prefix):]
+        ordering = cls.Meta.prefetch_ordering.get(relation)
+        if ordering is None:
+            return path
+        related_model = Recipe._meta.get_field(relation).related_model
+        return Prefetch(path, queryset=related_model.objects.order_by(*ordering))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        requested = self.requested_fields(self.context.get('request'))
+        if requested is None:
+            return fields
+        return {name: field for name, field in fields.items() if name in requested}
 
     def get_image(self, obj):
         request = self.context.get('request')
@@ -50,6 +152,41 @@ class RecipeSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.image.url).replace('http://', 'https://')
         return obj.image.url if obj.image else None
 
+    def get_image_renditions(self, obj):
+        return rendition_urls(obj.image, obj.renditions, self.context.get('request'))
+
+    def get_is_favorited(self, obj):
+        # Множество избранного читается один раз на весь ответ и кладется в общий context
+        if 'favorite_ids' not in self.context:
+            request = self.context.get('request')
+            self.context['favorite_ids'] = get_favorite_ids(request.user if request else None)
+        return obj.pk in self.context['favorite_ids']
+
+    def get_step_image_renditions(self, obj):
+        step_serializer = RecipeStepImageSerializer(context=self.context)
+        return [step_serializer.get_renditions(step) for step in obj.step_images.all()]
+
+class StoragePathField(serializers.CharField):
+    """Путь к уже загруженному файлу в хранилище, например recipes/abc.jpg."""
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        if value.startswith('/') or '..' in value.split('/'):
+            raise serializers.ValidationError('Недопустимый путь к файлу.')
+        return value
+
+
+class RecipeImportSerializer(serializers.ModelSerializer):
+    """Один рецепт в пакетном импорте: поля рецепта плюс атрибуты и фото шагов."""
+    image = StoragePathField(required=False, allow_blank=True, max_length=100)
+    attributes = RecipeAttributeSerializer(many=True, required=False)
+    step_images = serializers.ListField(child=StoragePathField(max_length=100), required=False)
+
+    class Meta:
+        model = Recipe
+        fields = ['name', 'description', 'ingredients_list', 'instructions', 'step_instructions', 'image', 'cooking_time', 'calories', 'attributes', 'step_images']
+
+
 class CommentSerializer(serializers.ModelSerializer):
     author = serializers.ReadOnlyField(source='author.username')
 
@@ -0,0 +1,105 @@
+from functools import partial
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from .auth import invalidate_user
+from .cache import bump_recipe
+from .counters import decrement, increment
+from .favorites import invalidate_favorites
+from .images import schedule_renditions
+from .ingredients import index_ingredients
+from .models import Comment, Favorite, Recipe, RecipeAttribute, RecipeStepImage, SearchHistory
+from .search import get_backend, index_recipes
+from .suggest import get_recipe_weight, suggest_index
+
+
+def invalidate_on_commit(pk, using):
+    # Версию поднимаем после коммита, иначе параллельный запрос успеет
+    # закэшировать еще не закоммиченное состояние под новой версией
+    transaction.on_commit(partial(bump_recipe, pk), using=using)
+
+
+@receiver(post_save, sender=Recipe)
+def index_recipe(sender, instance, created, using, **kwargs):
+    index_recipes([instance], using=using)
+    # Связи с ингредиентами пересобираются, только если состав изменился
+    if created or instance.ingredients_changed():
+        index_ingredients([instance], using=using)
+    invalidate_on_commit(instance.pk, using)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=RecipeStepImage)
+def create_image_renditions(sender, instance, using, **kwargs):
+    schedule_renditions([instance], using=using)
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, using, **kwargs):
+    get_backend(using).remove([instance.pk], using=using)
+    invalidate_on_commit(instance.pk, using)
+
+
+@receiver(post_save, sender=RecipeAttribute)
+@receiver(post_delete, sender=RecipeAttribute)
+@receiver(post_save, sender=RecipeStepImage)
+@receiver(post_delete, sender=RecipeStepImage)
+def invalidate_recipe_parts(sender, instance, using, **kwargs):
+    invalidate_on_commit(instance.recipe_id, using)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+def invalidate_user_favorites(sender, instance, using, **kwargs):
+    transaction.on_commit(partial(invalidate_favorites, instance.user_id), using=using)
+
+
+@receiver(post_save, sender=Favorite)
+def count_favorite(sender, instance, created, using, **kwargs):
+    if created:
+        increment('favorite_count', instance.recipe_id, using=using)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, using, **kwargs):
+    if created:
+        increment('comment_count', instance.recipe_id, using=using)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=Comment)
+def uncount(sender, instance, using, origin=None, **kwargs):
+    # При удалении самого рецепта каскадом счетчики уже не важны
+    if isinstance(origin, Recipe):
+        return
+    field = 'favorite_count' if sender is Favorite else 'comment_count'
+    decrement(field, instance.recipe_id, using=using)
+
+
+@receiver(post_save, sender=Recipe)
+def suggest_recipe_name(sender, instance, created, using, **kwargs):
+    # Не собранный индекс подхватит рецепт при первой сборке
+    if created and suggest_index.is_built:
+        transaction.on_commit(partial(suggest_index.add, instance.name, recipe=get_recipe_weight()), using=using)
+
+
+@receiver(post_save, sender=SearchHistory)
+def suggest_search_query(sender, instance, created, using, **kwargs):
+    # История дедуплицируется при записи, так что created — новый пользователь для запроса
+    if created and suggest_index.is_built:
+        transaction.on_commit(partial(suggest_index.add, instance.query, history=1), using=using)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_cached_user(sender, instance, using, **kwargs):
+    user_id = getattr(instance, jwt_settings.USER_ID_FIELD)
+    # Сразу — для этого процесса, после коммита — против чтения старой строки
+    # параллельным запросом, который успел бы снова положить ее в кэш
+    invalidate_user(user_id)
+    transaction.on_commit(partial(invalidate_user, user_id), using=using)
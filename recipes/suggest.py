@@ -0,0 +1,207 @@
+"""
+Подсказки для строки поиска.
+
+Индекс живет в памяти процесса: отсортированный массив ключей (нормализованный
+текст с начала каждого слова) и веса терминов. Префикс ищется двумя bisect'ами,
+лучшие варианты для префикса запоминаются до изменения одного из его терминов.
+
+Источники — названия рецептов и история поиска, в которой каждый пользователь
+учитывается один раз. Запрос из истории подсказывается, только если его искали
+не меньше SUGGEST_MIN_USERS человек, чтобы чужие личные запросы не всплывали.
+Новые рецепты и запросы добавляются сигналами; раз в SUGGEST_REFRESH_INTERVAL
+индекс перестраивается в фоне, подхватывая удаления и записи других процессов.
+"""
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+MAX_LIMIT = 20
+# Сколько префиксов держать с готовыми результатами
+TOP_CACHE_SIZE = 10000
+# Префиксы до этой длины считаются при сборке индекса
+WARM_PREFIX_LENGTH = 2
+
+
+def normalize(text):
+    return ' '.join(text.lower().replace('ё', 'е').split())
+
+
+def get_min_users():
+    return getattr(settings, 'SUGGEST_MIN_USERS', 2)
+
+
+def get_recipe_weight():
+    return getattr(settings, 'SUGGEST_RECIPE_WEIGHT', 3)
+
+
+class SuggestIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._terms = {}
+        self._keys = []
+        self._top = {}
+        self.built_at = None
+        self._building = False
+
+    @property
+    def refresh_interval(self):
+        return getattr(settings, 'SUGGEST_REFRESH_INTERVAL', 600)
+
+    def add(self, text, history=0, recipe=0):
+        """Учитывает термин: history — число новых пользователей, recipe — вес названия."""
+        key = normalize(text)
+        if not key:
+            return
+        with self._lock:
+            self._add(key, text.strip(), history, recipe)
+
+    def _add(self, key, display, history, recipe):
+        term = self._terms.get(key)
+        if term is None:
+            term = self._terms[key] = [display, 0, 0]
+            for suffix in self._suffixes(key):
+                insort(self._keys, (suffix, key))
+        if recipe:
+            # Название рецепта показываем как есть, с его регистром
+            term[0] = display
+        term[1] += history
+        term[2] += recipe
+        if not self._is_visible(term):
+            return
+        # Вес термина только растет, поэтому готовые списки префиксов
+        # достаточно поправить на месте, а не пересчитывать
+        score = term[1] + term[2]
+        for suffix in self._suffixes(key):
+            for end in range(1, len(suffix) + 1):
+                top = self._top.get(suffix[:end])
+                if top is not None:
+                    self._promote(top, key, score)
+
+    @staticmethod
+    def _promote(top, key, score):
+        for i, (_, other) in enumerate(top):
+            if other == key:
+                del top[i]
+                break
+        else:
+            if len(top) >= MAX_LIMIT and score <= top[-1][0]:
+                return
+        top.append((score, key))
+        top.sort(key=lambda item: -item[0])
+        del top[MAX_LIMIT:]
+
+    @staticmethod
+    def _suffixes(key):
+        # "борщ украинский" находится и по "бор", и по "укр"
+        start = 0
+        for word in key.split(' '):
+            yield key[start:]
+            start += len(word) + 1
+
+    @staticmethod
+    def _is_visible(term):
+        return term[2] > 0 or term[1] >= get_min_users()
+
+    def lookup(self, prefix, limit=10):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        with self._lock:
+            top = self._top_for(prefix)
+            return [self._terms[key][0] for _, key in top[:limit]]
+
+    def _top_for(self, prefix):
+        top = self._top.get(prefix)
+        if top is None:
+            if len(self._top) >= TOP_CACHE_SIZE:
+                self._top.clear()
+            top = self._top[prefix] = self._collect(prefix)
+        return top
+
+    def _collect(self, prefix):
+        lo = bisect_left(self._keys, (prefix,))
+        hi = bisect_left(self._keys, (prefix + '\uffff',))
+        candidates = {}
+        for _, key in self._keys[lo:hi]:
+            term = self._terms[key]
+            if self._is_visible(term):
+                candidates[key] = term[1] + term[2]
+        best = heapq.nlargest(MAX_LIMIT, candidates.items(), key=lambda item: item[1])
+        return [(score, key) for key, score in best]
+
+    def load(self, terms):
+        """Заменяет содержимое индекса: terms — тройки (текст, history, recipe)."""
+        merged = {}
+        for text, history, recipe in terms:
+            key = normalize(text)
+            if not key:
+                continue
+            term = merged.setdefault(key, [text.strip(), 0, 0])
+            if recipe:
+                term[0] = text.strip()
+            term[1] += history
+            term[2] += recipe
+        keys = sorted((suffix, key) for key in merged for suffix in self._suffixes(key))
+        # Короткие префиксы охватывают большую часть индекса — считаем их
+        # заранее, чтобы первый запрос "б" не сканировал весь массив
+        fresh = SuggestIndex()
+        fresh._terms, fresh._keys = merged, keys
+        for length in range(1, WARM_PREFIX_LENGTH + 1):
+            for prefix in {suffix[:length] for suffix, _ in keys}:
+                fresh._top_for(prefix)
+        with self._lock:
+            self._terms, self._keys, self._top = merged, keys, fresh._top
+            self.built_at = time.monotonic()
+
+    def build(self):
+        from .models import Recipe, SearchHistory
+
+        # Каждый пользователь учитывается один раз на запрос, как бы он его ни писал
+        searched = {
+            (normalize(query), user_id)
+            for query, user_id in SearchHistory.objects.values_list('query', 'user_id').iterator()
+        }
+        history = Counter(key for key, _ in searched)
+        recipe_weight = get_recipe_weight()
+        recipes = Recipe.objects.values_list('name', 'favorite_count')
+        self.load([
+            *((query, users, 0) for query, users in history.items()),
+            *((name, 0, recipe_weight + favorites) for name, favorites in recipes.iterator()),
+        ])
+
+    @property
+    def is_built(self):
+        return self.built_at is not None
+
+    def ensure_fresh(self):
+        """Первая сборка синхронная, дальше устаревший индекс обновляется в фоне."""
+        if not self.is_built:
+            self.build()
+            return
+        if time.monotonic() - self.built_at < self.refresh_interval:
+            return
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        threading.Thread(target=self._rebuild, name='search-suggest-rebuild', daemon=True).start()
+
+    def _rebuild(self):
+        try:
+            self.build()
+        except Exception:
+            logger.exception('Не удалось перестроить индекс подсказок')
+        finally:
+            self._building = False
+            connections.close_all()
+
+
+suggest_index = SuggestIndex()
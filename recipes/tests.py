@@ -1,3 +1,1314 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import logging
+import re
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.files.storage import default_storage
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path
+from PIL import Image
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from SiteC.gunicorn_config import on_starting
+
+from .auth import CachedJWTAuthentication, local_users, shared_timeout, user_key
+from .bulk import bulk_insert_recipes
+from .cache import bump_recipe, cached_response, recipe_version
+from .counters import increment
+from .favorites import invalidate_favorites
+from .ingredients import normalize_ingredient
+from .logs import JSONFormatter, QueueHandler, RequestContextFilter, SamplingFilter
+from .models import Recipe, RecipeAttribute, RecipeStepImage, Comment, Favorite, RecentlyViewed, SearchHistory
+from .pagination import RecipeCursorPagination
+from .replicas import ReplicaMiddleware, current_read_database
+from .suggest import suggest_index
+from .timing import WORKERS_KEY, EndpointMetrics, RequestTimings, current_timings, endpoint_metrics, new_entry
+from .tracking import view_tracker
+from .urls import async_urlpatterns, urlpatterns as api_urlpatterns
+from .warmup import warm_up
+
+# URLconf для AsyncReadViewTests: как под ASGI (ASYNC_READ_VIEWS)
+urlpatterns = [path('api/', include(async_urlpatterns + api_urlpatterns))]
+
+
+class QueryBudgetMixin:
+    """
+    Фиксирует число SQL-запросов на эндпоинт.
+
+    ``assertQueryBudget`` выполняет GET и падает, если запросов больше
+    бюджета; ``assertConstantQueries`` дополнительно проверяет, что число
+    запросов не растет при добавлении данных (нет N+1).
+    """
+
+    def assertQueryBudget(self, budget, url, **extra):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200, response.content)
+        executed = len(ctx.captured_queries)
+        if executed > budget:
+            sql = '\n'.join(query['sql'] for query in ctx.captured_queries)
+            self.fail(f'{url}: {executed} запросов при бюджете {budget}:\n{sql}')
+        return response
+
+    def assertConstantQueries(self, budget, url, grow, **extra):
+        self.assertQueryBudget(budget, url, **extra)
+        grow()
+        self.assertQueryBudget(budget, url, **extra)
+
+
+# Кэш ответов отключен: бюджет считается для запросов, дошедших до базы.
+# Просмотры пишутся в tearDown, а не фоновым потоком посреди теста.
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    RECENTLY_VIEWED_FLUSH_INTERVAL=3600,
+)
+class RecipeQueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('cook', password='secret-pass')
+
+    def tearDown(self):
+        view_tracker.flush()
+
+    def make_recipes(self, count, **kwargs):
+        recipes = []
+        for i in range(count):
+            recipe = Recipe.objects.create(user=self.user, name=f'Рецепт {i}', **kwargs)
+            RecipeAttribute.objects.create(recipe=recipe, name='Кухня', value='Русская')
+            RecipeAttribute.objects.create(recipe=recipe, name='Сложность', value='Легко')
+            RecipeStepImage.objects.create(recipe=recipe, image=f'recipes/steps/{i}.jpg')
+            recipes.append(recipe)
+        return recipes
+
+    def test_recipe_list(self):
+        self.make_recipes(3)
+        self.assertConstantQueries(3, '/api/recipes/', lambda: self.make_recipes(10))
+
+    def test_recipe_list_paginated(self):
+        self.make_recipes(3)
+        self.assertConstantQueries(3, '/api/recipes/?page_size=5', lambda: self.make_recipes(10))
+
+    def test_recipe_list_summary(self):
+        self.make_recipes(3)
+        response = self.assertQueryBudget(1, '/api/recipes/?fields=summary')
+        self.assertNotIn('description', response.json()[0])
+
+    def test_recipe_list_is_favorited(self):
+        self.client.force_authenticate(self.user)
+        favorite = self.make_recipes(3)[0]
+        Favorite.objects.create(user=self.user, recipe=favorite)
+        response = self.assertQueryBudget(4, '/api/recipes/')
+        flags = {recipe['id']: recipe['is_favorited'] for recipe in response.json()}
+        self.assertEqual([pk for pk, flag in flags.items() if flag], [favorite.pk])
+
+    def test_recipe_filters_and_facets(self):
+        self.make_recipes(2, cooking_time=20, calories=300)
+        self.make_recipes(3, cooking_time=90, calories=700)
+        response = self.assertQueryBudget(
+            2, '/api/recipes/?fields=summary&facets=1&cooking_time_max=30&attr=Кухня:Русская')
+        data = response.json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertEqual(data['facets']['attributes']['Сложность'], {'Легко': 2})
+        self.assertEqual([bucket['count'] for bucket in data['facets']['cooking_time']], [0, 2, 0, 0, 0])
+        self.assertEqual(self.client.get('/api/recipes/?attr=Кухня').status_code, 400)
+
+    def test_recipe_popular(self):
+        self.make_recipes(3)
+        self.assertConstantQueries(3, '/api/recipes/popular/?by=favorites', lambda: self.make_recipes(10))
+
+    def test_recipe_trending(self):
+        self.make_recipes(3)
+        self.assertConstantQueries(3, '/api/recipes/trending/', lambda: self.make_recipes(10))
+
+    def test_recipe_detail(self):
+        recipe = self.make_recipes(1)[0]
+        self.assertQueryBudget(3, f'/api/recipes/{recipe.pk}/')
+
+    def test_favorites(self):
+        self.client.force_authenticate(self.user)
+
+        def grow():
+            for recipe in self.make_recipes(5):
+                Favorite.objects.create(user=self.user, recipe=recipe)
+
+        grow()
+        # +1 запрос на множество избранного для is_favorited (в проде из кэша)
+        self.assertConstantQueries(4, '/api/favorites/', grow)
+
+    def test_recently_viewed(self):
+        self.client.force_authenticate(self.user)
+
+        def grow():
+            for recipe in self.make_recipes(5):
+                RecentlyViewed.objects.create(user=self.user, recipe=recipe)
+
+        grow()
+        self.assertConstantQueries(4, '/api/recently-viewed/', grow)
+
+    def test_comment_thread(self):
+        recipe = self.make_recipes(1)[0]
+
+        def grow():
+            for i in range(30):
+                author = User.objects.create_user(f'reader{Comment.objects.count()}')
+                Comment.objects.create(recipe=recipe, author=author, text=f'Комментарий {i}')
+
+        grow()
+        url = f'/api/comments/?recipe={recipe.pk}&page_size=20'
+        response = self.assertQueryBudget(1, url)
+        self.assertEqual(len(response.json()['results']), 20)
+        self.assertConstantQueries(1, response.json()['next'], grow)
+
+
+class QueryPlanMixin:
+    """
+    Проверяет планы запросов эндпоинта через EXPLAIN.
+
+    ``assertIndexedQueries`` выполняет GET, прогоняет каждый SELECT через
+    EXPLAIN и падает, если таблица читается полным сканированием или
+    результат сортируется во временной структуре, а не берется из индекса.
+    На SQLite смотрим EXPLAIN QUERY PLAN; на PostgreSQL в тестовых таблицах
+    слишком мало строк, поэтому seq scan и sort выключаются на время EXPLAIN —
+    если они все равно остались в плане, подходящего индекса нет.
+    """
+
+    SQLITE_FULL_SCAN = re.compile(r'^SCAN (?!.*\b(?:USING (?:COVERING )?INDEX|VIRTUAL TABLE)\b)')
+    SQLITE_TEMP_SORT = re.compile(r'USE TEMP B-TREE')
+    POSTGRES_FULL_SCAN = re.compile(r'\bSeq Scan on\b')
+    POSTGRES_TEMP_SORT = re.compile(r'^\s*(?:->\s*)?(?:Incremental )?Sort\b')
+
+    def explain(self, sql):
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('SET LOCAL enable_sort = off')
+                cursor.execute(f'EXPLAIN {sql}')
+                return [row[0] for row in cursor.fetchall()]
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def plan_problems(self, plan):
+        if connection.vendor == 'postgresql':
+            patterns = (self.POSTGRES_FULL_SCAN, self.POSTGRES_TEMP_SORT)
+        else:
+            patterns = (self.SQLITE_FULL_SCAN, self.SQLITE_TEMP_SORT)
+        return [line for line in plan if any(pattern.search(line) for pattern in patterns)]
+
+    def assertIndexedQueries(self, url, **extra):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, 200, response.content)
+        selects = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects, f'{url}: не выполнено ни одного SELECT')
+        for sql in selects:
+            plan = self.explain(sql)
+            problems = self.plan_problems(plan)
+            if problems:
+                self.fail(f'{url}: запрос без индекса:\n{sql}\n' + '\n'.join(plan))
+        return response
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    RECENTLY_VIEWED_FLUSH_INTERVAL=3600,
+)
+class QueryPlanTests(QueryPlanMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('cook', password='secret-pass')
+        self.recipes = []
+        for i in range(5):
+            recipe = Recipe.objects.create(user=self.user, name=f'Рецепт {i}')
+            RecipeAttribute.objects.create(recipe=recipe, name='Кухня', value='Русская')
+            RecipeStepImage.objects.create(recipe=recipe, image=f'recipes/steps/{i}.jpg')
+            Comment.objects.create(recipe=recipe, author=self.user, text='Вкусно')
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            RecentlyViewed.objects.create(user=self.user, recipe=recipe)
+            SearchHistory.objects.create(user=self.user, query=f'суп {i}')
+            self.recipes.append(recipe)
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        view_tracker.flush()
+
+    def test_recipe_list(self):
+        self.assertIndexedQueries('/api/recipes/?page_size=2')
+
+    def test_recipe_list_next_page(self):
+        response = self.client.get('/api/recipes/?page_size=2')
+        self.assertIndexedQueries(response.json()['next'])
+
+    def test_recipe_detail(self):
+        self.assertIndexedQueries(f'/api/recipes/{self.recipes[0].pk}/')
+
+    def test_recipe_popular(self):
+        for by in ('favorites', 'comments', 'views'):
+            with self.subTest(by=by):
+                self.assertIndexedQueries(f'/api/recipes/popular/?by={by}')
+
+    def test_recipe_trending(self):
+        self.assertIndexedQueries('/api/recipes/trending/')
+
+    def test_comment_thread(self):
+        self.assertIndexedQueries(f'/api/comments/?recipe={self.recipes[0].pk}')
+
+    def test_favorites(self):
+        self.assertIndexedQueries('/api/favorites/')
+
+    def test_recently_viewed(self):
+        self.assertIndexedQueries('/api/recently-viewed/')
+
+    def test_search_history(self):
+        self.assertIndexedQueries('/api/search-history/')
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+)
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('cook', password='secret-pass')
+        self.recipes = [Recipe.objects.create(user=self.user, name=f'Рецепт {i}') for i in range(7)]
+        # Одинаковое время создания: порядок внутри решает id
+        Recipe.objects.filter(pk__in=[r.pk for r in self.recipes[2:5]]).update(created_at=self.recipes[2].created_at)
+        self.expected = [
+            recipe.name for recipe in Recipe.objects.order_by('-created_at', '-id')
+        ]
+
+    def names(self, page):
+        return [item['name'] for item in page['results']]
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_walk_forward_and_back(self):
+        pages = [self.get('/api/recipes/', page_size=3)]
+        self.assertIsNone(pages[0]['previous'])
+        while pages[-1]['next']:
+            pages.append(self.get(pages[-1]['next']))
+        self.assertEqual([self.names(page) for page in pages],
+                         [self.expected[0:3], self.expected[3:6], self.expected[6:]])
+
+        back = self.get(pages[-1]['previous'])
+        self.assertEqual(self.names(back), self.expected[3:6])
+        back = self.get(back['previous'])
+        self.assertEqual(self.names(back), self.expected[0:3])
+        self.assertIsNone(back['previous'])
+        self.assertEqual(self.names(self.get(back['next'])), self.expected[3:6])
+
+    def test_comment_thread_ascending(self):
+        recipe = self.recipes[0]
+        texts = [f'Комментарий {i}' for i in range(5)]
+        for text in texts:
+            Comment.objects.create(recipe=recipe, author=self.user, text=text)
+        page = self.get('/api/comments/', recipe=recipe.pk, page_size=2)
+        seen = [item['text'] for item in page['results']]
+        while page['next']:
+            page = self.get(page['next'])
+            seen.extend(item['text'] for item in page['results'])
+        self.assertEqual(seen, texts)
+
+    def test_invalid_cursor(self):
+        valid = self.get('/api/recipes/', page_size=3)['next']
+        token = valid.split('cursor=')[1].split('&')[0]
+        short = base64.urlsafe_b64encode(b'{"p":[1],"r":0}').decode().rstrip('=')
+        bad_date = base64.urlsafe_b64encode(b'{"p":["not a date",1],"r":0}').decode().rstrip('=')
+        for cursor in ('garbage', token[:-3], short, bad_date):
+            with self.subTest(cursor=cursor):
+                response = self.client.get('/api/recipes/', {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json()['detail'], 'Неверный курсор.')
+
+    def test_page_size(self):
+        self.assertIsInstance(self.get('/api/recipes/'), list)
+        with mock.patch.object(RecipeCursorPagination, 'max_page_size', 4):
+            self.assertEqual(len(self.get('/api/recipes/', page_size=1000)['results']), 4)
+        with mock.patch.object(RecipeCursorPagination, 'page_size', 5):
+            for size in ('0', '-1', 'много'):
+                with self.subTest(page_size=size):
+                    self.assertEqual(len(self.get('/api/recipes/', page_size=size)['results']), 5)
+        self.assertEqual(len(self.get('/api/recipes/', page_size=2)['results']), 2)
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+)
+class SearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.puree = Recipe.objects.create(name='Картофельное пюре', ingredients_list=['картофель', 'молоко'])
+        self.soup = Recipe.objects.create(name='Суп', description='Суп с картофелем и грибами',
+                                          ingredients_list=['грибы', 'картофель'])
+        self.pie = Recipe.objects.create(name='Пирог с капустой', description='Румяный пирог')
+
+    def search(self, query, **params):
+        response = self.client.get('/api/recipes/', {'search': query, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def names(self, query):
+        return [item['name'] for item in self.search(query)]
+
+    def test_ranked_by_relevance(self):
+        # Совпадение в названии весит больше, чем в описании и ингредиентах
+        self.assertEqual(self.names('картофель'), ['Картофельное пюре', 'Суп'])
+        self.assertEqual(self.names('капуста пирог'), ['Пирог с капустой'])
+        self.assertEqual(self.names('ананас'), [])
+
+    def test_russian_stemming(self):
+        self.assertEqual(self.names('грибов'), ['Суп'])
+        self.assertEqual(self.names('пироги с капустою'), ['Пирог с капустой'])
+        self.assertEqual(self.names('РУМЯНОГО'), ['Пирог с капустой'])
+
+    def test_prefix_match(self):
+        self.assertEqual(self.names('карто'), ['Картофельное пюре', 'Суп'])
+        self.assertEqual(self.names('пир капу'), ['Пирог с капустой'])
+
+    def test_index_follows_save_and_delete(self):
+        self.pie.name = 'Кулебяка'
+        self.pie.description = 'С капустой и яйцом'
+        self.pie.save()
+        self.assertEqual(self.names('пирог'), [])
+        self.assertEqual(self.names('кулебяка'), ['Кулебяка'])
+        self.soup.delete()
+        self.assertEqual(self.names('грибы'), [])
+        self.assertEqual(self.names('картофель'), ['Картофельное пюре'])
+
+    def test_cursor_pages_follow_rank(self):
+        for i in range(5):
+            Recipe.objects.create(name=f'Картофель по-деревенски {i}')
+        expected = self.names('картофель')
+        self.assertEqual(len(expected), 7)
+
+        page = self.search('картофель', page_size=3)
+        seen = [item['name'] for item in page['results']]
+        while page['next']:
+            page = self.client.get(page['next']).json()
+            seen.extend(item['name'] for item in page['results'])
+        self.assertEqual(seen, expected)
+
+        previous = self.client.get(page['previous']).json()
+        self.assertEqual([item['name'] for item in previous['results']], expected[3:6])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, SEARCH_HISTORY_LIMIT=3, SUGGEST_MIN_USERS=2)
+class SearchSuggestTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.users = [User.objects.create_user(f'cook{i}', password='secret-pass') for i in range(3)]
+        # Индекс общий для процесса — собираем заново из тестовой базы
+        suggest_index.built_at = None
+
+    def search(self, user, *queries):
+        self.client.force_authenticate(user)
+        for query in queries:
+            response = self.client.post('/api/search-history/', {'query': query}, format='json')
+            self.assertEqual(response.status_code, 201, response.content)
+        self.client.force_authenticate(None)
+
+    def test_history_is_deduplicated_and_capped(self):
+        user = self.users[0]
+        self.search(user, 'Борщ  зеленый', 'борщ зеленый', 'БОРЩ ЗЕЛЕНЫЙ')
+        self.assertEqual(list(SearchHistory.objects.filter(user=user).values_list('query', flat=True)), ['БОРЩ ЗЕЛЕНЫЙ'])
+        self.search(user, 'суп', 'каша', 'пирог')
+        self.assertEqual(
+            list(SearchHistory.objects.filter(user=user).values_list('query', flat=True)),
+            ['пирог', 'каша', 'суп'],
+        )
+
+    def test_suggest(self):
+        Recipe.objects.create(name='Борщ украинский')
+        self.search(self.users[0], 'борщ с пампушками', 'бородинский хлеб')
+        self.search(self.users[1], 'Борщ с пампушками')
+        response = self.client.get('/api/search/suggest/', {'q': 'бор'})
+        # Запрос одного пользователя в подсказки не попадает
+        self.assertEqual(response.json()['suggestions'], ['Борщ украинский', 'борщ с пампушками'])
+        self.assertEqual(self.client.get('/api/search/suggest/', {'q': 'укр'}).json()['suggestions'], ['Борщ украинский'])
+        with self.assertNumQueries(0):
+            self.client.get('/api/search/suggest/', {'q': 'бо'})
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+)
+class CookWithIngredientsTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Recipe.objects.create(name='Омлет', ingredients_list=['3 яйца', 'молоко 100 мл', 'соль'])
+        Recipe.objects.create(name='Салат', ingredients_list=['помидоры 2 шт', 'свежие огурцы', 'сметана', 'соль'])
+        Recipe.objects.create(name='Яичница', ingredients_list=[{'name': 'Яйцо', 'amount': 2}, 'спелый помидор', 'соль'])
+
+    def test_normalize_ingredient(self):
+        self.assertEqual(normalize_ingredient('2 спелых помидора')[0], normalize_ingredient('Помидоры')[0])
+        self.assertEqual(normalize_ingredient('куриное филе 500 г')[0], normalize_ingredient('филе куриное')[0])
+        self.assertIsNone(normalize_ingredient('по вкусу'))
+
+    def test_ranked_by_coverage(self):
+        response = self.assertQueryBudget(2, '/api/recipes/cook/?ingredients=яйца,соль,помидоры&fields=summary')
+        ranked = [(item['name'], item['matched_ingredients']) for item in response.json()['results']]
+        self.assertEqual(ranked, [('Яичница', 3), ('Омлет', 2), ('Салат', 2)])
+
+        response = self.client.get('/api/recipes/cook/', {'ingredients': 'яйца,соль,помидоры', 'max_missing': 0})
+        self.assertEqual([item['name'] for item in response.json()['results']], ['Яичница'])
+
+    def test_index_follows_recipe_changes(self):
+        recipe = Recipe.objects.get(name='Салат')
+        recipe.ingredients_list = ['огурцы']
+        recipe.save()
+        response = self.client.get('/api/recipes/cook/', {'ingredients': 'огурец'})
+        self.assertEqual([(item['name'], item['coverage']) for item in response.json()['results']], [('Салат', 1.0)])
+
+    def ingredient_writes(self, recipe):
+        with CaptureQueriesContext(connection) as ctx:
+            recipe.save()
+        return [query['sql'] for query in ctx.captured_queries if 'recipes_recipeingredient' in query['sql']]
+
+    def test_reindex_only_on_ingredient_changes(self):
+        recipe = Recipe.objects.get(name='Омлет')
+        recipe.name = 'Омлет с сыром'
+        self.assertEqual(self.ingredient_writes(recipe), [])
+        recipe.ingredients_list.append('сыр')
+        self.assertNotEqual(self.ingredient_writes(recipe), [])
+        self.assertEqual(self.ingredient_writes(recipe), [])
+        # Поле не загружено — индекс не трогаем и лишний раз в базу не ходим
+        self.assertEqual(self.ingredient_writes(Recipe.objects.only('id', 'name').get(pk=recipe.pk)), [])
+        response = self.client.get('/api/recipes/cook/', {'ingredients': 'сыр'})
+        self.assertEqual([item['name'] for item in response.json()['results']], ['Омлет с сыром'])
+
+    def test_create_indexes_once(self):
+        recipe = Recipe(name='Сырники', ingredients_list=['творог', 'яйца'])
+        self.assertEqual(len(self.ingredient_writes(recipe)), 2)
+        recipe.image = 'recipes/syrniki.jpg'
+        self.assertEqual(self.ingredient_writes(recipe), [])
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    RECIPE_BULK_MAX=3,
+)
+class BulkImportTests(TestCase):
+    url = '/api/recipes/bulk/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('cook', password='secret-pass')
+        self.client.force_authenticate(self.user)
+
+    def post(self, recipes):
+        return self.client.post(self.url, {'recipes': recipes}, format='json')
+
+    def test_all_created(self):
+        response = self.post([
+            {'name': 'Борщ', 'ingredients_list': ['свекла', 'капуста'], 'attributes': [{'name': 'кухня', 'value': 'русская'}]},
+            {'name': 'Щи', 'description': 'Кислые щи', 'ingredients_list': ['капуста']},
+        ])
+        self.assertEqual(response.status_code, 201, response.content)
+        body = response.json()
+        self.assertEqual((body['created'], body['failed']), (2, 0))
+        ids = [result['id'] for result in body['results']]
+        self.assertEqual([result['status'] for result in body['results']], ['created', 'created'])
+        recipes = {recipe.name: recipe for recipe in Recipe.objects.filter(pk__in=ids)}
+        self.assertEqual([recipes['Борщ'].pk, recipes['Щи'].pk], ids)
+        self.assertEqual(recipes['Борщ'].user, self.user)
+        self.assertEqual(list(recipes['Борщ'].attributes.values_list('name', 'value')), [('кухня', 'русская')])
+
+    def test_partial_success(self):
+        response = self.post([{'name': 'Борщ'}, {'cooking_time': 10}, {'name': 'Щи', 'calories': 'много'}])
+        self.assertEqual(response.status_code, 207, response.content)
+        body = response.json()
+        self.assertEqual((body['created'], body['failed']), (1, 2))
+        created, *errors = body['results']
+        self.assertEqual((created['index'], created['status']), (0, 'created'))
+        self.assertTrue(Recipe.objects.filter(pk=created['id'], name='Борщ').exists())
+        self.assertEqual([(error['index'], error['status']) for error in errors], [(1, 'error'), (2, 'error')])
+        self.assertIn('name', errors[0]['errors'])
+        self.assertIn('calories', errors[1]['errors'])
+
+    def test_rejected(self):
+        self.assertEqual(self.post([{'cooking_time': 10}]).status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+        response = self.post([{'name': f'Рецепт {i}'} for i in range(4)])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('3', response.json()['detail'])
+        self.assertFalse(Recipe.objects.exists())
+        self.client.force_authenticate(None)
+        self.assertEqual(self.post([{'name': 'Борщ'}]).status_code, 401)
+
+    def test_bulk_rows_are_indexed(self):
+        Recipe.objects.create(name='Омлет', ingredients_list=['яйца'])
+        response = self.post([
+            {'name': 'Борщ украинский', 'ingredients_list': ['свекла', 'капуста', 'соль']},
+            {'name': 'Салат', 'description': 'Летний салат из помидоров', 'ingredients_list': ['помидоры', 'соль']},
+        ])
+        self.assertEqual(response.status_code, 201, response.content)
+        search = self.client.get('/api/recipes/', {'search': 'помидор'}).json()
+        self.assertEqual([item['name'] for item in search], ['Салат'])
+        cook = self.client.get('/api/recipes/cook/', {'ingredients': 'свекла,капуста,соль', 'max_missing': 0}).json()
+        self.assertEqual([item['name'] for item in cook['results']], ['Борщ украинский'])
+        # Свежий рецепт без вовлеченности в тренде наравне с созданным через save()
+        trending = {item['name'] for item in self.client.get('/api/recipes/trending/').json()['results']}
+        self.assertEqual(trending, {'Омлет', 'Борщ украинский', 'Салат'})
+        self.assertFalse(Recipe.objects.filter(trending_score=0).exists())
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    RECIPE_EXPORT_CHUNK_SIZE=2,
+)
+class ExportStreamTests(TestCase):
+    url = '/api/recipes/export/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('cook', password='secret-pass')
+        self.recipes = [Recipe.objects.create(user=self.user, name=f'Рецепт {i}') for i in range(5)]
+        RecipeAttribute.objects.create(recipe=self.recipes[0], name='кухня', value='русская')
+        self.client.force_authenticate(self.user)
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        body = b''.join(response.streaming_content).decode('utf-8')
+        # Каждая запись, включая последнюю, завершается переводом строки
+        self.assertTrue(not body or body.endswith('\n'))
+        return response, [json.loads(line) for line in body.splitlines()]
+
+    def test_streams_all_recipes(self):
+        response, records = self.export()
+        self.assertEqual([record['id'] for record in records], [recipe.pk for recipe in self.recipes])
+        self.assertEqual([(attr['name'], attr['value']) for attr in records[0]['attributes']], [('кухня', 'русская')])
+        self.assertEqual(records[0]['user'], 'cook')
+        # Тело читается после middleware — Server-Timing был бы неверным
+        self.assertNotIn('Server-Timing', response)
+        self.assertIn('X-Request-ID', response)
+
+    def test_after_id_and_fields(self):
+        _, records = self.export(after_id=self.recipes[2].pk, fields='id,name')
+        self.assertEqual(records, [{'id': recipe.pk, 'name': recipe.name} for recipe in self.recipes[3:]])
+        _, records = self.export(after_id=self.recipes[-1].pk)
+        self.assertEqual(records, [])
+        self.assertEqual(self.client.get(self.url, {'after_id': 'abc'}).status_code, 400)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+)
+class ExportImportTests(TestCase):
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.workdir)
+        self.path = f'{self.workdir}/recipes.ndjson'
+        self.cook = User.objects.create_user('cook', password='secret-pass')
+        self.ghost = User.objects.create_user('ghost', password='secret-pass')
+        borsch = Recipe.objects.create(user=self.cook, name='Борщ', ingredients_list=['свекла', 'капуста'])
+        RecipeAttribute.objects.create(recipe=borsch, name='кухня', value='русская')
+        Recipe.objects.create(user=self.ghost, name='Щи', description='Кислые щи')
+        Recipe.objects.create(name='Каша')
+
+    def export_recipes(self):
+        call_command('export_recipes', self.path, stderr=io.StringIO())
+        with open(self.path, encoding='utf-8') as source:
+            return [json.loads(line) for line in source]
+
+    def import_recipes(self, *args):
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_recipes', self.path, *args, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_round_trip_keeps_ids(self):
+        exported = self.export_recipes()
+        self.assertEqual([record['name'] for record in exported], ['Борщ', 'Щи', 'Каша'])
+        Recipe.objects.all().delete()
+        # Автора из файла уже нет в базе
+        self.ghost.delete()
+
+        with open(self.path, 'a', encoding='utf-8') as output:
+            output.write('{"name": \n')
+            output.write('{"cooking_time": 10}\n')
+            output.write(json.dumps({'id': 9000, 'user': 'cook', 'name': 'Компот'}, ensure_ascii=False) + '\n')
+        stdout, stderr = self.import_recipes('--keep-ids', '--chunk-size', '2')
+        self.assertIn('загружено 4, пропущено 2', stdout)
+        self.assertIn('Строка 4: некорректный JSON', stderr)
+        self.assertIn('Строка 5:', stderr)
+
+        recipes = {recipe.pk: recipe for recipe in Recipe.objects.select_related('user')}
+        self.assertEqual(sorted(recipes), sorted([record['id'] for record in exported] + [9000]))
+        for record in exported:
+            recipe = recipes[record['id']]
+            self.assertEqual(recipe.name, record['name'])
+            self.assertEqual(recipe.created_at.isoformat(), record['created_at'])
+        self.assertEqual(
+            {recipe.name: recipe.user for recipe in recipes.values()},
+            {'Борщ': self.cook, 'Щи': None, 'Каша': None, 'Компот': self.cook},
+        )
+        borsch = recipes[exported[0]['id']]
+        self.assertEqual(list(borsch.attributes.values_list('name', 'value')), [('кухня', 'русская')])
+        # Счетчик id продолжает после загруженных, новые рецепты не конфликтуют
+        self.assertGreater(Recipe.objects.create(name='Окрошка').pk, 9000)
+
+    def test_import_without_keep_ids(self):
+        exported = self.export_recipes()
+        self.import_recipes()
+        self.assertEqual(Recipe.objects.count(), 6)
+        self.assertEqual(Recipe.objects.filter(name='Борщ', user=self.cook).count(), 2)
+        # Без --keep-ids рецепты получают новые id
+        self.assertEqual(Recipe.objects.filter(pk__gt=exported[-1]['id']).count(), 3)
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    IMAGE_RENDITION_WIDTHS=(320, 640, 1280),
+    IMAGE_RENDITION_FORMATS=('webp', 'jpeg'),
+    IMAGE_RENDITIONS_BACKGROUND=False,
+)
+class ImageRenditionTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp(prefix='renditions-')
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('cook', password='secret-pass')
+
+    def upload(self, name, width=500, height=300):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, height), 'orange').save(buffer, 'JPEG')
+        return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+    def renditions(self, recipe):
+        return self.client.get(f'/api/recipes/{recipe.pk}/').json()
+
+    def test_only_produced_widths_are_listed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(user=self.user, name='Борщ', image=self.upload('recipes/small.jpg'))
+        data = self.renditions(recipe)
+        self.assertEqual(list(data['image_renditions']['webp']), ['320', '500'])
+        self.assertTrue(default_storage.exists('recipes/small_500w.jpg'))
+        self.assertFalse(default_storage.exists('recipes/small_1280w.webp'))
+        with Image.open(default_storage.path('recipes/small_320w.webp')) as image:
+            self.assertEqual(image.width, 320)
+
+        # Копии для того же файла повторно не создаются
+        with mock.patch('recipes.images.generate_renditions') as generate, \
+                self.captureOnCommitCallbacks(execute=True):
+            recipe.name = 'Борщ зеленый'
+            recipe.save()
+        generate.assert_not_called()
+
+    def test_bulk_recipes_get_renditions_after_commit(self):
+        image, step = self.upload('recipes/bulk.jpg', width=2000), self.upload('recipes/steps/bulk.jpg')
+        with self.captureOnCommitCallbacks() as callbacks:
+            (recipe,) = bulk_insert_recipes([{'name': 'Щи', 'image': image, 'step_images': [step]}], user=self.user)
+            # До создания копий ссылок на них нет, а не ссылки на 404
+            data = self.renditions(recipe)
+            self.assertIsNone(data['image_renditions'])
+            self.assertEqual(data['step_image_renditions'], [None])
+        for callback in callbacks:
+            callback()
+        data = self.renditions(recipe)
+        self.assertEqual(list(data['image_renditions']['jpeg']), ['320', '640', '1280'])
+        self.assertEqual(list(data['step_image_renditions'][0]['webp']), ['320', '500'])
+
+    def test_failed_generation_is_not_advertised(self):
+        name = default_storage.save('recipes/broken.jpg', ContentFile(b'not an image'))
+        with self.assertLogs('recipes.images', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(user=self.user, name='Борщ', image=name)
+        self.assertIsNone(self.renditions(recipe)['image_renditions'])
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'response-tests'}},
+    RECENTLY_VIEWED_FLUSH_INTERVAL=3600,
+)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user('cook', password='secret-pass')
+        self.recipe = Recipe.objects.create(user=self.user, name='Борщ')
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def tearDown(self):
+        view_tracker.flush()
+
+    def test_conditional_requests(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+        # Ответ из кэша: в базу не ходим
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).json()['name'], 'Борщ')
+
+    def test_writes_change_etag(self):
+        detail, listing = self.client.get(self.url), self.client.get('/api/recipes/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = 'Борщ зеленый'
+            self.recipe.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=detail['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Борщ зеленый')
+        self.assertNotEqual(response['ETag'], detail['ETag'])
+
+        listing_etags = {listing['ETag']}
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Recipe.objects.create(user=self.user, name='Щи')
+        response = self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=listing['ETag'])
+        self.assertEqual({item['name'] for item in response.json()}, {'Щи', 'Борщ зеленый'})
+        listing_etags.add(response['ETag'])
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        response = self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(response['ETag'], listing_etags)
+
+    def test_etag_follows_body(self):
+        # Запись истекла или собрана другим воркером: версия прежняя, данные новые
+        with mock.patch('recipes.cache.get_timeout', return_value=0):
+            first = self.client.get(self.url)
+            Recipe.objects.filter(pk=self.recipe.pk).update(name='Щи')
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['name'], 'Щи')
+            self.assertNotEqual(response['ETag'], first['ETag'])
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_personalized_variant(self):
+        anonymous = self.client.get(self.url)
+        self.client.force_authenticate(self.user)
+        first = self.client.get(self.url)
+        self.assertFalse(first.json()['is_favorited'])
+        self.assertNotEqual(first['ETag'], anonymous['ETag'])
+
+        # Избранное меняется без изменения версии рецепта (bulk_create не шлет сигналов)
+        Favorite.objects.bulk_create([Favorite(user=self.user, recipe=self.recipe)])
+        with mock.patch('recipes.favorites.time.time', return_value=time.time() + 10):
+            invalidate_favorites(self.user.pk)
+        by_etag = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(by_etag.status_code, 200)
+        self.assertTrue(by_etag.json()['is_favorited'])
+        by_date = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(by_date.status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=by_etag['ETag']).status_code, 304)
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'counter-tests'}},
+)
+class EngagementCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Просмотры из других тестов не должны попасть в наш рецепт с тем же id
+        view_tracker.flush()
+        self.user = User.objects.create_user('cook', password='secret-pass')
+        self.recipe = Recipe.objects.create(user=self.user, name='Борщ')
+
+    def test_bulk_recipes_get_trending_score(self):
+        (bulk,) = bulk_insert_recipes([{'name': 'Щи'}], user=self.user)
+        bulk.refresh_from_db()
+        self.recipe.refresh_from_db()
+        self.assertGreater(bulk.trending_score, 0)
+        self.assertAlmostEqual(bulk.trending_score, self.recipe.trending_score, places=2)
+
+    def test_counter_changes_invalidate_cached_responses(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        first = self.client.get(url)
+        self.assertEqual(first.json()['favorite_count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(user=self.user, recipe=self.recipe)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['favorite_count'], 1)
+        popular = self.client.get('/api/recipes/popular/').json()['results']
+        self.assertEqual(popular[0]['favorite_count'], 1)
+
+    @override_settings(RECENTLY_VIEWED_FLUSH_INTERVAL=3600)
+    def test_views_keep_cached_responses(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        detail, listing = self.client.get(url), self.client.get('/api/recipes/')
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(view_tracker.flush(), 2)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.view_count, 2)
+        # Сброс буфера просмотров не обнуляет ни ETag, ни кэш ответов
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=detail['ETag']).status_code, 304)
+        self.assertEqual(self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=listing['ETag']).status_code, 304)
+
+    def test_full_save_of_deleted_row_inserts_it(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        Recipe.objects.filter(pk=self.recipe.pk).delete()
+        stale.name = 'Борщ зеленый'
+        stale.save()
+        self.assertEqual(Recipe.objects.get(pk=self.recipe.pk).name, 'Борщ зеленый')
+
+    def test_full_save_keeps_concurrent_increments(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        increment('favorite_count', self.recipe.pk)
+        stale.name = 'Борщ зеленый'
+        stale.save()
+        self.recipe.refresh_from_db()
+        self.assertEqual((self.recipe.name, self.recipe.favorite_count), ('Борщ зеленый', 1))
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    RECENTLY_VIEWED_FLUSH_INTERVAL=3600,
+    RECENTLY_VIEWED_LIMIT=3,
+)
+class RecentlyViewedTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user('cook', password='secret-pass')
+        self.recipes = [Recipe.objects.create(name=f'Рецепт {i}') for i in range(5)]
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        view_tracker.flush()
+
+    def view(self, recipe):
+        self.assertEqual(self.client.get(f'/api/recipes/{recipe.pk}/').status_code, 200)
+
+    def flush(self):
+        # flush() глотает ошибки записи, поэтому проверяем и журнал
+        with self.assertNoLogs('recipes.tracking', 'ERROR'):
+            return view_tracker.flush()
+
+    def test_repeat_view_updates_existing_row(self):
+        recipe = self.recipes[0]
+        self.view(recipe)
+        self.assertEqual(self.flush(), 1)
+        first = RecentlyViewed.objects.get(user=self.user, recipe=recipe)
+        RecentlyViewed.objects.filter(pk=first.pk).update(viewed_at=first.viewed_at - timedelta(days=1))
+
+        self.view(recipe)
+        self.view(recipe)
+        self.assertEqual(self.flush(), 2)
+        again = RecentlyViewed.objects.get(user=self.user, recipe=recipe)
+        self.assertEqual(again.pk, first.pk)
+        self.assertGreaterEqual(again.viewed_at, first.viewed_at)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.view_count, 3)
+
+    def test_history_is_trimmed_to_limit(self):
+        for recipe in self.recipes:
+            self.view(recipe)
+            # Отдельная пачка на каждый просмотр — иначе порядок решает одно время записи
+            self.flush()
+        self.view(self.recipes[1])
+        self.flush()
+        history = self.client.get('/api/recently-viewed/').json()
+        history = history['results'] if isinstance(history, dict) else history
+        self.assertEqual([item['recipe']['name'] for item in history], ['Рецепт 1', 'Рецепт 4', 'Рецепт 3'])
+        self.assertEqual(RecentlyViewed.objects.filter(user=self.user).count(), 3)
+
+    def test_anonymous_views_only_count(self):
+        self.client.force_authenticate(None)
+        self.view(self.recipes[0])
+        self.view(self.recipes[0])
+        self.assertEqual(self.flush(), 2)
+        self.assertFalse(RecentlyViewed.objects.exists())
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].view_count, 2)
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    RECENTLY_VIEWED_FLUSH_INTERVAL=3600,
+)
+class AsyncReadViewTests(TestCase):
+    """Корутины из async_views отдают то же, что синхронные DRF-view."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='secret-pass')
+        self.recipes = []
+        for i in range(3):
+            recipe = Recipe.objects.create(user=self.user, name=f'Рецепт {i}', cooking_time=10 * (i + 1))
+            RecipeAttribute.objects.create(recipe=recipe, name='Кухня', value='Русская')
+            Comment.objects.create(recipe=recipe, author=self.user, text='Вкусно')
+            self.recipes.append(recipe)
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        token = RefreshToken.for_user(self.user).access_token
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    def tearDown(self):
+        view_tracker.flush()
+
+    async def assertSameAsSync(self, url, **headers):
+        sync_response = await sync_to_async(self.client.get)(url, headers=headers)
+        with override_settings(ROOT_URLCONF=__name__):
+            async_response = await self.async_client.get(url, headers=headers)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.json(), sync_response.json())
+        return async_response
+
+    async def test_recipe_list(self):
+        await self.assertSameAsSync('/api/recipes/?page_size=2&facets=1', **self.headers)
+        await self.assertSameAsSync('/api/recipes/?fields=summary&cooking_time_max=20')
+        await self.assertSameAsSync('/api/recipes/?attr=Кухня')
+
+    async def test_recipe_detail(self):
+        response = await self.assertSameAsSync(f'/api/recipes/{self.recipes[0].pk}/', **self.headers)
+        self.assertTrue(response.json()['is_favorited'])
+        await self.assertSameAsSync('/api/recipes/999999/')
+
+    async def test_comments(self):
+        response = await self.assertSameAsSync(f'/api/comments/?recipe={self.recipes[1].pk}')
+        # Запросы из потоков sync_to_async тоже попадают в Server-Timing
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* SQL"')
+
+    async def test_favorites(self):
+        await self.assertSameAsSync('/api/favorites/', **self.headers)
+        response = await self.assertSameAsSync('/api/favorites/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_writes_go_to_sync_views(self):
+        with override_settings(ROOT_URLCONF=__name__):
+            response = await self.async_client.post(
+                '/api/favorites/', {'recipe_id': self.recipes[1].pk}, headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(await Favorite.objects.filter(user=self.user, recipe=self.recipes[1]).aexists())
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'timing-tests'}},
+)
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        user = User.objects.create_user('cook', password='secret-pass')
+        Recipe.objects.create(user=user, name='Борщ')
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/recipes/', HTTP_ORIGIN='http://localhost:3000')
+        timing = response['Server-Timing']
+        self.assertIn(f'desc="{len(ctx.captured_queries)} SQL"', timing)
+        self.assertRegex(timing, r'serialize;dur=[\d.]+')
+        self.assertRegex(timing, r'render;dur=[\d.]+')
+        self.assertRegex(timing, r'total;dur=[\d.]+$')
+        self.assertEqual(response['Timing-Allow-Origin'], 'http://localhost:3000')
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_request_log(self):
+        with self.assertLogs('recipes.timing', 'WARNING') as logs:
+            self.client.get('/api/recipes/')
+        self.assertIn('Медленный запрос GET /api/recipes/', logs.output[0])
+        self.assertIn('FROM "recipes_recipe"', logs.output[0])
+
+    def test_metrics_endpoint(self):
+        self.client.get('/api/recipes/')
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 401)
+        self.client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+        metrics = self.client.get('/api/metrics/').json()
+        endpoint = next(name for name in metrics['endpoints'] if name == 'GET /api/recipes/')
+        entry = metrics['endpoints'][endpoint]
+        self.assertGreaterEqual(entry['count'], 1)
+        self.assertEqual(sum(bucket['count'] for bucket in entry['histogram']), entry['count'])
+        self.assertEqual(metrics['workers'], 1)
+
+    def test_metrics_aggregate_workers(self):
+        endpoint = 'GET /api/recipes/<pk>/'
+        before = endpoint_metrics.snapshot().get(endpoint, new_entry())
+        url = f'/api/recipes/{Recipe.objects.get().pk}/'
+        self.client.get(url)
+        self.client.get(url)
+        entry = endpoint_metrics.snapshot()[endpoint]
+        self.assertEqual(entry['count'] - before['count'], 2)
+        self.assertEqual(sum(entry['buckets']), entry['count'])
+        self.assertGreater(entry['queries'], before['queries'])
+
+        # Другой воркер опубликовал свои гистограммы в общий кэш
+        other = EndpointMetrics()
+        for duration_ms in (3, 30, 3000):
+            other.observe(endpoint, duration_ms, RequestTimings(), slow=duration_ms >= 1000)
+        cache.set('recipes:metrics:other-host:1', other.snapshot())
+        cache.set(WORKERS_KEY, (cache.get(WORKERS_KEY) or set()) | {'recipes:metrics:other-host:1'})
+
+        self.client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+        metrics = self.client.get('/api/metrics/').json()
+        self.assertEqual(metrics['workers'], 2)
+        merged = metrics['endpoints'][endpoint]
+        self.assertEqual(merged['count'], entry['count'] + 3)
+        self.assertEqual(merged['slow'], entry['slow'] + 1)
+        histogram = {bucket['le_ms']: bucket['count'] for bucket in merged['histogram']}
+        self.assertGreaterEqual(histogram[5], 1)
+        self.assertGreaterEqual(histogram[5000], 1)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class StructuredLoggingTests(TestCase):
+    def make_logger(self, stream, *filters):
+        handler = QueueHandler(stream)
+        handler.setFormatter(JSONFormatter())
+        handler.addFilter(RequestContextFilter())
+        test_logger = logging.getLogger(f'recipes.tests.{self._testMethodName}')
+        test_logger.addHandler(handler)
+        test_logger.propagate = False
+        for log_filter in filters:
+            test_logger.addFilter(log_filter)
+        self.addCleanup(test_logger.removeHandler, handler)
+        return test_logger, handler
+
+    def test_json_records_with_request_context(self):
+        stream = io.StringIO()
+        test_logger, handler = self.make_logger(stream)
+        token = current_timings.set(RequestTimings('req-1'))
+        try:
+            test_logger.warning('Рецепт %s не найден', 42, extra={'recipe_id': 42})
+            try:
+                1 / 0
+            except ZeroDivisionError:
+                test_logger.exception('Ошибка')
+        finally:
+            current_timings.reset(token)
+        # Слушатель пишет в фоновом потоке; stop() дожидается очереди
+        handler.stop()
+        first, second = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(first['message'], 'Рецепт 42 не найден')
+        self.assertEqual(first['request_id'], 'req-1')
+        self.assertEqual(first['recipe_id'], 42)
+        self.assertEqual(first['queries'], 0)
+        self.assertIn('ZeroDivisionError', second['exception'])
+
+    def test_sampling_keeps_whole_requests_and_warnings(self):
+        stream = io.StringIO()
+        test_logger, handler = self.make_logger(stream, SamplingFilter(rate=0.5))
+        kept = 0
+        for index in range(200):
+            token = current_timings.set(RequestTimings(f'req-{index}'))
+            try:
+                test_logger.info('первая')
+                test_logger.info('вторая')
+                test_logger.warning('предупреждение')
+            finally:
+                current_timings.reset(token)
+        handler.stop()
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        by_request = {}
+        for record in records:
+            by_request.setdefault(record['request_id'], []).append(record['level'])
+        self.assertEqual(len(by_request), 200)
+        for levels in by_request.values():
+            # Из запроса попадают либо все INFO, либо ни одной
+            self.assertIn(levels, (['WARNING'], ['INFO', 'INFO', 'WARNING']))
+            kept += len(levels) == 3
+        self.assertTrue(50 < kept < 150, kept)
+
+    def test_request_id_header(self):
+        response = self.client.get('/api/recipes/', HTTP_X_REQUEST_ID='edge-123')
+        self.assertEqual(response['X-Request-ID'], 'edge-123')
+        generated = self.client.get('/api/recipes/', HTTP_X_REQUEST_ID='bad id\n')['X-Request-ID']
+        self.assertRegex(generated, r'^[0-9a-f]{32}$')
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'auth-tests'}},
+)
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='secret-pass')
+        # Сохранение пользователя на несколько секунд запрещает кэшировать его запись
+        cache.clear()
+        local_users.clear()
+
+    def get_favorites(self, user):
+        token = RefreshToken.for_user(user).access_token
+        return self.client.get('/api/favorites/', headers={'Authorization': f'Bearer {token}'})
+
+    def user_queries(self, user):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.get_favorites(user).status_code, 200)
+        return [query['sql'] for query in ctx.captured_queries if 'FROM "auth_user"' in query['sql']]
+
+    def test_user_comes_from_cache(self):
+        self.assertEqual(len(self.user_queries(self.user)), 1)
+        self.assertEqual(self.user_queries(self.user), [])
+        # Пустой LRU процесса — пользователь находится в общем кэше
+        local_users.clear()
+        self.assertEqual(self.user_queries(self.user), [])
+
+    def test_save_and_delete_invalidate(self):
+        self.assertEqual(self.get_favorites(self.user).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.get_favorites(self.user).status_code, 401)
+
+        other = User.objects.create_user('baker', password='secret-pass')
+        self.assertEqual(self.get_favorites(other).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=other.pk).delete()
+        response = self.get_favorites(other)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'user_not_found')
+
+    def test_cache_holds_no_password_hash(self):
+        self.assertEqual(self.get_favorites(self.user).status_code, 200)
+        entry = cache.get(user_key(self.user.pk))
+        self.assertEqual(set(entry), {'pk', 'is_active', 'password_digest'})
+        self.assertNotIn(self.user.password, repr(entry))
+
+        token = RefreshToken.for_user(self.user).access_token
+        user, _ = CachedJWTAuthentication().authenticate(
+            RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+        with self.assertNumQueries(0):
+            self.assertEqual((user.pk, user.is_active, user.is_authenticated), (self.user.pk, True, True))
+        # Остальные поля читаются из базы по обращению
+        with self.assertNumQueries(1):
+            self.assertEqual(user.username, 'cook')
+
+    @override_settings(USER_CACHE_TIMEOUT=300, USER_CACHE_LOCAL_TIMEOUT=2)
+    def test_process_local_cache_keeps_entries_briefly(self):
+        self.assertEqual(shared_timeout(), 2)
+        with mock.patch('recipes.auth.is_process_local', return_value=False):
+            self.assertEqual(shared_timeout(), 300)
+        with override_settings(USER_CACHE_LOCAL_TIMEOUT=0):
+            # Без LRU процесса пользователь каждый раз читается из базы
+            self.assertEqual(len(self.user_queries(self.user)), 1)
+            self.assertIsNone(cache.get(user_key(self.user.pk)))
+            self.assertEqual(len(self.user_queries(self.user)), 1)
+
+    # override_settings(SIMPLE_JWT=...) пересоздает api_settings, а модули держат прежний объект
+    @mock.patch.object(jwt_settings, 'CHECK_REVOKE_TOKEN', True)
+    def test_password_change_revokes_token(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.assertEqual(self.get_favorites(self.user).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('new-secret-pass')
+            self.user.save()
+        response = self.client.get('/api/favorites/', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['code'], 'password_changed')
+        self.assertEqual(self.get_favorites(self.user).status_code, 200)
+
+
+@override_settings(
+    SECURE_SSL_REDIRECT=False,
+    REPLICA_DATABASES=['replica_1'],
+    REPLICA_PIN_SECONDS=10,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'replica-tests'}},
+)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='secret-pass')
+        self.recipe = Recipe.objects.create(user=self.user, name='Борщ', cooking_time=60)
+        cache.clear()
+        # Запросы не выполняются: алиас реплики нужен только роутеру
+        self.middleware = ReplicaMiddleware(lambda request: HttpResponse(Recipe.objects.all().db))
+
+    def headers(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+    def read_database(self, method, path, **headers):
+        request = getattr(RequestFactory(), method)(path, **headers)
+        return self.middleware(request).content.decode()
+
+    def test_safe_api_requests_read_from_replica(self):
+        self.assertEqual(self.read_database('get', '/api/recipes/'), 'replica_1')
+        self.assertEqual(self.read_database('get', '/api/recipes/', **self.headers(self.user)), 'replica_1')
+        self.assertEqual(self.read_database('post', '/api/recipes/'), 'default')
+        self.assertEqual(self.read_database('get', '/admin/'), 'default')
+        self.assertEqual(Recipe.objects.all().db, 'default')
+
+    def test_writer_is_pinned_to_primary(self):
+        response = self.client.post('/api/favorites/', {'recipe_id': self.recipe.pk}, **self.headers(self.user))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.read_database('get', '/api/favorites/', **self.headers(self.user)), 'default')
+
+        other = User.objects.create_user('baker', password='secret-pass')
+        self.assertEqual(self.read_database('get', '/api/favorites/', **self.headers(other)), 'replica_1')
+        # Неудачная запись не закрепляет
+        response = self.client.post('/api/favorites/', {'recipe_id': 999999}, **self.headers(other))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.read_database('get', '/api/favorites/', **self.headers(other)), 'replica_1')
+
+    def test_fresh_cache_entries_are_built_from_primary(self):
+        bump_recipe(self.recipe.pk)
+        request = RequestFactory().get(f'/api/recipes/{self.recipe.pk}/')
+        request.accepted_renderer = JSONRenderer()
+        token = current_read_database.set('replica_1')
+        try:
+            response = cached_response(request, recipe_version(self.recipe.pk),
+                                       lambda: Response(Recipe.objects.all().db))
+        finally:
+            current_read_database.reset(token)
+        self.assertEqual(response.data, 'default')
+
+
+# Прогрев идет через обычный WSGIHandler, который после запроса закрывает
+# устаревшие соединения, — поэтому без общей транзакции TestCase
+@override_settings(SECURE_SSL_REDIRECT=False)
+class WarmUpTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        suggest_index.built_at = None
+        Recipe.objects.create(name='Борщ')
+
+    def test_warm_up_primes_caches(self):
+        warm_up(paths=['/api/recipes/'], host='testserver')
+        self.assertTrue(suggest_index.is_built)
+        # Первый настоящий запрос уже не ходит в базу
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/recipes/', secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['name'], 'Борщ')
+
+
+class GunicornProfileTests(SimpleTestCase):
+    def start(self, workers):
+        on_starting(SimpleNamespace(cfg=SimpleNamespace(workers=workers)))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_refuses_workers_without_shared_cache(self):
+        with self.assertRaisesMessage(RuntimeError, 'LocMemCache'):
+            self.start(3)
+        self.start(1)
+
+    def test_starts_with_shared_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES={'default': {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}):
+                self.start(3)
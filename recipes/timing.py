@@ -0,0 +1,321 @@
+"""
+Замер времени запросов: SQL, сериализация, рендеринг и общее время.
+
+ServerTimingMiddleware заводит на каждый запрос RequestTimings в ContextVar;
+обертка курсора (install_query_timer, подключается в apps.py к каждому
+соединению) добавляет туда число и время SQL-запросов, span('serialize')
+в представлениях — время сериализации без вложенных запросов к базе.
+ContextVar копируется в потоки sync_to_async, так что запросы async-view
+тоже учитываются.
+
+Итог уходит в заголовок Server-Timing, в журнал запросов recipes.requests
+(с id запроса из X-Request-ID, который возвращается в ответе), в журнал
+медленных запросов (с самыми долгими и повторяющимися SQL) и в гистограммы
+по эндпоинтам,
+которые отдает /api/metrics/ (только для staff). Потоковые ответы
+(StreamingHttpResponse, например /api/recipes/export/) читают базу уже после
+выхода из middleware, поэтому Server-Timing для них не ставится, а журнал и
+гистограммы видят только время до начала отдачи тела. Гистограммы копятся в
+процессе и раз в METRICS_PUBLISH_INTERVAL секунд публикуются в кэш — с
+общим кэшем (Redis/Memcached) /api/metrics/ сводит данные всех воркеров.
+"""
+import bisect
+import logging
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+request_logger = logging.getLogger('recipes.requests')
+
+# Верхние границы корзин гистограммы, мс; последняя корзина — все, что дольше
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Сколько SQL одного запроса хранить для журнала медленных запросов
+MAX_RECORDED_QUERIES = 500
+SLOW_LOG_QUERIES = 5
+
+WORKERS_KEY = 'recipes:metrics:workers'
+NAMED_GROUP = re.compile(r'\(\?P<(\w+)>[^)]*\)')
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+current_timings = ContextVar('recipes_request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self, request_id=None):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.spans = defaultdict(float)
+        self.sql = []
+        self._open = set()
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.db += duration
+        if len(self.sql) < MAX_RECORDED_QUERIES:
+            self.sql.append((duration, sql))
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+
+@contextmanager
+def span(name):
+    """Учитывает время блока под именем name; вложенные блоки с тем же именем не суммируются."""
+    timings = current_timings.get()
+    if timings is None or name in timings._open:
+        yield
+        return
+    timings._open.add(name)
+    started, db_before = time.perf_counter(), timings.db
+    try:
+        yield
+    finally:
+        timings._open.discard(name)
+        # Ленивые queryset ходят в базу посреди сериализации — это время уже в db
+        timings.spans[name] += time.perf_counter() - started - (timings.db - db_before)
+
+
+def time_query(execute, sql, params, many, context):
+    timings = current_timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add_query(sql, time.perf_counter() - started)
+
+
+def install_query_timer(connection, **kwargs):
+    # connection_created приходит при каждом переподключении того же алиаса
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def new_entry():
+    return {'count': 0, 'buckets': [0] * (len(BUCKETS_MS) + 1), 'total_ms': 0.0, 'db_ms': 0.0,
+            'queries': 0, 'serialize_ms': 0.0, 'render_ms': 0.0, 'slow': 0}
+
+
+def merge_entries(entries):
+    merged = new_entry()
+    for entry in entries:
+        for key, value in entry.items():
+            if key == 'buckets':
+                merged['buckets'] = [a + b for a, b in zip(merged['buckets'], value)]
+            else:
+                merged[key] += value
+    return merged
+
+
+def bucket_percentile(buckets, q):
+    """Оценка перцентиля по гистограмме: верхняя граница корзины (None — больше последней)."""
+    total = sum(buckets)
+    if not total:
+        return None
+    rank = q / 100 * total
+    seen = 0
+    for index, count in enumerate(buckets):
+        seen += count
+        if seen >= rank:
+            return BUCKETS_MS[index] if index < len(BUCKETS_MS) else None
+    return None
+
+
+class EndpointMetrics:
+    """Гистограммы времени ответа по эндпоинтам (метод + шаблон маршрута)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._published_at = 0.0
+        self._pid = None
+
+    @property
+    def worker_key(self):
+        return f'recipes:metrics:{socket.gethostname()}:{os.getpid()}'
+
+    def observe(self, endpoint, total_ms, timings, slow):
+        with self._lock:
+            if self._pid != os.getpid():
+                # После fork (gunicorn --preload) счетчики мастера не наши
+                self._entries, self._pid = {}, os.getpid()
+            entry = self._entries.setdefault(endpoint, new_entry())
+            entry['count'] += 1
+            entry['buckets'][bisect.bisect_left(BUCKETS_MS, total_ms)] += 1
+            entry['total_ms'] += total_ms
+            entry['db_ms'] += timings.db * 1000
+            entry['queries'] += timings.queries
+            entry['serialize_ms'] += timings.spans.get('serialize', 0.0) * 1000
+            entry['render_ms'] += timings.spans.get('render', 0.0) * 1000
+            entry['slow'] += slow
+
+    def snapshot(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                return {}
+            return {endpoint: {**entry, 'buckets': list(entry['buckets'])} for endpoint, entry in self._entries.items()}
+
+    def maybe_publish(self):
+        if time.monotonic() - self._published_at >= settings.METRICS_PUBLISH_INTERVAL:
+            self.publish()
+
+    def publish(self):
+        self._published_at = time.monotonic()
+        timeout = settings.METRICS_PUBLISH_INTERVAL * 30
+        cache.set(self.worker_key, self.snapshot(), timeout)
+        workers = cache.get(WORKERS_KEY) or set()
+        if self.worker_key not in workers:
+            cache.set(WORKERS_KEY, workers | {self.worker_key}, timeout)
+
+    def collect(self):
+        """Сводка по всем воркерам, опубликовавшим данные в кэш, включая текущий."""
+        self.publish()
+        workers = cache.get(WORKERS_KEY) or set()
+        snapshots = [snapshot for snapshot in cache.get_many(workers).values() if snapshot is not None]
+        grouped = defaultdict(list)
+        for snapshot in snapshots:
+            for endpoint, entry in snapshot.items():
+                grouped[endpoint].append(entry)
+        endpoints = {}
+        for endpoint, entries in sorted(grouped.items()):
+            entry = merge_entries(entries)
+            count = entry['count']
+            endpoints[endpoint] = {
+                'count': count,
+                'slow': entry['slow'],
+                'avg_ms': round(entry['total_ms'] / count, 2),
+                'p50_ms': bucket_percentile(entry['buckets'], 50),
+                'p95_ms': bucket_percentile(entry['buckets'], 95),
+                'p99_ms': bucket_percentile(entry['buckets'], 99),
+                'avg_db_ms': round(entry['db_ms'] / count, 2),
+                'avg_queries': round(entry['queries'] / count, 2),
+                'avg_serialize_ms': round(entry['serialize_ms'] / count, 2),
+                'avg_render_ms': round(entry['render_ms'] / count, 2),
+                'histogram': [
+                    {'le_ms': BUCKETS_MS[index] if index < len(BUCKETS_MS) else None, 'count': bucket}
+                    for index, bucket in enumerate(entry['buckets'])
+                ],
+            }
+        return {'workers': len(snapshots), 'endpoints': endpoints}
+
+
+endpoint_metrics = EndpointMetrics()
+
+
+def request_id_from(request):
+    """Id запроса от прокси (X-Request-ID), если он выглядит прилично, иначе новый."""
+    incoming = request.headers.get('X-Request-ID', '')
+    return incoming if REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+
+
+def endpoint_name(request):
+    """'GET /api/recipes/<pk>/' — маршруты роутера DRF без синтаксиса регулярных выражений."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return f'{request.method} <unmatched>'
+    route = NAMED_GROUP.sub(r'<\1>', match.route).replace('^', '').replace('$', '')
+    return f'{request.method} /{route}'
+
+
+def ms(seconds):
+    return f'{seconds * 1000:.1f}'
+
+
+def server_timing(timings, total):
+    parts = [f'db;dur={ms(timings.db)};desc="{timings.queries} SQL"']
+    parts += [f'{name};dur={ms(duration)}' for name, duration in sorted(timings.spans.items())]
+    parts.append(f'total;dur={ms(total)}')
+    return ', '.join(parts)
+
+
+def log_slow_request(request, response, timings, total_ms):
+    slowest = sorted(timings.sql, key=lambda item: item[0], reverse=True)[:SLOW_LOG_QUERIES]
+    lines = [f'  {duration * 1000:.1f} мс: {sql}' for duration, sql in slowest]
+    # Один и тот же SQL много раз подряд — обычно N+1
+    repeated = [(sql, count) for sql, count in Counter(sql for _, sql in timings.sql).most_common(1) if count > 1]
+    lines += [f'  повторяется {count} раз: {sql}' for sql, count in repeated]
+    logger.warning(
+        'Медленный запрос %s %s -> %s: %.0f мс, SQL %d за %.0f мс\n%s',
+        request.method, request.get_full_path(), response.status_code, total_ms,
+        timings.queries, timings.db * 1000, '\n'.join(lines),
+        extra={'status': response.status_code, 'duration_ms': round(total_ms, 2),
+               'slow_sql': [{'ms': round(duration * 1000, 2), 'sql': sql} for duration, sql in slowest]},
+    )
+
+
+class ServerTimingMiddleware:
+    """
+    Ставится первым в MIDDLEWARE, чтобы total покрывал всю цепочку.
+    Работает и под WSGI, и под ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timings = RequestTimings(request_id_from(request))
+        token = current_timings.set(timings)
+        try:
+            return self.finish(request, self.get_response(request), timings)
+        finally:
+            current_timings.reset(token)
+
+    async def __acall__(self, request):
+        timings = RequestTimings(request_id_from(request))
+        token = current_timings.set(timings)
+        try:
+            return self.finish(request, await self.get_response(request), timings)
+        finally:
+            current_timings.reset(token)
+
+    def process_template_response(self, request, response):
+        # Ответы DRF рендерятся после представления — рендерим сами, чтобы замерить
+        with span('render'):
+            response.render()
+        return response
+
+    def finish(self, request, response, timings):
+        total = timings.total()
+        total_ms = total * 1000
+        response['X-Request-ID'] = timings.request_id
+        # У потокового ответа тело еще не прочитано: db и total были бы неверными
+        if settings.SERVER_TIMING and not response.streaming:
+            response['Server-Timing'] = server_timing(timings, total)
+            origin = request.headers.get('Origin')
+            if origin and origin in getattr(settings, 'CORS_ALLOWED_ORIGINS', ()):
+                # Без этого браузер не покажет Server-Timing скрипту с другого домена
+                response['Timing-Allow-Origin'] = origin
+        slow = total_ms >= settings.SLOW_REQUEST_MS
+        if slow:
+            log_slow_request(request, response, timings, total_ms)
+        if request_logger.isEnabledFor(logging.INFO):
+            # request_id, db_ms и queries добавляет recipes.logs.RequestContextFilter
+            request_logger.info(
+                '%s %s -> %s', request.method, request.get_full_path(), response.status_code,
+                extra={'endpoint': endpoint_name(request), 'status': response.status_code,
+                       'duration_ms': round(total_ms, 2)},
+            )
+        endpoint_metrics.observe(endpoint_name(request), total_ms, timings, slow)
+        endpoint_metrics.maybe_publish()
+        return response
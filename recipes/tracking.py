@@ -0,0 +1,130 @@
+"""
+Учет просмотренных рецептов с отложенной записью.
+
+Просмотр попадает в буфер процесса, а в базу уходит пачкой из фонового
+потока: повторные просмотры одного рецепта схлопываются, запись делается
+upsert'ом по (user, recipe), после чего история пользователя обрезается
+до RECENTLY_VIEWED_LIMIT записей, а Recipe.view_count растет на число
+просмотров из пачки.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class ViewTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffer = {}
+        self._counts = Counter()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    @property
+    def limit(self):
+        return getattr(settings, 'RECENTLY_VIEWED_LIMIT', 50)
+
+    @property
+    def interval(self):
+        return getattr(settings, 'RECENTLY_VIEWED_FLUSH_INTERVAL', 5)
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'RECENTLY_VIEWED_BATCH_SIZE', 500)
+
+    def record(self, user_id, recipe_id):
+        """Учитывает просмотр; для анонимов (user_id=None) только счетчик."""
+        with self._lock:
+            if user_id is not None:
+                self._buffer[(user_id, recipe_id)] = timezone.now()
+            self._counts[recipe_id] += 1
+            pending = len(self._counts)
+        if self.interval <= 0:
+            # Без интервала пишем сразу (тесты, отладка)
+            self.flush()
+            return
+        self._ensure_worker()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._lock:
+            views, self._buffer = self._buffer, {}
+            counts, self._counts = self._counts, Counter()
+        if not counts:
+            return 0
+        try:
+            self.write(views, counts)
+        except Exception:
+            logger.exception('Не удалось сохранить просмотры: %d рецептов', len(counts))
+            return 0
+        return sum(counts.values())
+
+    def write(self, views, counts=None):
+        from .counters import apply_deltas
+        from .models import Recipe, RecentlyViewed
+
+        recipe_ids = set(counts or ()) | {recipe_id for _, recipe_id in views}
+        # Рецепт могли удалить, пока просмотр лежал в буфере
+        existing = set(Recipe.objects.filter(id__in=recipe_ids).values_list('id', flat=True))
+        rows = [
+            RecentlyViewed(user_id=user_id, recipe_id=recipe_id, viewed_at=viewed_at)
+            for (user_id, recipe_id), viewed_at in views.items()
+            if recipe_id in existing
+        ]
+        with transaction.atomic():
+            RecentlyViewed.objects.bulk_create(
+                rows,
+                batch_size=self.batch_size,
+                update_conflicts=True,
+                unique_fields=['user', 'recipe'],
+                update_fields=['viewed_at'],
+            )
+            self.trim({row.user_id for row in rows})
+            # Просмотры прибавляются к view_count одним UPDATE на всю пачку
+            apply_deltas('view_count', {pk: n for pk, n in (counts or {}).items() if pk in existing})
+
+    def trim(self, user_ids):
+        from .models import RecentlyViewed
+
+        for user_id in user_ids:
+            stale = list(
+                RecentlyViewed.objects.filter(user_id=user_id)
+                .order_by('-viewed_at', '-id')
+                .values_list('id', flat=True)[self.limit:]
+            )
+            if stale:
+                RecentlyViewed.objects.filter(id__in=stale).delete()
+
+    def _ensure_worker(self):
+        # После fork (gunicorn --preload) поток родителя в воркере не существует
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='recently-viewed-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                connections.close_all()
+
+
+view_tracker = ViewTracker()
+atexit.register(view_tracker.flush)
@@ -1,10 +1,13 @@
 # SiteC/MeowSite/SiteC/recipes/urls.py
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from . import async_views
 from .views import (
     RecipeViewSet, CommentViewSet, SearchHistoryViewSet,
-    FavoriteListCreateView, FavoriteDeleteView, RecentlyViewedViewSet, UserCreateView
+    FavoriteListCreateView, FavoriteDeleteView, RecentlyViewedViewSet, UserCreateView,
+    SearchSuggestView, MetricsView
 )
 
 router = DefaultRouter()
@@ -15,9 +18,22 @@ router.register(r'recently-viewed', RecentlyViewedViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('search/suggest/', SearchSuggestView.as_view(), name='search-suggest'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     path('favorites/', FavoriteListCreateView.as_view(), name='favorite-list-create'),
     path('favorites/<int:pk>/', FavoriteDeleteView.as_view(), name='favorite-delete'),
     path('register/', UserCreateView.as_view(), name='user-register'),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
-]
\ No newline at end of file
+]
+
+# Под ASGI чтение обслуживают корутины (recipes.async_views); пути те же
+async_urlpatterns = [
+    path('recipes/', async_views.recipe_list),
+    path('recipes/<int:pk>/', async_views.recipe_detail),
+    path('comments/', async_views.comment_list),
+    path('favorites/', async_views.favorite_list),
+]
+
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns = async_urlpatterns + urlpatterns
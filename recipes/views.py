@@ -1,54 +1,142 @@
-from django.db.models import Q
 from rest_framework import viewsets, status, generics, permissions
+from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
+from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
 from django.contrib.auth.models import User
 from .models import Recipe, Comment, SearchHistory, Favorite, RecentlyViewed, RecipeAttribute, RecipeStepImage
 from .serializers import (
     RecipeSerializer, UserSerializer, CommentSerializer,
-    SearchHistorySerializer, FavoriteSerializer, RecentlyViewedSerializer
+    SearchHistorySerializer, FavoriteSerializer, RecentlyViewedSerializer,
+    RecipeImportSerializer
 )
+from .bulk import bulk_insert_recipes
+from .pagination import CommentCursorPagination, RecipeCursorPagination
+from .search import search_recipes
+from .cache import cached_response, collection_version, recipe_version
+from .tracking import view_tracker
+from .favorites import favorites_personalization, favorites_version, get_favorite_ids
+from .ingredients import match_recipes
+from .filters import RecipeFilter, facet_counts
+from .suggest import MAX_LIMIT as MAX_SUGGESTIONS, normalize as normalize_query, suggest_index
+from .timing import endpoint_metrics, span
 import json
+import logging
+
+logger = logging.getLogger(__name__)
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
     parser_classes = (MultiPartParser, FormParser)
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = RecipeCursorPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = RecipeFilter
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({"request": self.request})
         return context
 
+    def get_search_query(self):
+        return self.request.query_params.get('search', '').strip()
+
     def get_queryset(self):
-        queryset = Recipe.objects.all()
-        search_query = self.request.query_params.get('search', None)
+        queryset = RecipeSerializer.setup_eager_loading(Recipe.objects.all(), self.request)
+        search_query = self.get_search_query()
         if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) |
-                Q(description__icontains=search_query) |
-                Q(ingredients_list__icontains=search_query)
-            )
+            queryset = search_recipes(queryset, search_query).order_by('-search_rank', '-id')
         return queryset
 
+    # Ленты: /popular/?by=favorites|comments|views и /trending/
+    popular_orderings = {
+        'favorites': ('-favorite_count', '-id'),
+        'comments': ('-comment_count', '-id'),
+        'views': ('-view_count', '-id'),
+    }
+    trending_ordering = ('-trending_score', '-id')
+
+    # Подбор по продуктам: сначала рецепты, для которых есть большая доля ингредиентов
+    cook_ordering = ('-coverage', '-matched', '-id')
+
+    @property
+    def always_paginate(self):
+        return self.action in ('popular', 'trending', 'cook')
+
+    def get_pagination_ordering(self):
+        if self.action == 'popular':
+            return self.popular_orderings.get(self.request.query_params.get('by'), self.popular_orderings['favorites'])
+        if self.action == 'trending':
+            return self.trending_ordering
+        if self.action == 'cook':
+            return self.cook_ordering
+        # Результаты поиска листаются по релевантности, остальное — по дате
+        if self.get_search_query():
+            return ('-search_rank', '-id')
+        return self.pagination_class.ordering
+
     def list(self, request, *args, **kwargs):
-        print("Запрос к /api/recipes/")
-        print("Параметры запроса:", request.query_params)
+        logger.debug('Список рецептов, параметры: %s', request.query_params)
+        return cached_response(request, collection_version(), lambda: self.build_list(request),
+                               **self.personalization(request))
+
+    def personalization(self, request):
+        # В кэш попадает ответ без учета пользователя, is_favorited проставляется поверх
+        if not request.user.is_authenticated:
+            return {}
+        return favorites_personalization(get_favorite_ids(request.user), favorites_version(request.user.pk))
+
+    def get_cacheable_context(self, request):
+        return {'request': request, 'favorite_ids': frozenset()}
+
+    def build_list(self, request):
         queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.serializer_class(queryset, many=True, context={'request': request})
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset)
+        facets = facet_counts(queryset) if self.wants_facets(request) else None
+        items = page if page is not None else queryset
+        return Response(self.list_payload(request, items, page is not None, facets))
+
+    def list_payload(self, request, items, paginated, facets=None):
+        """Тело ответа списка по уже выбранным рецептам (общая часть с async_views)."""
+        with span('serialize'):
+            data = self.serializer_class(items, many=True, context=self.get_cacheable_context(request)).data
+        if paginated:
+            data = self.paginator.get_paginated_response(data).data
+        if facets is not None:
+            # Без пагинации список оборачивается, чтобы было куда положить фасеты
+            data = {**(data if paginated else {'results': data}), 'facets': facets}
+        return data
+
+    def wants_facets(self, request):
+        return request.query_params.get('facets', '').lower() in ('1', 'true', 'yes')
 
     def retrieve(self, request, pk=None, *args, **kwargs):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        serializer = self.serializer_class(recipe, context={'request': request})
-        if request.user.is_authenticated:
-            RecentlyViewed.objects.create(user=request.user, recipe=recipe)
-        return Response(serializer.data)
-
+        response = cached_response(request, recipe_version(pk), lambda: self.build_detail(request, pk),
+                                   **self.personalization(request))
+        # Просмотр учитываем и при ответе из кэша, и при 304
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            view_tracker.record(request.user.id if request.user.is_authenticated else None, int(pk))
+        return response
+
+    def build_detail(self, request, pk):
+        recipe = get_object_or_404(RecipeSerializer.setup_eager_loading(Recipe.objects.all(), request), pk=pk)
+        serializer = self.serializer_class(recipe, context=self.get_cacheable_context(request))
+        with span('serialize'):
+            return Response(serializer.data)
+
+    @transaction.atomic
     def create(self, request, *args, **kwargs):
         data = request.data.copy()
         step_images = []
@@ -95,9 +183,10 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
             response_serializer = self.serializer_class(recipe, context={'request': request})
             return Response(response_serializer.data, status=status.HTTP_201_CREATED)
-        print("Ошибки сериализатора:", serializer.errors)
+        logger.info('Рецепт не создан: ошибки валидации', extra={'errors': serializer.errors})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @transaction.atomic
     def update(self, request, pk=None, *args, **kwargs):
         recipe = get_object_or_404(Recipe, pk=pk)
         if recipe.user != request.user:
@@ -152,7 +241,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
             response_serializer = self.serializer_class(recipe, context={'request': request})
             return Response(response_serializer.data)
-        print("Ошибки сериализатора:", serializer.errors)
+        logger.info('Рецепт %s не обновлен: ошибки валидации', pk, extra={'errors': serializer.errors})
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def destroy(self, request, pk=None, *args, **kwargs):
@@ -165,19 +254,152 @@ class RecipeViewSet(viewsets.ModelViewSet):
         recipe.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, methods=['get'])
+    def popular(self, request):
+        """Самые популярные рецепты по избранному, комментариям или просмотрам (?by=)."""
+        return cached_response(request, collection_version(), lambda: self.build_list(request),
+                               **self.personalization(request))
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """Рецепты "в тренде": вовлеченность с поправкой на свежесть (Recipe.trending_score)."""
+        return cached_response(request, collection_version(), lambda: self.build_list(request),
+                               **self.personalization(request))
+
+    @action(detail=False, methods=['get'])
+    def cook(self, request):
+        """
+        Что приготовить из имеющихся продуктов: ?ingredients=помидоры,сыр,яйца
+        (можно повторять параметр). Рецепты упорядочены по доле ингредиентов,
+        которые уже есть; ?max_missing=N оставляет только те, где не хватает
+        не больше N. К каждому рецепту добавляются matched_ingredients и coverage.
+        """
+        ingredients = [
+            part.strip()
+            for value in request.query_params.getlist('ingredients')
+            for part in value.split(',') if part.strip()
+        ]
+        if not ingredients:
+            return Response({"detail": "Укажите продукты в параметре ingredients."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        max_missing = request.query_params.get('max_missing')
+        if max_missing is not None:
+            try:
+                max_missing = int(max_missing)
+                if max_missing < 0:
+                    raise ValueError
+            except ValueError:
+                return Response({"detail": "max_missing должен быть неотрицательным числом."},
+                                status=status.HTTP_400_BAD_REQUEST)
+        return cached_response(request, collection_version(),
+                               lambda: self.build_cook(request, ingredients, max_missing),
+                               **self.personalization(request))
+
+    def build_cook(self, request, ingredients, max_missing):
+        queryset = match_recipes(self.filter_queryset(self.get_queryset()), ingredients, max_missing)
+        page = self.paginate_queryset(queryset)
+        with span('serialize'):
+            data = self.serializer_class(page, many=True, context=self.get_cacheable_context(request)).data
+        for item, recipe in zip(data, page):
+            item['matched_ingredients'] = recipe.matched
+            item['coverage'] = round(recipe.coverage, 3)
+        return self.get_paginated_response(data)
+
+    @action(detail=False, methods=['get'], url_path='export', permission_classes=[IsAuthenticated])
+    def export(self, request):
+        """
+        Весь каталог в NDJSON, по рецепту на строку. Строки отдаются по мере
+        чтения из базы пачками, так что память сервера не зависит от размера
+        каталога. ?after_id= продолжает выгрузку после указанного рецепта,
+        ?fields= работает как в списке.
+        """
+        queryset = RecipeSerializer.setup_eager_loading(Recipe.objects.order_by('id'), request)
+        after_id = request.query_params.get('after_id')
+        if after_id:
+            try:
+                queryset = queryset.filter(id__gt=int(after_id))
+            except ValueError:
+                return Response({"detail": "after_id должен быть числом."}, status=status.HTTP_400_BAD_REQUEST)
+        chunk_size = getattr(settings, 'RECIPE_EXPORT_CHUNK_SIZE', 500)
+        response = StreamingHttpResponse(
+            self.stream_ndjson(queryset, request, chunk_size),
+            content_type='application/x-ndjson; charset=utf-8',
+        )
+        response['Content-Disposition'] = 'attachment; filename="recipes.ndjson"'
+        return response
+
+    def stream_ndjson(self, queryset, request, chunk_size):
+        renderer = JSONRenderer()
+        context = {'request': request}
+        lines = []
+        for recipe in queryset.iterator(chunk_size=chunk_size):
+            lines.append(renderer.render(RecipeSerializer(recipe, context=context).data))
+            if len(lines) >= 100:
+                yield b'\n'.join(lines) + b'\n'
+                lines = []
+        if lines:
+            yield b'\n'.join(lines) + b'\n'
+
+    @action(detail=False, methods=['post'], url_path='bulk',
+            parser_classes=[JSONParser], permission_classes=[IsAuthenticated])
+    def bulk(self, request):
+        """
+        Пакетный импорт: {"recipes": [{...}, ...]}. Валидные рецепты
+        записываются одной транзакцией, по каждому элементу возвращается
+        результат. Картинки передаются путями к уже загруженным файлам.
+        """
+        items = request.data.get('recipes') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({"detail": "Ожидается непустой список рецептов."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        limit = getattr(settings, 'RECIPE_BULK_MAX', 1000)
+        if len(items) > limit:
+            return Response({"detail": f"За один запрос можно загрузить не больше {limit} рецептов."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results, valid, positions = [], [], []
+        for index, item in enumerate(items):
+            serializer = RecipeImportSerializer(data=item)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+                positions.append(index)
+                results.append(None)
+            else:
+                results.append({"index": index, "status": "error", "errors": serializer.errors})
+
+        created = bulk_insert_recipes(valid, user=request.user) if valid else []
+        for index, recipe in zip(positions, created):
+            results[index] = {"index": index, "status": "created", "id": recipe.pk}
+
+        failed = len(items) - len(created)
+        if not created:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif failed:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response({"created": len(created), "failed": failed, "results": results},
+                        status=response_status)
+
 class CommentViewSet(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = CommentCursorPagination
+    # У популярных рецептов тысячи комментариев — список всегда постраничный
+    always_paginate = True
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
     def get_queryset(self):
+        queryset = Comment.objects.select_related('author')
         recipe_id = self.request.query_params.get('recipe', None)
         if recipe_id is not None:
-            return Comment.objects.filter(recipe_id=recipe_id)
-        return Comment.objects.all()
+            if not recipe_id.isdigit():
+                raise ValidationError({'recipe': 'Ожидается id рецепта.'})
+            queryset = queryset.filter(recipe_id=recipe_id)
+        return queryset
 
 class SearchHistoryViewSet(viewsets.ModelViewSet):
     queryset = SearchHistory.objects.all()
@@ -187,15 +409,70 @@ class SearchHistoryViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return SearchHistory.objects.filter(user=self.request.user)
 
+    @transaction.atomic
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        user = self.request.user
+        query = ' '.join(serializer.validated_data['query'].split())
+        # Повторный запрос не копится: оставляем одну запись и поднимаем ее наверх.
+        # Сравниваем в Python: iexact в SQLite не различает регистр кириллицы,
+        # а история пользователя ограничена SEARCH_HISTORY_LIMIT строками
+        key = normalize_query(query)
+        previous = [
+            pk for pk, text in SearchHistory.objects.filter(user=user).values_list('id', 'query')
+            if normalize_query(text) == key
+        ]
+        if previous:
+            SearchHistory.objects.filter(id__in=previous[1:]).delete()
+            SearchHistory.objects.filter(id=previous[0]).update(query=query, timestamp=timezone.now())
+            serializer.instance = SearchHistory.objects.get(id=previous[0])
+        else:
+            serializer.save(user=user, query=query)
+        limit = getattr(settings, 'SEARCH_HISTORY_LIMIT', 20)
+        stale = list(
+            SearchHistory.objects.filter(user=user)
+            .order_by('-timestamp', '-id')
+            .values_list('id', flat=True)[limit:]
+        )
+        if stale:
+            SearchHistory.objects.filter(id__in=stale).delete()
+
+
+class SearchSuggestView(APIView):
+    """Подсказки для строки поиска: GET /api/search/suggest/?q=бор"""
+    permission_classes = [permissions.AllowAny]
+    # Ответ одинаков для всех — не тратим время на разбор токена
+    authentication_classes = []
+
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), MAX_SUGGESTIONS)
+        except ValueError:
+            limit = 10
+        suggest_index.ensure_fresh()
+        response = Response({'query': query, 'suggestions': suggest_index.lookup(query, limit)})
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'SUGGEST_CACHE_MAX_AGE', 60))
+        return response
+
+
+class MetricsView(APIView):
+    """Гистограммы времени ответа по эндпоинтам (recipes.timing): GET /api/metrics/, только для staff."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        response = Response(endpoint_metrics.collect())
+        patch_cache_control(response, private=True, no_store=True)
+        return response
 
 class FavoriteListCreateView(generics.ListCreateAPIView):
     serializer_class = FavoriteSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return Favorite.objects.filter(user=self.request.user)
+        return RecipeSerializer.setup_eager_loading(
+            Favorite.objects.filter(user=self.request.user), self.request,
+            prefix='recipe__', base_fields=('id', 'recipe', 'added_at'),
+        )
 
     def perform_create(self, serializer):
         recipe_id = self.request.data.get('recipe_id')
@@ -215,7 +492,10 @@ class RecentlyViewedViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return RecentlyViewed.objects.filter(user=self.request.user)
+        return RecipeSerializer.setup_eager_loading(
+            RecentlyViewed.objects.filter(user=self.request.user), self.request,
+            prefix='recipe__', base_fields=('id', 'recipe', 'viewed_at'),
+        )
 
 class UserCreateView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -0,0 +1,92 @@
+"""
+Прогрев процесса перед приемом трафика.
+
+Открывает соединения с базами, строит индекс подсказок поиска и прогоняет
+через приложение WARMUP_PATHS, чтобы URLconf, сериализаторы и кэш ответов
+были готовы до первого настоящего запроса. Вызывается из хуков gunicorn
+(SiteC/gunicorn_config.py): с preload один раз в мастере до fork, без
+preload — в каждом воркере.
+"""
+import io
+import logging
+import sys
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def open_connections():
+    for connection in connections.all():
+        pool = getattr(connection, 'pool', None)
+        if pool is not None:
+            # Пул сразу набирает min_size соединений, а не по мере запросов
+            pool.open(wait=True)
+        connection.ensure_connection()
+
+
+def warmup_environ(path, host):
+    parts = urlsplit(path)
+    name, _, port = host.partition(':')
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'SERVER_NAME': name,
+        'SERVER_PORT': port or '443',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        # Ключ кэша ответа строится по полному URL — он должен совпасть с
+        # тем, что придет от прокси
+        'HTTP_HOST': host,
+        'HTTP_X_FORWARDED_PROTO': 'https',
+        'wsgi.url_scheme': 'https',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.version': (1, 0),
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+
+
+def warm_requests(paths, host):
+    """Прогоняет GET-запросы через отдельный WSGIHandler; возвращает {путь: статус}."""
+    handler = WSGIHandler()
+    statuses = {}
+    for path in paths:
+        def start_response(status, headers, exc_info=None):
+            statuses[path] = int(status.split()[0])
+
+        response = handler(warmup_environ(path, host), start_response)
+        b''.join(response)
+        response.close()
+    return statuses
+
+
+def warm_up(paths=None, host=None):
+    """Прогревает процесс; возвращает время шагов в секундах."""
+    from .suggest import suggest_index
+
+    timings = {}
+    started = time.perf_counter()
+    open_connections()
+    timings['connections'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    suggest_index.ensure_fresh()
+    timings['suggest_index'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    paths = settings.WARMUP_PATHS if paths is None else paths
+    statuses = warm_requests(paths, host or settings.WARMUP_HOST)
+    timings['requests'] = time.perf_counter() - started
+
+    failed = {path: code for path, code in statuses.items() if code >= 400}
+    if failed:
+        logger.warning('Прогрев: запросы завершились ошибкой: %s', failed)
+    logger.info('Прогрев завершен: %s', ', '.join(f'{step} {seconds:.3f} с' for step, seconds in timings.items()))
+    return timings